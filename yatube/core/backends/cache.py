@@ -0,0 +1,521 @@
+import os
+import pickle
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+
+from django.core.cache import caches
+from django.core.cache.backends.base import DEFAULT_TIMEOUT, BaseCache
+
+from core.constants import (CACHE_BUSY_TIMEOUT, CACHE_INVALIDATION_KEY,
+                            CACHE_INVALIDATION_LOG_LIMIT,
+                            CACHE_INVALIDATION_LOG_TIMEOUT,
+                            CACHE_LOCAL_MAX_ENTRIES, CACHE_LOCAL_TIMEOUT,
+                            CACHE_LRU_RESOLUTION, CACHE_MAX_SIZE,
+                            CACHE_SYNC_INTERVAL)
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS cache_entries (
+    key TEXT PRIMARY KEY,
+    value BLOB NOT NULL,
+    expires REAL,
+    accessed REAL NOT NULL,
+    size INTEGER NOT NULL
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS cache_entries_accessed
+    ON cache_entries (accessed);
+CREATE TABLE IF NOT EXISTS cache_stats (
+    id INTEGER PRIMARY KEY CHECK (id = 1),
+    entries INTEGER NOT NULL,
+    bytes INTEGER NOT NULL
+);
+INSERT OR IGNORE INTO cache_stats VALUES (1, 0, 0);
+CREATE TRIGGER IF NOT EXISTS cache_entries_insert
+AFTER INSERT ON cache_entries BEGIN
+    UPDATE cache_stats
+    SET entries = entries + 1, bytes = bytes + NEW.size;
+END;
+CREATE TRIGGER IF NOT EXISTS cache_entries_update
+AFTER UPDATE OF size ON cache_entries BEGIN
+    UPDATE cache_stats SET bytes = bytes - OLD.size + NEW.size;
+END;
+CREATE TRIGGER IF NOT EXISTS cache_entries_delete
+AFTER DELETE ON cache_entries BEGIN
+    UPDATE cache_stats
+    SET entries = entries - 1, bytes = bytes - OLD.size;
+END;
+'''
+UPSERT = '''
+INSERT INTO cache_entries (key, value, expires, accessed, size)
+VALUES (?, ?, ?, ?, ?)
+ON CONFLICT (key) DO UPDATE SET
+    value = excluded.value,
+    expires = excluded.expires,
+    accessed = excluded.accessed,
+    size = excluded.size
+'''
+INT_SIZE = 8
+
+
+def _encode(value):
+    """Целые храним как INTEGER SQLite, остальное - pickle."""
+
+    if type(value) is int and -2 ** 63 <= value < 2 ** 63:
+        return value, INT_SIZE
+    data = pickle.dumps(value, pickle.HIGHEST_PROTOCOL)
+    return data, len(data)
+
+
+def _decode(value):
+    return value if isinstance(value, int) else pickle.loads(value)
+
+
+class SQLiteCache(BaseCache):
+    """
+    Кеш в файле SQLite, общий для всех процессов на машине.
+    Размер ограничен числом записей (MAX_ENTRIES) и объёмом в байтах
+    (MAX_SIZE); при переполнении вытесняются давно читанные записи.
+    Время чтения обновляется не чаще раза в LRU_RESOLUTION секунд,
+    чтобы чтения почти никогда не превращались в запись.
+    """
+
+    def __init__(self, location, params):
+        super().__init__(params)
+        options = params.get('OPTIONS', {})
+        self._path = location
+        self._max_size = int(options.get('MAX_SIZE', CACHE_MAX_SIZE))
+        self._lru_resolution = float(
+            options.get('LRU_RESOLUTION', CACHE_LRU_RESOLUTION)
+        )
+        self._local = threading.local()
+
+    def _connection(self):
+        local = self._local
+        # После fork соединение родителя использовать нельзя
+        if getattr(local, 'pid', None) != os.getpid():
+            directory = os.path.dirname(self._path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            conn = sqlite3.connect(
+                self._path,
+                timeout=CACHE_BUSY_TIMEOUT,
+                isolation_level=None,
+                check_same_thread=False,
+            )
+            conn.execute('PRAGMA journal_mode = WAL')
+            conn.execute('PRAGMA synchronous = OFF')
+            conn.executescript(SCHEMA)
+            local.conn = conn
+            local.pid = os.getpid()
+        return local.conn
+
+    @contextmanager
+    def _transaction(self):
+        conn = self._connection()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            yield conn
+        except BaseException:
+            conn.execute('ROLLBACK')
+            raise
+        conn.execute('COMMIT')
+
+    def _key(self, key, version):
+        key = self.make_key(key, version=version)
+        self.validate_key(key)
+        return key
+
+    def _cull(self, conn, now):
+        if self._cull_frequency == 0:
+            conn.execute('DELETE FROM cache_entries')
+            return
+
+        def overflow():
+            entries, size = conn.execute(
+                'SELECT entries, bytes FROM cache_stats'
+            ).fetchone()
+            if entries > self._max_entries or size > self._max_size:
+                return entries
+            return 0
+
+        if not overflow():
+            return
+        conn.execute(
+            'DELETE FROM cache_entries WHERE expires <= ?', (now,)
+        )
+        entries = overflow()
+        while entries:
+            conn.execute(
+                'DELETE FROM cache_entries WHERE key IN ('
+                '  SELECT key FROM cache_entries ORDER BY accessed LIMIT ?'
+                ')',
+                (max(entries // self._cull_frequency, 1),),
+            )
+            entries = overflow()
+
+    def _touch_accessed(self, conn, keys, accessed, now):
+        stale = [
+            key for key in keys
+            if now - accessed[key] >= self._lru_resolution
+        ]
+        if stale:
+            conn.execute(
+                'UPDATE cache_entries SET accessed = ? WHERE key IN ({})'
+                .format(', '.join('?' * len(stale))),
+                (now, *stale),
+            )
+
+    def _fetch(self, keys):
+        """Живые записи по ключам, с обновлением времени чтения."""
+
+        conn = self._connection()
+        now = time.time()
+        rows = conn.execute(
+            'SELECT key, value, accessed FROM cache_entries '
+            'WHERE key IN ({}) AND (expires IS NULL OR expires > ?)'
+            .format(', '.join('?' * len(keys))),
+            (*keys, now),
+        ).fetchall()
+        self._touch_accessed(
+            conn, [key for key, _, _ in rows],
+            {key: accessed for key, _, accessed in rows}, now,
+        )
+        return {key: value for key, value, _ in rows}
+
+    def get(self, key, default=None, version=None):
+        key = self._key(key, version)
+        values = self._fetch([key])
+        return _decode(values[key]) if key in values else default
+
+    def get_many(self, keys, version=None):
+        keys = {self._key(key, version): key for key in keys}
+        if not keys:
+            return {}
+        return {
+            keys[key]: _decode(value)
+            for key, value in self._fetch(list(keys)).items()
+        }
+
+    def _rows(self, data, timeout):
+        now = time.time()
+        expires = self.get_backend_timeout(timeout)
+        for key, value in data:
+            value, size = _encode(value)
+            yield key, value, expires, now, size
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        self.set_many({key: value}, timeout, version)
+
+    def set_many(self, data, timeout=DEFAULT_TIMEOUT, version=None):
+        rows = list(self._rows(
+            ((self._key(key, version), value) for key, value in data.items()),
+            timeout,
+        ))
+        with self._transaction() as conn:
+            conn.executemany(UPSERT, rows)
+            self._cull(conn, time.time())
+        return []
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self._key(key, version)
+        row = next(self._rows([(key, value)], timeout))
+        with self._transaction() as conn:
+            # Просроченная запись считается отсутствующей
+            added = conn.execute(
+                UPSERT + ' WHERE cache_entries.expires <= ?',
+                (*row, time.time()),
+            ).rowcount
+            if added:
+                self._cull(conn, time.time())
+        return bool(added)
+
+    def touch(self, key, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self._key(key, version)
+        return bool(self._connection().execute(
+            'UPDATE cache_entries SET expires = ? '
+            'WHERE key = ? AND (expires IS NULL OR expires > ?)',
+            (self.get_backend_timeout(timeout), key, time.time()),
+        ).rowcount)
+
+    def incr(self, key, delta=1, version=None):
+        cache_key = self._key(key, version)
+        with self._transaction() as conn:
+            row = conn.execute(
+                'SELECT value FROM cache_entries '
+                'WHERE key = ? AND (expires IS NULL OR expires > ?)',
+                (cache_key, time.time()),
+            ).fetchone()
+            if row is None:
+                raise ValueError(f"Key '{key}' not found")
+            new_value = _decode(row[0]) + delta
+            value, size = _encode(new_value)
+            conn.execute(
+                'UPDATE cache_entries SET value = ?, size = ? WHERE key = ?',
+                (value, size, cache_key),
+            )
+        return new_value
+
+    def has_key(self, key, version=None):
+        return self._connection().execute(
+            'SELECT 1 FROM cache_entries '
+            'WHERE key = ? AND (expires IS NULL OR expires > ?)',
+            (self._key(key, version), time.time()),
+        ).fetchone() is not None
+
+    def delete(self, key, version=None):
+        self.delete_many([key], version)
+
+    def delete_many(self, keys, version=None):
+        keys = [self._key(key, version) for key in keys]
+        if keys:
+            self._connection().execute(
+                'DELETE FROM cache_entries WHERE key IN ({})'
+                .format(', '.join('?' * len(keys))),
+                keys,
+            )
+
+    def clear(self):
+        self._connection().execute('DELETE FROM cache_entries')
+
+
+MISSING = object()
+# Сообщение об инвалидации «сбросить всё» (после clear)
+CLEAR_ALL = None
+
+
+class TwoTierCache(BaseCache):
+    """
+    Небольшой LRU в памяти процесса перед общим кешем LOCATION.
+
+    Чтение сначала смотрит в локальную копию, живущую не дольше
+    LOCAL_TIMEOUT секунд, и только при промахе идёт в общий кеш.
+    Изменённые ключи процесс копит и не чаще раза в SYNC_INTERVAL
+    секунд, а также в конце запроса (close) рассылает одним сообщением:
+    увеличивает номер версии в общем кеше и оставляет под ним список
+    ключей. Так запрос со многими записями, включая счётчики попаданий,
+    платит за рассылку один раз. Процессы не чаще раза в SYNC_INTERVAL
+    секунд сверяют номер и выбрасывают из своей копии изменённые
+    ключи, а при большом отставании - всю копию.
+
+    Значения хранятся в памяти как есть, без pickle:
+    полученные из кеша объекты менять нельзя. Вместо алиаса
+    из CACHES общий кеш можно передать готовым объектом в shared.
+    """
+
+    def __init__(self, location, params, shared=None):
+        super().__init__(params)
+        options = params.get('OPTIONS', {})
+        self._location = location
+        self._shared = shared
+        self._local_max_entries = int(
+            options.get('LOCAL_MAX_ENTRIES', CACHE_LOCAL_MAX_ENTRIES)
+        )
+        self._local_timeout = float(
+            options.get('LOCAL_TIMEOUT', CACHE_LOCAL_TIMEOUT)
+        )
+        self._sync_interval = float(
+            options.get('SYNC_INTERVAL', CACHE_SYNC_INTERVAL)
+        )
+        self._local = OrderedDict()
+        self._lock = threading.Lock()
+        self._version = None
+        self._synced = float('-inf')
+        self._pending = []
+        self._published = float('-inf')
+
+    @property
+    def shared(self):
+        if self._shared is None:
+            return caches[self._location]
+        return self._shared
+
+    def _local_key(self, key, version):
+        return self.shared.make_key(key, version=version)
+
+    def _remember(self, local_key, value, timeout=DEFAULT_TIMEOUT):
+        if timeout == DEFAULT_TIMEOUT:
+            timeout = self.shared.default_timeout
+        ttl = self._local_timeout if timeout is None else min(
+            self._local_timeout, timeout,
+        )
+        if ttl <= 0:
+            return
+        with self._lock:
+            self._local[local_key] = (time.monotonic() + ttl, value)
+            self._local.move_to_end(local_key)
+            while len(self._local) > self._local_max_entries:
+                self._local.popitem(last=False)
+
+    def _recall(self, local_key):
+        with self._lock:
+            entry = self._local.get(local_key)
+            if entry is None:
+                return MISSING
+            expires, value = entry
+            if expires <= time.monotonic():
+                del self._local[local_key]
+                return MISSING
+            self._local.move_to_end(local_key)
+            return value
+
+    def _forget(self, local_keys):
+        with self._lock:
+            if local_keys is CLEAR_ALL:
+                self._local.clear()
+                return
+            for local_key in local_keys:
+                self._local.pop(local_key, None)
+
+    def _publish(self, local_keys):
+        """Запоминает изменённые ключи и рассылает их, если пора."""
+
+        with self._lock:
+            if local_keys is CLEAR_ALL:
+                self._pending = CLEAR_ALL
+            elif self._pending is not CLEAR_ALL:
+                self._pending.extend(local_keys)
+            due = time.monotonic() - self._published >= self._sync_interval
+        if due:
+            self._flush()
+
+    def _flush(self):
+        """Рассылает другим процессам накопленный список ключей."""
+
+        with self._lock:
+            pending, self._pending = self._pending, []
+            self._published = time.monotonic()
+        if pending is not CLEAR_ALL:
+            if not pending:
+                return
+            pending = list(dict.fromkeys(pending))
+
+        shared = self.shared
+        try:
+            version = shared.incr(CACHE_INVALIDATION_KEY)
+        except ValueError:
+            if shared.add(CACHE_INVALIDATION_KEY, 1, None):
+                version = 1
+            else:
+                version = shared.incr(CACHE_INVALIDATION_KEY)
+        shared.set(
+            f'{CACHE_INVALIDATION_KEY}:{version}', pending,
+            CACHE_INVALIDATION_LOG_TIMEOUT,
+        )
+
+    def _sync(self):
+        now = time.monotonic()
+        if now - self._synced < self._sync_interval:
+            return
+        self._synced = now
+
+        version = self.shared.get(CACHE_INVALIDATION_KEY, 0)
+        if version == self._version:
+            return
+        previous, self._version = self._version, version
+        # До первой сверки в копии только собственные записи процесса
+        if previous is None:
+            return
+        if not 0 < version - previous <= CACHE_INVALIDATION_LOG_LIMIT:
+            self._forget(CLEAR_ALL)
+            return
+
+        log_keys = [
+            f'{CACHE_INVALIDATION_KEY}:{number}'
+            for number in range(previous + 1, version + 1)
+        ]
+        messages = self.shared.get_many(log_keys)
+        if len(messages) < len(log_keys) or CLEAR_ALL in messages.values():
+            self._forget(CLEAR_ALL)
+            return
+        for local_keys in messages.values():
+            self._forget(local_keys)
+
+    def get(self, key, default=None, version=None):
+        self._sync()
+        local_key = self._local_key(key, version)
+        value = self._recall(local_key)
+        if value is MISSING:
+            value = self.shared.get(key, MISSING, version)
+            if value is MISSING:
+                return default
+            self._remember(local_key, value)
+        return value
+
+    def get_many(self, keys, version=None):
+        self._sync()
+        found = {}
+        misses = []
+        for key in keys:
+            value = self._recall(self._local_key(key, version))
+            if value is MISSING:
+                misses.append(key)
+            else:
+                found[key] = value
+        if misses:
+            fetched = self.shared.get_many(misses, version)
+            for key, value in fetched.items():
+                self._remember(self._local_key(key, version), value)
+            found.update(fetched)
+        return found
+
+    def has_key(self, key, version=None):
+        self._sync()
+        if self._recall(self._local_key(key, version)) is not MISSING:
+            return True
+        return self.shared.has_key(key, version)
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        self.set_many({key: value}, timeout, version)
+
+    def set_many(self, data, timeout=DEFAULT_TIMEOUT, version=None):
+        # Обёртки кеша (например, debug_toolbar) возвращают None вместо []
+        failed = self.shared.set_many(data, timeout, version) or []
+        local_keys = []
+        for key, value in data.items():
+            local_key = self._local_key(key, version)
+            local_keys.append(local_key)
+            if key not in failed:
+                self._remember(local_key, value, timeout)
+        self._publish(local_keys)
+        return failed
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        # Атомарность add обеспечивает только общий кеш
+        added = self.shared.add(key, value, timeout, version)
+        if added:
+            local_key = self._local_key(key, version)
+            self._remember(local_key, value, timeout)
+            self._publish([local_key])
+        return added
+
+    def incr(self, key, delta=1, version=None):
+        value = self.shared.incr(key, delta, version)
+        local_key = self._local_key(key, version)
+        self._remember(local_key, value)
+        self._publish([local_key])
+        return value
+
+    def touch(self, key, timeout=DEFAULT_TIMEOUT, version=None):
+        local_key = self._local_key(key, version)
+        self._forget([local_key])
+        return self.shared.touch(key, timeout, version)
+
+    def delete(self, key, version=None):
+        self.delete_many([key], version)
+
+    def delete_many(self, keys, version=None):
+        self.shared.delete_many(keys, version)
+        local_keys = [self._local_key(key, version) for key in keys]
+        self._forget(local_keys)
+        self._publish(local_keys)
+
+    def clear(self):
+        self.shared.clear()
+        self._forget(CLEAR_ALL)
+        self._publish(CLEAR_ALL)
+
+    def close(self, **kwargs):
+        # Django закрывает кеши по сигналу request_finished
+        self._flush()
@@ -0,0 +1,136 @@
+import threading
+
+from django.db.backends.sqlite3 import base
+from django.db.utils import OperationalError
+
+from core.constants import (SQLITE_BUSY_TIMEOUT, SQLITE_PRAGMAS,
+                            SQLITE_READ_STATEMENTS)
+
+_write_locks = {}
+_write_locks_guard = threading.Lock()
+
+
+def get_write_lock(name):
+    """Общая на процесс блокировка записи в файл базы."""
+
+    with _write_locks_guard:
+        return _write_locks.setdefault(name, threading.RLock())
+
+
+class CursorWrapper(base.SQLiteCursorWrapper):
+    """Одиночные записи вне транзакции тоже берут блокировку записи."""
+
+    def execute(self, query, params=None):
+        with self.db.write_guard(query):
+            return super().execute(query, params)
+
+    def executemany(self, query, param_list):
+        with self.db.write_guard(query):
+            return super().executemany(query, param_list)
+
+
+class WriteGuard:
+    __slots__ = ('db', 'acquired')
+
+    def __init__(self, db, acquired):
+        self.db = db
+        self.acquired = acquired
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        if self.acquired:
+            self.db.release_write_lock()
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+    """
+    SQLite для боевой нагрузки: WAL и прагмы из SQLITE_PRAGMAS
+    на каждом новом соединении, транзакции через BEGIN IMMEDIATE
+    и блокировка записи внутри процесса. Писатели ждут друг друга
+    на блокировке, а не на busy timeout SQLite; читатели в режиме
+    WAL не ждут никого. Прагмы можно переопределить
+    в OPTIONS['pragmas'].
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.holds_write_lock = False
+        self.busy_timeout = SQLITE_BUSY_TIMEOUT
+        self.pragmas = dict(SQLITE_PRAGMAS)
+
+    def get_connection_params(self):
+        kwargs = super().get_connection_params()
+        self.pragmas.update(kwargs.pop('pragmas', {}))
+        kwargs.setdefault('timeout', SQLITE_BUSY_TIMEOUT)
+        self.busy_timeout = kwargs['timeout']
+        return kwargs
+
+    def get_new_connection(self, conn_params):
+        conn = super().get_new_connection(conn_params)
+        for name, value in self.pragmas.items():
+            if name == 'journal_mode' and self.is_in_memory_db():
+                continue
+            conn.execute(f'PRAGMA {name} = {value}')
+        return conn
+
+    def create_cursor(self, name=None):
+        cursor = self.connection.cursor(factory=CursorWrapper)
+        cursor.db = self
+        return cursor
+
+    def acquire_write_lock(self):
+        # Единственное соединение с базой в памяти делить не с кем
+        if self.holds_write_lock or self.is_in_memory_db():
+            return False
+        lock = get_write_lock(self.settings_dict['NAME'])
+        if not lock.acquire(timeout=self.busy_timeout):
+            raise OperationalError('database is locked')
+        self.holds_write_lock = True
+        return True
+
+    def release_write_lock(self):
+        if self.holds_write_lock:
+            self.holds_write_lock = False
+            get_write_lock(self.settings_dict['NAME']).release()
+
+    def write_guard(self, query):
+        is_read = query.lstrip()[:7].upper().startswith(
+            SQLITE_READ_STATEMENTS
+        )
+        return WriteGuard(self, not (
+            is_read or self.in_atomic_block
+        ) and self.acquire_write_lock())
+
+    def _start_transaction_under_autocommit(self):
+        """
+        BEGIN IMMEDIATE сразу берёт право записи: транзакция,
+        начатая с чтения, не упадёт с "database is locked",
+        когда дойдёт до записи.
+        """
+
+        self.acquire_write_lock()
+        try:
+            self.cursor().execute('BEGIN IMMEDIATE')
+        except Exception:
+            self.release_write_lock()
+            raise
+
+    def _commit(self):
+        try:
+            return super()._commit()
+        finally:
+            self.release_write_lock()
+
+    def _rollback(self):
+        try:
+            return super()._rollback()
+        finally:
+            self.release_write_lock()
+
+    def _close(self):
+        try:
+            return super()._close()
+        finally:
+            self.release_write_lock()
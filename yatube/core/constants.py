@@ -0,0 +1,36 @@
+METRICS_PREFIX = 'yatube'
+METRICS_UNRESOLVED_VIEW = 'unresolved'
+METRICS_TIME_BUCKETS = (
+    0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0,
+)
+METRICS_QUERY_BUCKETS = (1, 2, 3, 5, 10, 20, 50, 100, 200)
+METRICS_CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+METRICS_FLUSH_INTERVAL = 1
+METRICS_PROCESSES_KEY = 'metrics:processes'
+SQLITE_BUSY_TIMEOUT = 20
+SQLITE_PRAGMAS = {
+    'journal_mode': 'WAL',
+    'synchronous': 'NORMAL',
+    'mmap_size': 256 * 1024 * 1024,
+    'cache_size': -64 * 1024,
+    'temp_store': 'MEMORY',
+}
+SQLITE_READ_STATEMENTS = ('SELECT', 'EXPLAIN')
+STRESS_THREADS = 8
+STRESS_SECONDS = 5
+STRESS_WRITE_SHARE = 0.2
+STRESS_SEED_ROWS = 1000
+REPLICA_PIN_COOKIE = 'primary_pin'
+REPLICA_PIN_SECONDS = 10
+REPLICA_PRIMARY_APPS = ('sessions',)
+REPLICA_SYNC_INTERVAL = 5
+CACHE_MAX_SIZE = 64 * 1024 * 1024
+CACHE_LRU_RESOLUTION = 10
+CACHE_BUSY_TIMEOUT = 5
+CACHE_BENCH_OPERATIONS = 5000
+CACHE_LOCAL_MAX_ENTRIES = 1000
+CACHE_LOCAL_TIMEOUT = 5
+CACHE_SYNC_INTERVAL = 0.1
+CACHE_INVALIDATION_KEY = 'two_tier:version'
+CACHE_INVALIDATION_LOG_LIMIT = 1000
+CACHE_INVALIDATION_LOG_TIMEOUT = 60
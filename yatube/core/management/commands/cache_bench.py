@@ -0,0 +1,77 @@
+import os
+import tempfile
+from time import perf_counter
+
+from django.core.cache.backends.filebased import FileBasedCache
+from django.core.cache.backends.locmem import LocMemCache
+from django.core.management.base import BaseCommand
+
+from core.backends.cache import SQLiteCache, TwoTierCache
+from core.constants import CACHE_BENCH_OPERATIONS
+
+# Примерно как фрагмент карточки поста в кеше index
+VALUE = {'html': '<article>' + 'x' * 2000 + '</article>', 'id': 1}
+MANY = 10
+
+
+def _operations(cache, operations):
+    keys = [f'bench:{number}' for number in range(operations)]
+    cache.add('bench:counter', 0)
+    return (
+        ('set', lambda number: cache.set(keys[number], VALUE)),
+        ('get', lambda number: cache.get(keys[number])),
+        # Горячие ключи вроде первой страницы index
+        ('get_hot', lambda number: cache.get(keys[number % MANY])),
+        ('get_many', lambda number: cache.get_many(
+            keys[number:number + MANY]
+        )),
+        ('incr', lambda number: cache.incr('bench:counter')),
+    )
+
+
+def bench_cache(cache, operations):
+    results = {}
+    for name, operation in _operations(cache, operations):
+        start = perf_counter()
+        for number in range(operations):
+            operation(number)
+        results[name] = operations / (perf_counter() - start)
+    return results
+
+
+class Command(BaseCommand):
+    help = (
+        'Сравнивает скорость SQLiteCache и TwoTierCache '
+        'с LocMemCache и файловым кешем.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--operations', type=int, default=CACHE_BENCH_OPERATIONS,
+        )
+
+    def handle(self, *args, **options):
+        params = {'OPTIONS': {'MAX_ENTRIES': options['operations'] * 2}}
+        with tempfile.TemporaryDirectory() as tmp:
+            caches = (
+                ('locmem', LocMemCache('bench', params)),
+                ('file', FileBasedCache(os.path.join(tmp, 'files'), params)),
+                ('sqlite', SQLiteCache(
+                    os.path.join(tmp, 'cache.sqlite3'), params,
+                )),
+                # Каждая запись оставляет ещё и сообщение об инвалидации
+                ('two_tier', TwoTierCache(None, {}, shared=SQLiteCache(
+                    os.path.join(tmp, 'two_tier.sqlite3'),
+                    {'OPTIONS': {'MAX_ENTRIES': options['operations'] * 4}},
+                ))),
+            )
+            for name, cache in caches:
+                results = bench_cache(cache, options['operations'])
+                self.stdout.write(f'{name:<10}' + '  '.join(
+                    f'{operation} {rate:>9.0f}/с'
+                    for operation, rate in results.items()
+                ))
+        self.stdout.write(
+            'locmem не делится между процессами: при N воркерах '
+            'доля попаданий у него около 1/N.'
+        )
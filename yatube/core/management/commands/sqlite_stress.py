@@ -0,0 +1,37 @@
+from django.core.management.base import BaseCommand
+
+from core.constants import STRESS_SECONDS, STRESS_THREADS
+from core.stress import PROFILES, run_stress
+
+
+class Command(BaseCommand):
+    help = (
+        'Сравнивает пропускную способность SQLite с настройками '
+        'по умолчанию и с боевым профилем под конкурентной нагрузкой.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--threads', type=int, default=STRESS_THREADS)
+        parser.add_argument('--seconds', type=float, default=STRESS_SECONDS)
+        parser.add_argument(
+            '--profile',
+            nargs='+',
+            choices=sorted(PROFILES),
+            default=['default', 'tuned'],
+        )
+
+    def handle(self, *args, **options):
+        results = [
+            run_stress(name, options['threads'], options['seconds'])
+            for name in options['profile']
+        ]
+        for result in results:
+            self.stdout.write(
+                f'{result["profile"]:<8} {result["ops_per_second"]:>9} оп/с  '
+                f'записей {result["writes_per_second"]:>8}/с  '
+                f'ошибок {result["errors"]}'
+            )
+        if len(results) == 2 and results[0]['ops_per_second']:
+            self.stdout.write('Ускорение: {:.1f}x'.format(
+                results[1]['ops_per_second'] / results[0]['ops_per_second']
+            ))
@@ -0,0 +1,54 @@
+import sqlite3
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS, connections
+
+from core.constants import REPLICA_SYNC_INTERVAL
+
+
+def copy_sqlite_database(source, target_name):
+    """Копирует базу SQLite онлайн-бэкапом: читатели копии не ждут."""
+
+    target = sqlite3.connect(target_name)
+    try:
+        source.backup(target)
+    finally:
+        target.close()
+
+
+class Command(BaseCommand):
+    help = (
+        'Копирует основную базу SQLite в файлы реплик. Заменяет '
+        'репликацию при локальной проверке роутера чтения и записи.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--loop',
+            action='store_true',
+            help='Повторять копирование, изображая отстающую реплику.',
+        )
+        parser.add_argument(
+            '--interval', type=float, default=REPLICA_SYNC_INTERVAL,
+        )
+
+    def handle(self, *args, **options):
+        if not settings.DATABASE_REPLICAS:
+            raise CommandError(
+                'Реплики не настроены: задайте YATUBE_REPLICA=1.'
+            )
+        primary = connections[DEFAULT_DB_ALIAS]
+        if primary.vendor != 'sqlite':
+            raise CommandError('Копирование работает только для SQLite.')
+
+        while True:
+            primary.ensure_connection()
+            for alias in settings.DATABASE_REPLICAS:
+                name = connections[alias].settings_dict['NAME']
+                copy_sqlite_database(primary.connection, name)
+                self.stdout.write(f'{alias}: скопировано')
+            if not options['loop']:
+                break
+            time.sleep(options['interval'])
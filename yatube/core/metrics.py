@@ -0,0 +1,269 @@
+import os
+import threading
+from bisect import bisect_left
+from time import monotonic, perf_counter
+
+from django.core.cache import cache
+from django.template import TemplateDoesNotExist
+from django.template.backends.django import (DjangoTemplates, Template,
+                                             reraise)
+
+from .constants import (METRICS_FLUSH_INTERVAL, METRICS_PREFIX,
+                        METRICS_PROCESSES_KEY, METRICS_QUERY_BUCKETS,
+                        METRICS_TIME_BUCKETS)
+
+HISTOGRAMS = (
+    ('request_duration_seconds', 'Время обработки запроса.',
+     METRICS_TIME_BUCKETS),
+    ('db_queries', 'Число SQL-запросов за запрос.', METRICS_QUERY_BUCKETS),
+    ('db_duration_seconds', 'Время SQL-запросов за запрос.',
+     METRICS_TIME_BUCKETS),
+    ('template_render_seconds', 'Время рендера шаблонов за запрос.',
+     METRICS_TIME_BUCKETS),
+)
+
+_local = threading.local()
+
+
+class RequestSample:
+    """Замеры одного запроса: SQL и рендер шаблонов."""
+
+    __slots__ = ('queries', 'db_time', 'render_time')
+
+    def __init__(self):
+        self.queries = 0
+        self.db_time = 0.0
+        self.render_time = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        start = perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.db_time += perf_counter() - start
+            self.queries += 1
+
+
+def start_sample():
+    _local.sample = RequestSample()
+    return _local.sample
+
+
+def stop_sample():
+    _local.sample = None
+
+
+def current_sample():
+    return getattr(_local, 'sample', None)
+
+
+class Histogram:
+    __slots__ = ('bounds', 'buckets', 'sum', 'count')
+
+    def __init__(self, bounds):
+        self.bounds = bounds
+        self.buckets = [0] * (len(bounds) + 1)
+        self.sum = 0
+        self.count = 0
+
+    def observe(self, value):
+        self.buckets[bisect_left(self.bounds, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def merge(self, buckets, total, count):
+        self.buckets = [a + b for a, b in zip(self.buckets, buckets)]
+        self.sum += total
+        self.count += count
+
+
+def _labels(**labels):
+    escaped = (
+        '{}="{}"'.format(name, str(value).replace('\\', r'\\')
+                         .replace('"', r'\"').replace('\n', r'\n'))
+        for name, value in labels.items()
+    )
+    return '{' + ','.join(escaped) + '}'
+
+
+class Registry:
+    """
+    Гистограммы по имени URL. Процесс копит свои в памяти и не чаще
+    раза в METRICS_FLUSH_INTERVAL секунд кладёт их снимок в общий кеш
+    под своим номером. Эндпоинт складывает снимки всех процессов,
+    как multiprocess-режим клиента Prometheus, поэтому любой воркер
+    отдаёт метрики всего сайта. Снимки завершившихся процессов
+    остаются, и счётчики не уменьшаются.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._histograms = {name: {} for name, _, _ in HISTOGRAMS}
+        self._collectors = []
+        self._pid = os.getpid()
+        self._slot = None
+        self._flushed = float('-inf')
+
+    def observe(self, view, **values):
+        with self._lock:
+            # После fork у процесса свои замеры и свой номер
+            if self._pid != os.getpid():
+                self._pid, self._slot = os.getpid(), None
+                self._clear()
+            for name, _, bounds in HISTOGRAMS:
+                histogram = self._histograms[name].get(view)
+                if histogram is None:
+                    histogram = self._histograms[name][view] = Histogram(
+                        bounds
+                    )
+                histogram.observe(values[name])
+        if monotonic() - self._flushed >= METRICS_FLUSH_INTERVAL:
+            self.flush(wait=False)
+
+    def _snapshot(self):
+        with self._lock:
+            return {
+                name: {
+                    view: (
+                        list(histogram.buckets), histogram.sum,
+                        histogram.count,
+                    )
+                    for view, histogram in histograms.items()
+                }
+                for name, histograms in self._histograms.items()
+            }
+
+    def _register(self):
+        """Номер процесса: атомарный счётчик в общем кеше."""
+
+        try:
+            return cache.incr(METRICS_PROCESSES_KEY)
+        except ValueError:
+            if cache.add(METRICS_PROCESSES_KEY, 1, None):
+                return 1
+            return cache.incr(METRICS_PROCESSES_KEY)
+
+    def flush(self, wait=True):
+        """Кладёт снимок гистограмм процесса в общий кеш."""
+
+        if not self._flush_lock.acquire(wait):
+            return
+        try:
+            self._flushed = monotonic()
+            # Номер пропадает вместе со счётчиком, если кеш очистили
+            if self._slot is None or self._slot > cache.get(
+                METRICS_PROCESSES_KEY, 0,
+            ):
+                self._slot = self._register()
+            cache.set(
+                f'{METRICS_PROCESSES_KEY}:{self._slot}', self._snapshot(),
+                None,
+            )
+        finally:
+            self._flush_lock.release()
+
+    def collect(self):
+        """Гистограммы всех процессов, сложенные по имени URL."""
+
+        self.flush()
+        processes = cache.get(METRICS_PROCESSES_KEY, 0)
+        snapshots = cache.get_many([
+            f'{METRICS_PROCESSES_KEY}:{slot}'
+            for slot in range(1, processes + 1)
+        ])
+        merged = {}
+        for name, _, bounds in HISTOGRAMS:
+            merged[name] = {}
+            for snapshot in snapshots.values():
+                for view, values in snapshot.get(name, {}).items():
+                    if view not in merged[name]:
+                        merged[name][view] = Histogram(bounds)
+                    merged[name][view].merge(*values)
+        return merged
+
+    def register_collector(self, collector):
+        """
+        Подключает источник дополнительных метрик: функцию,
+        возвращающую кортежи (имя, тип, описание, значение).
+        """
+
+        if collector not in self._collectors:
+            self._collectors.append(collector)
+
+    def total(self, name):
+        """Сумма гистограммы name по всем вью в этом процессе."""
+
+        with self._lock:
+            return sum(
+                histogram.sum for histogram in self._histograms[name].values()
+            )
+
+    def _clear(self):
+        for histograms in self._histograms.values():
+            histograms.clear()
+
+    def reset(self):
+        with self._lock:
+            self._clear()
+            self._slot = None
+
+    def export(self):
+        """Все метрики в текстовом формате Prometheus."""
+
+        lines = []
+        histograms = self.collect()
+        for name, help_text, bounds in HISTOGRAMS:
+            metric = f'{METRICS_PREFIX}_{name}'
+            lines.append(f'# HELP {metric} {help_text}')
+            lines.append(f'# TYPE {metric} histogram')
+            for view, histogram in sorted(histograms[name].items()):
+                total = 0
+                for bound, hits in zip(bounds + ('+Inf',), histogram.buckets):
+                    total += hits
+                    labels = _labels(view=view, le=bound)
+                    lines.append(f'{metric}_bucket{labels} {total}')
+                labels = _labels(view=view)
+                lines.append(f'{metric}_sum{labels} {histogram.sum}')
+                lines.append(f'{metric}_count{labels} {histogram.count}')
+
+        for collector in self._collectors:
+            for name, metric_type, help_text, value in collector():
+                metric = f'{METRICS_PREFIX}_{name}'
+                lines.append(f'# HELP {metric} {help_text}')
+                lines.append(f'# TYPE {metric} {metric_type}')
+                lines.append(f'{metric} {value}')
+
+        return '\n'.join(lines) + '\n'
+
+
+registry = Registry()
+
+
+class TimedTemplate(Template):
+    def render(self, context=None, request=None):
+        sample = current_sample()
+        if sample is None:
+            return super().render(context, request)
+
+        start = perf_counter()
+        try:
+            return super().render(context, request)
+        finally:
+            sample.render_time += perf_counter() - start
+
+
+class TimedDjangoTemplates(DjangoTemplates):
+    """
+    Шаблонный бэкенд Django, замеряющий время рендера.
+    Вложенные {% include %} идут мимо бэкенда и не считаются дважды.
+    """
+
+    def from_string(self, template_code):
+        return TimedTemplate(self.engine.from_string(template_code), self)
+
+    def get_template(self, template_name):
+        try:
+            return TimedTemplate(self.engine.get_template(template_name), self)
+        except TemplateDoesNotExist as exc:
+            reraise(exc, self)
@@ -0,0 +1,79 @@
+from contextlib import ExitStack
+from time import perf_counter
+
+from django.db import connections
+from django.utils.cache import patch_cache_control
+
+from .constants import (METRICS_UNRESOLVED_VIEW, REPLICA_PIN_COOKIE,
+                        REPLICA_PIN_SECONDS)
+from .metrics import registry, start_sample, stop_sample
+from .routers import allow_replica_reads, has_written
+
+
+class MetricsMiddleware:
+    """
+    Пишет в гистограммы по имени URL время запроса,
+    число и время SQL-запросов и время рендера шаблонов.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        sample = start_sample()
+        start = perf_counter()
+        try:
+            with ExitStack() as stack:
+                for connection in connections.all():
+                    stack.enter_context(connection.execute_wrapper(sample))
+                response = self.get_response(request)
+        finally:
+            stop_sample()
+
+        match = request.resolver_match
+        registry.observe(
+            match.view_name if match else METRICS_UNRESOLVED_VIEW,
+            request_duration_seconds=perf_counter() - start,
+            db_queries=sample.queries,
+            db_duration_seconds=sample.db_time,
+            template_render_seconds=sample.render_time,
+        )
+
+        return response
+
+
+class ReplicaPinningMiddleware:
+    """
+    Безопасные запросы читают с реплик. Запрос, который что-то
+    записал, ставит cookie, и следующие REPLICA_PIN_SECONDS секунд
+    запросы этого клиента читают с основной базы: автор сразу видит
+    свой пост, даже если реплика ещё отстаёт.
+
+    Ответ с любой cookie - этой или поставленной внутренними
+    middleware - личный: общему кешу его отдавать нельзя, даже если
+    вью пометила страницу как public.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        allow_replica_reads(
+            request.method in ('GET', 'HEAD', 'OPTIONS')
+            and REPLICA_PIN_COOKIE not in request.COOKIES
+        )
+        try:
+            response = self.get_response(request)
+            if has_written():
+                response.set_cookie(
+                    REPLICA_PIN_COOKIE, '1',
+                    max_age=REPLICA_PIN_SECONDS,
+                    httponly=True,
+                    samesite='Lax',
+                )
+            if response.cookies:
+                patch_cache_control(response, private=True)
+        finally:
+            allow_replica_reads(False)
+
+        return response
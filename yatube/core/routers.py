@@ -0,0 +1,60 @@
+import random
+import threading
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS
+
+from .constants import REPLICA_PRIMARY_APPS
+
+_state = threading.local()
+
+
+def allow_replica_reads(allowed=True):
+    """
+    Разрешает читать с реплик в текущем потоке. Вне запросов
+    (команды, воркеры) чтение всегда идёт с основной базы.
+    """
+
+    _state.replicas_allowed = allowed
+    _state.wrote = False
+
+
+def pin_primary():
+    """Отправляет все дальнейшие чтения потока на основную базу."""
+
+    _state.replicas_allowed = False
+    _state.wrote = True
+
+
+def has_written():
+    return getattr(_state, 'wrote', False)
+
+
+class PrimaryReplicaRouter:
+    """
+    Запись - всегда в основную базу, чтение в рамках запроса -
+    со случайной реплики из settings.DATABASE_REPLICAS.
+    После первой записи поток до конца запроса читает с основной базы.
+    """
+
+    def db_for_read(self, model, **hints):
+        replicas = settings.DATABASE_REPLICAS
+        if (not replicas
+                or not getattr(_state, 'replicas_allowed', False)
+                or model._meta.app_label in REPLICA_PRIMARY_APPS):
+            return DEFAULT_DB_ALIAS
+        return random.choice(replicas)
+
+    def db_for_write(self, model, **hints):
+        pin_primary()
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        databases = {DEFAULT_DB_ALIAS, *settings.DATABASE_REPLICAS}
+        if obj1._state.db in databases and obj2._state.db in databases:
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # Реплики получают схему вместе с данными от основной базы
+        return db not in settings.DATABASE_REPLICAS
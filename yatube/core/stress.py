@@ -0,0 +1,128 @@
+import os
+import random
+import tempfile
+import threading
+from time import perf_counter
+
+from django.db import DEFAULT_DB_ALIAS
+from django.db.utils import ConnectionHandler, DatabaseError
+
+from .constants import STRESS_SEED_ROWS, STRESS_WRITE_SHARE
+
+# Настройки как у проекта до и после перехода на боевой профиль SQLite
+PROFILES = {
+    'default': {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'CONN_MAX_AGE': 0,
+    },
+    'tuned': {
+        'ENGINE': 'core.backends.sqlite3',
+        'CONN_MAX_AGE': None,
+    },
+}
+
+
+def _atomic(db, statements):
+    """Повторяет то, что делает внешний transaction.atomic."""
+
+    db.set_autocommit(
+        False, force_begin_transaction_with_broken_autocommit=True,
+    )
+    try:
+        with db.cursor() as cursor:
+            for sql, params in statements:
+                cursor.execute(sql, params)
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+    finally:
+        db.set_autocommit(True)
+
+
+def _worker(handler, profile, deadline, seed, totals, totals_lock):
+    rng = random.Random(seed)
+    reads = writes = errors = 0
+    while perf_counter() < deadline:
+        db = handler[DEFAULT_DB_ALIAS]
+        try:
+            if rng.random() < STRESS_WRITE_SHARE:
+                # Запись как в add_comment: сначала чтение, потом вставка
+                _atomic(db, [
+                    ('SELECT COUNT(*) FROM stress WHERE author = %s',
+                     [rng.randrange(100)]),
+                    ('INSERT INTO stress (author, text) VALUES (%s, %s)',
+                     [rng.randrange(100), 'x' * rng.randrange(50, 500)]),
+                ])
+                writes += 1
+            else:
+                with db.cursor() as cursor:
+                    cursor.execute(
+                        'SELECT id, text FROM stress WHERE author = %s '
+                        'ORDER BY id DESC LIMIT 10',
+                        [rng.randrange(100)],
+                    )
+                    cursor.fetchall()
+                reads += 1
+        except DatabaseError:
+            errors += 1
+        if not profile['CONN_MAX_AGE']:
+            # Без постоянных соединений каждый запрос открывает новое
+            db.close()
+
+    handler[DEFAULT_DB_ALIAS].close()
+    with totals_lock:
+        totals['reads'] += reads
+        totals['writes'] += writes
+        totals['errors'] += errors
+
+
+def run_stress(profile_name, threads, seconds, directory=None):
+    """
+    Гоняет смешанную нагрузку чтения и записи из нескольких потоков
+    по отдельному файлу базы и возвращает пропускную способность.
+    """
+
+    profile = PROFILES[profile_name]
+    with tempfile.TemporaryDirectory(dir=directory) as tmp:
+        handler = ConnectionHandler({DEFAULT_DB_ALIAS: {
+            **profile,
+            'NAME': os.path.join(tmp, f'{profile_name}.sqlite3'),
+        }})
+        db = handler[DEFAULT_DB_ALIAS]
+        with db.cursor() as cursor:
+            cursor.execute(
+                'CREATE TABLE stress (id INTEGER PRIMARY KEY, '
+                'author INTEGER NOT NULL, text TEXT NOT NULL)'
+            )
+            cursor.execute('CREATE INDEX stress_author ON stress (author)')
+            cursor.executemany(
+                'INSERT INTO stress (author, text) VALUES (%s, %s)',
+                [(number % 100, 'x' * 200)
+                 for number in range(STRESS_SEED_ROWS)],
+            )
+        db.close()
+
+        totals = {'reads': 0, 'writes': 0, 'errors': 0}
+        totals_lock = threading.Lock()
+        start = perf_counter()
+        workers = [
+            threading.Thread(target=_worker, args=(
+                handler, profile, start + seconds, seed, totals, totals_lock,
+            ))
+            for seed in range(threads)
+        ]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+        elapsed = perf_counter() - start
+
+    return {
+        'profile': profile_name,
+        'threads': threads,
+        'ops_per_second': round((totals['reads'] + totals['writes'])
+                                / elapsed, 1),
+        'writes_per_second': round(totals['writes'] / elapsed, 1),
+        **totals,
+    }
@@ -0,0 +1,206 @@
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from unittest import mock
+
+from django.conf import settings
+from django.test import SimpleTestCase
+
+from core.backends.cache import SQLiteCache, TwoTierCache
+from core.constants import CACHE_INVALIDATION_KEY
+
+
+class TestSQLiteCache(SimpleTestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmp.name, 'cache.sqlite3')
+        self.cache = SQLiteCache(self.path, {
+            'OPTIONS': {'MAX_ENTRIES': 3, 'LRU_RESOLUTION': 0},
+        })
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_basic_operations(self):
+        """Тестируем get/set/add/delete, пакетные операции и incr."""
+
+        self.cache.set('post', {'text': 'Пост'})
+        self.assertEqual(self.cache.get('post'), {'text': 'Пост'})
+        self.assertFalse(self.cache.add('post', 'другой'))
+        self.assertTrue(self.cache.add('counter', 1))
+        self.assertEqual(self.cache.incr('counter', 5), 6)
+        self.assertEqual(self.cache.decr('counter'), 5)
+        with self.assertRaises(ValueError):
+            self.cache.incr('missing')
+
+        self.cache.set_many({'a': 1, 'b': [2]})
+        self.assertEqual(
+            self.cache.get_many(['a', 'b', 'missing']), {'a': 1, 'b': [2]}
+        )
+        self.cache.delete_many(['a', 'b'])
+        self.assertFalse(self.cache.has_key('a'))
+
+        self.cache.set('short', 'value', timeout=0)
+        self.assertIsNone(self.cache.get('short'))
+        self.assertTrue(self.cache.add('short', 'new'))
+
+    def test_lru_eviction(self):
+        """Тестируем, что при переполнении вытесняется давно читанное."""
+
+        clock = iter(range(1000))
+        with mock.patch('core.backends.cache.time') as time_mock:
+            time_mock.time.side_effect = lambda: float(next(clock))
+            self.cache.set_many({'a': 1})
+            self.cache.set_many({'b': 2})
+            self.cache.set_many({'c': 3})
+            self.cache.get('a')
+            self.cache.set_many({'d': 4})
+
+            self.assertEqual(
+                sorted(self.cache.get_many(['a', 'b', 'c', 'd'])),
+                ['a', 'c', 'd'],
+            )
+
+    def test_size_limit(self):
+        """Тестируем ограничение кеша по объёму в байтах."""
+
+        cache = SQLiteCache(self.path, {'OPTIONS': {'MAX_SIZE': 1000}})
+        for number in range(10):
+            cache.set(f'post:{number}', 'x' * 300)
+
+        entries, size = cache._connection().execute(
+            'SELECT entries, bytes FROM cache_stats'
+        ).fetchone()
+        self.assertLessEqual(size, 1000)
+        self.assertTrue(cache.has_key('post:9'))
+
+    def test_shared_between_processes(self):
+        """Тестируем, что запись из другого процесса видна сразу."""
+
+        self.cache.set('generation', 1)
+        subprocess.run([sys.executable, '-c', (
+            'from django.conf import settings; settings.configure(); '
+            'from core.backends.cache import SQLiteCache; '
+            f'cache = SQLiteCache({self.path!r}, {{}}); '
+            "cache.incr('generation'); cache.set('from_child', 'привет')"
+        )], check=True, cwd=settings.BASE_DIR)
+
+        self.assertEqual(self.cache.get('generation'), 2)
+        self.assertEqual(self.cache.get('from_child'), 'привет')
+
+
+class TestTwoTierCache(SimpleTestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.shared = SQLiteCache(
+            os.path.join(self.tmp.name, 'cache.sqlite3'), {},
+        )
+        # Два «процесса» над одним общим кешем, сверка на каждом чтении
+        params = {'OPTIONS': {'SYNC_INTERVAL': 0, 'LOCAL_MAX_ENTRIES': 2}}
+        self.first = TwoTierCache(None, params, shared=self.shared)
+        self.second = TwoTierCache(None, params, shared=self.shared)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_local_hit_skips_shared_cache(self):
+        """Тестируем, что повторное чтение не ходит в общий кеш за ключом."""
+
+        self.first.set('index', 'страница')
+        self.assertEqual(self.second.get('index'), 'страница')
+        with mock.patch.object(
+            self.shared, 'get_many', wraps=self.shared.get_many,
+        ) as get_many:
+            self.assertEqual(self.second.get('index'), 'страница')
+            self.assertEqual(
+                self.second.get_many(['index']), {'index': 'страница'},
+            )
+        get_many.assert_not_called()
+
+    def test_set_many_with_wrapped_shared_cache(self):
+        """
+        Тестируем запись через общий кеш, чей set_many
+        возвращает None, как у обёрток debug_toolbar.
+        """
+
+        with mock.patch.object(self.shared, 'set_many', return_value=None):
+            self.assertEqual(self.first.set_many({'index': 'страница'}), [])
+        self.assertEqual(self.first.get('index'), 'страница')
+
+    def test_invalidation_between_processes(self):
+        """
+        Тестируем, что запись, incr, удаление и clear в одном процессе
+        выбрасывают ключ из локальной копии другого.
+        """
+
+        self.first.set('generation', 1)
+        self.assertEqual(self.second.get('generation'), 1)
+
+        self.first.set('generation', 2)
+        self.assertEqual(self.second.get('generation'), 2)
+        self.assertEqual(self.first.incr('generation'), 3)
+        self.assertEqual(self.second.get('generation'), 3)
+
+        self.first.delete('generation')
+        self.assertIsNone(self.second.get('generation'))
+
+        self.second.set('user', 'Имя')
+        self.assertEqual(self.first.get('user'), 'Имя')
+        self.second.clear()
+        self.assertIsNone(self.first.get('user'))
+
+    def test_publishes_are_batched(self):
+        """
+        Тестируем, что записи одного запроса рассылаются
+        одним сообщением, самое позднее при close.
+        """
+
+        params = {'OPTIONS': {'SYNC_INTERVAL': 60}}
+        writer = TwoTierCache(None, params, shared=self.shared)
+        self.second.set('hits', 0)
+        self.assertEqual(self.second.get('hits'), 0)
+
+        writer.set('page', 'страница')
+        for _ in range(3):
+            writer.incr('hits')
+        self.assertEqual(self.shared.get(CACHE_INVALIDATION_KEY), 2)
+        self.assertEqual(self.second.get('hits'), 0)
+
+        writer.close()
+        self.assertEqual(self.shared.get(CACHE_INVALIDATION_KEY), 3)
+        self.assertEqual(
+            self.shared.get(f'{CACHE_INVALIDATION_KEY}:3'),
+            [self.shared.make_key('hits')],
+        )
+        self.assertEqual(self.second.get('hits'), 3)
+
+    def test_local_ttl_and_lru(self):
+        """Тестируем короткий срок жизни и размер локальной копии."""
+
+        self.first.set_many({'a': 1, 'b': 2, 'c': 3})
+        self.assertEqual(list(self.first._local), [
+            self.shared.make_key('b'), self.shared.make_key('c'),
+        ])
+
+        # Запись в обход двухуровневого кеша не рассылает инвалидацию
+        self.shared.set('c', 30)
+        self.assertEqual(self.first.get('c'), 3)
+        with mock.patch('core.backends.cache.time.monotonic',
+                        return_value=time.monotonic() + 60):
+            self.assertEqual(self.first.get('c'), 30)
+
+    def test_lagging_process_drops_local_copy(self):
+        """
+        Тестируем, что при пропущенных сообщениях об инвалидации
+        локальная копия сбрасывается целиком.
+        """
+
+        self.first.set('a', 1)
+        self.assertEqual(self.second.get('a'), 1)
+        self.first.set('a', 2)
+        self.shared.delete(f'{CACHE_INVALIDATION_KEY}:2')
+        self.shared.set('a', 3)
+
+        self.assertEqual(self.second.get('a'), 3)
@@ -0,0 +1,104 @@
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import connection
+from django.test import Client, TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from core.metrics import Registry, registry
+from posts.cache import page_cache_stats
+
+User = get_user_model()
+
+
+class TestMetrics(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.staff = User.objects.create_user(
+            username='staff', is_staff=True,
+        )
+
+    def setUp(self):
+        cache.clear()
+        registry.reset()
+        self.guest_client = Client()
+        self.staff_client = Client()
+        self.staff_client.force_login(self.staff)
+
+    def test_metrics_for_staff_only(self):
+        """Тестируем, что метрики отдаются только персоналу."""
+
+        response = self.guest_client.get(reverse('metrics'))
+        self.assertEqual(response.status_code, 302)
+
+        response = self.staff_client.get(reverse('metrics'))
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response['Content-Type'].startswith('text/plain'))
+
+    def test_view_histograms(self):
+        """Тестируем гистограммы времени, SQL и рендера по имени URL."""
+
+        # Первый запрос строит список id ленты, второй берёт его из кеша
+        queries = 0
+        for _ in range(2):
+            with CaptureQueriesContext(connection) as context:
+                self.guest_client.get(reverse('posts:index'))
+            queries += len(context.captured_queries)
+        self.assertEqual(page_cache_stats(), {'hits': 1, 'misses': 1})
+        self.guest_client.get('/unexisting_page/')
+        content = self.staff_client.get(reverse('metrics')).content.decode()
+
+        for metric in ('request_duration_seconds', 'db_duration_seconds',
+                       'template_render_seconds'):
+            with self.subTest(metric=metric):
+                self.assertIn(f'# TYPE yatube_{metric} histogram', content)
+                self.assertIn(
+                    f'yatube_{metric}_count{{view="posts:index"}} 2', content
+                )
+        self.assertIn(
+            'yatube_db_queries_bucket{view="posts:index",le="+Inf"} 2',
+            content,
+        )
+        self.assertIn(
+            f'yatube_db_queries_sum{{view="posts:index"}} {queries}', content,
+        )
+        self.assertIn(
+            'yatube_request_duration_seconds_count{view="unresolved"} 1',
+            content,
+        )
+
+    def test_metrics_from_all_processes(self):
+        """
+        Тестируем, что эндпоинт складывает замеры всех процессов,
+        а не только того воркера, который ответил.
+        """
+
+        worker = Registry()
+        worker.observe(
+            'posts:index', request_duration_seconds=0.1, db_queries=3,
+            db_duration_seconds=0.01, template_render_seconds=0.02,
+        )
+        worker.flush()
+        registry.observe(
+            'posts:index', request_duration_seconds=0.1, db_queries=4,
+            db_duration_seconds=0.01, template_render_seconds=0.02,
+        )
+        content = registry.export()
+
+        self.assertIn(
+            'yatube_db_queries_count{view="posts:index"} 2', content
+        )
+        self.assertIn('yatube_db_queries_sum{view="posts:index"} 7', content)
+
+    def test_page_cache_counters(self):
+        """Тестируем, что счётчики страничного кеша попадают в метрики."""
+
+        user = User.objects.create_user(username='author')
+        url = reverse('posts:profile', kwargs={'username': user.username})
+        self.guest_client.get(url)
+        self.guest_client.get(url)
+        content = self.staff_client.get(reverse('metrics')).content.decode()
+
+        self.assertIn('yatube_page_cache_hits_total 1', content)
+        self.assertIn('yatube_page_cache_misses_total 1', content)
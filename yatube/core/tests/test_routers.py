@@ -0,0 +1,120 @@
+import os
+import sqlite3
+import tempfile
+
+from django.contrib.sessions.models import Session
+from django.http import HttpResponse
+from django.test import RequestFactory, TestCase, override_settings
+from django.utils.cache import patch_cache_control
+
+from core.constants import REPLICA_PIN_COOKIE
+from core.management.commands.sync_replicas import copy_sqlite_database
+from core.middleware import ReplicaPinningMiddleware
+from core.routers import PrimaryReplicaRouter, allow_replica_reads
+from posts.models import Post, User
+
+
+@override_settings(DATABASE_REPLICAS=['replica'])
+class TestPrimaryReplicaRouter(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='author')
+
+    def setUp(self):
+        self.router = PrimaryReplicaRouter()
+        self.factory = RequestFactory()
+
+    def tearDown(self):
+        allow_replica_reads(False)
+
+    def route_reads(self, request):
+        """Прогоняет запрос через middleware и запоминает базу чтения."""
+
+        routed = []
+
+        def view(request):
+            routed.append(self.router.db_for_read(Post))
+            if request.method == 'POST':
+                self.router.db_for_write(Post)
+                routed.append(self.router.db_for_read(Post))
+            return HttpResponse()
+
+        response = ReplicaPinningMiddleware(view)(request)
+        return routed, response
+
+    def test_reads_outside_requests_use_primary(self):
+        """Тестируем, что команды и воркеры читают с основной базы."""
+
+        self.assertEqual(self.router.db_for_read(Post), 'default')
+        self.assertEqual(self.router.db_for_write(Post), 'default')
+
+    def test_safe_request_reads_from_replica(self):
+        """Тестируем, что GET читает с реплики, а сессии - с основной."""
+
+        routed, response = self.route_reads(self.factory.get('/'))
+
+        self.assertEqual(routed, ['replica'])
+        self.assertNotIn(REPLICA_PIN_COOKIE, response.cookies)
+
+        allow_replica_reads()
+        self.assertEqual(self.router.db_for_read(Session), 'default')
+
+    def test_write_pins_reads_to_primary(self):
+        """
+        Тестируем, что после записи чтения идут с основной базы
+        и до конца запроса, и в запросах с cookie-меткой.
+        """
+
+        routed, response = self.route_reads(self.factory.post('/'))
+        self.assertEqual(routed, ['default', 'default'])
+        self.assertIn(REPLICA_PIN_COOKIE, response.cookies)
+
+        request = self.factory.get('/')
+        request.COOKIES[REPLICA_PIN_COOKIE] = '1'
+        routed, _ = self.route_reads(request)
+        self.assertEqual(routed, ['default'])
+
+    def test_response_with_cookie_is_private(self):
+        """Тестируем, что ответ с cookie не уходит в общий кеш."""
+
+        def view(request):
+            self.router.db_for_write(Post)
+            response = HttpResponse()
+            patch_cache_control(response, public=True, max_age=10)
+            return response
+
+        response = ReplicaPinningMiddleware(view)(self.factory.get('/'))
+
+        self.assertIn(REPLICA_PIN_COOKIE, response.cookies)
+        self.assertIn('private', response['Cache-Control'])
+        self.assertNotIn('public', response['Cache-Control'])
+
+    def test_post_create_sets_pin_cookie(self):
+        """Тестируем, что новый пост закрепляет автора за основной базой."""
+
+        self.client.force_login(self.user)
+        response = self.client.post('/create/', {'text': 'Новый пост'})
+
+        self.assertIn(REPLICA_PIN_COOKIE, response.cookies)
+
+
+class TestSyncReplicas(TestCase):
+    def test_copy_sqlite_database(self):
+        """Тестируем копию основной базы, заменяющую реплику локально."""
+
+        with tempfile.TemporaryDirectory() as tmp:
+            source = sqlite3.connect(os.path.join(tmp, 'primary.sqlite3'))
+            source.execute('CREATE TABLE post (text TEXT)')
+            source.execute("INSERT INTO post VALUES ('Первый пост')")
+            source.commit()
+
+            replica_name = os.path.join(tmp, 'replica.sqlite3')
+            copy_sqlite_database(source, replica_name)
+            source.close()
+
+            replica = sqlite3.connect(replica_name)
+            rows = replica.execute('SELECT text FROM post').fetchall()
+            replica.close()
+
+        self.assertEqual(rows, [('Первый пост',)])
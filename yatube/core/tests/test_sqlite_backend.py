@@ -0,0 +1,47 @@
+import os
+import tempfile
+
+from django.db import DEFAULT_DB_ALIAS
+from django.db.utils import ConnectionHandler
+from django.test import SimpleTestCase
+
+from core.stress import run_stress
+
+
+class TestSqliteBackend(SimpleTestCase):
+    def test_connection_pragmas(self):
+        """Тестируем, что новое соединение включает WAL и прагмы."""
+
+        with tempfile.TemporaryDirectory() as tmp:
+            handler = ConnectionHandler({DEFAULT_DB_ALIAS: {
+                'ENGINE': 'core.backends.sqlite3',
+                'NAME': os.path.join(tmp, 'db.sqlite3'),
+                'OPTIONS': {'pragmas': {'cache_size': -1024}},
+            }})
+            db = handler[DEFAULT_DB_ALIAS]
+            with db.cursor() as cursor:
+                pragmas = {}
+                for name in ('journal_mode', 'synchronous', 'cache_size',
+                             'busy_timeout'):
+                    cursor.execute(f'PRAGMA {name}')
+                    pragmas[name] = cursor.fetchone()[0]
+            db.close()
+
+        self.assertEqual(pragmas, {
+            'journal_mode': 'wal',
+            'synchronous': 1,
+            'cache_size': -1024,
+            'busy_timeout': 20000,
+        })
+
+    def test_concurrent_writes_do_not_lock(self):
+        """
+        Тестируем, что конкурентные транзакции «чтение, потом запись»
+        проходят без ошибок "database is locked".
+        """
+
+        result = run_stress('tuned', threads=4, seconds=0.5)
+
+        self.assertEqual(result['errors'], 0)
+        self.assertGreater(result['writes'], 0)
+        self.assertGreater(result['reads'], 0)
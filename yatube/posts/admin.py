@@ -1,6 +1,8 @@
 from django.contrib import admin
 
+from .constants import SEARCH_ADMIN_LIMIT
 from .models import Group, Post
+from .search import search_post_ids
 
 
 @admin.register(Post)
@@ -13,5 +15,16 @@ class PostAdmin(admin.ModelAdmin):
     list_filter = ('created',)
     empty_value_display = '-пусто-'
 
+    def get_search_results(self, request, queryset, search_term):
+        """Ищет по полнотекстовому индексу вместо LIKE '%...%'."""
+
+        if not search_term:
+            return queryset, False
+
+        post_ids, _ = search_post_ids(
+            search_term, limit=SEARCH_ADMIN_LIMIT,
+        )
+        return queryset.filter(pk__in=post_ids), False
+
 
 admin.site.register(Group)
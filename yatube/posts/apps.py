@@ -3,3 +3,11 @@ from django.apps import AppConfig
 
 class PostsConfig(AppConfig):
     name = 'posts'
+
+    def ready(self):
+        from core.metrics import registry
+
+        from . import signals  # noqa: F401
+        from .cache import cache_metrics
+
+        registry.register_collector(cache_metrics)
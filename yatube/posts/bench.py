@@ -0,0 +1,421 @@
+import heapq
+import math
+import platform
+import random
+import tracemalloc
+from collections import Counter, defaultdict, namedtuple
+from contextlib import ExitStack
+from datetime import timedelta
+from itertools import accumulate
+from time import perf_counter
+
+import django
+from django.contrib.auth.hashers import make_password
+from django.core.cache import cache
+from django.db import connections
+from django.db.models import Case, DateTimeField, Q, Value, When
+from django.test import Client
+from django.urls import reverse
+from django.utils import timezone
+from faker import Faker
+
+from core.metrics import registry
+
+from .constants import (BENCH_BATCH_SIZE, BENCH_DAYS, BENCH_GROUP_PREFIX,
+                        BENCH_LOCALE, BENCH_LONG_POST_SHARE,
+                        BENCH_NO_GROUP_SHARE, BENCH_REMOTE_ADDR, BENCH_SKEW,
+                        BENCH_USER_PREFIX, TIMELINE_FANOUT_LIMIT,
+                        TIMELINE_LENGTH)
+from .counters import rebuild_post_counters
+from .models import (Comment, Follow, Group, Post, PostSearchTerm,
+                     TimelineEntry, User, UserStats)
+from .search import reindex_posts, unindex_posts
+from .stats import rebuild_user_stats
+
+Scenario = namedtuple('Scenario', 'name method authorized request')
+
+
+def zipf_cum_weights(size, skew=BENCH_SKEW):
+    """Накопленные веса степенного распределения: первые - самые популярные."""
+
+    return list(accumulate(1 / (rank + 1) ** skew for rank in range(size)))
+
+
+def _batches(items, size=BENCH_BATCH_SIZE):
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+
+def _delete_rows(queryset):
+    """Один DELETE по условию queryset, без сигналов и каскадов Django."""
+
+    model = queryset.model
+    connection = connections[queryset.db]
+    quote_name = connection.ops.quote_name
+    sql, params = queryset.values('pk').query.sql_with_params()
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'DELETE FROM {quote_name(model._meta.db_table)} '
+            f'WHERE {quote_name(model._meta.pk.column)} IN ({sql})',
+            params,
+        )
+
+
+def clear_bench():
+    """
+    Удаляет данные прошлого запуска seed_bench. Удаление идёт
+    в обход сигналов: производные данные seed_bench строит заново,
+    а посигнальная очистка на сотнях тысяч строк занимает минуты.
+    """
+
+    users = User.objects.filter(username__startswith=BENCH_USER_PREFIX)
+    posts = Post.objects.filter(author__in=users)
+    unindex_posts(posts.values_list('pk', flat=True))
+    for queryset in (
+        TimelineEntry.objects.filter(user__in=users),
+        TimelineEntry.objects.filter(post__in=posts),
+        Comment.objects.filter(Q(post__in=posts) | Q(author__in=users)),
+        Follow.objects.filter(Q(user__in=users) | Q(author__in=users)),
+        PostSearchTerm.objects.filter(post__in=posts),
+        UserStats.objects.filter(user__in=users),
+        posts,
+    ):
+        _delete_rows(queryset)
+    Group.objects.filter(slug__startswith=BENCH_GROUP_PREFIX).delete()
+    users.delete()
+
+
+def _bench_ids(queryset):
+    return list(queryset.order_by('pk').values_list('pk', flat=True))
+
+
+def _spread_post_dates(post_ids, rng):
+    """
+    Разносит даты постов по последним BENCH_DAYS дням
+    так, чтобы более поздние id были свежее, как в живой базе.
+    """
+
+    now = timezone.now()
+    seconds = sorted(
+        rng.uniform(0, BENCH_DAYS * 86400) for _ in post_ids
+    )
+    dates = [now - timedelta(seconds=second) for second in reversed(seconds)]
+    for batch in _batches(list(zip(post_ids, dates))):
+        Post.objects.filter(pk__in=[pk for pk, _ in batch]).update(
+            created=Case(
+                *(When(pk=pk, then=Value(date)) for pk, date in batch),
+                output_field=DateTimeField(),
+            )
+        )
+
+
+def _fill_timelines(user_ids, edges):
+    """
+    Строит материализованные ленты одним проходом в памяти,
+    по тем же правилам, что и fan_out_post с trim_timelines.
+    """
+
+    posts_by_author = defaultdict(list)
+    for author_id, pk, created in Post.objects.filter(
+        author_id__in=user_ids,
+    ).values_list('author_id', 'pk', 'created'):
+        posts_by_author[author_id].append((created, pk))
+
+    followers = Counter(author_id for _, author_id in edges)
+    feeds = defaultdict(list)
+    for user_id, author_id in edges:
+        if followers[author_id] <= TIMELINE_FANOUT_LIMIT:
+            feeds[user_id].extend(
+                (created, pk, author_id)
+                for created, pk in posts_by_author[author_id]
+            )
+
+    entries = [
+        TimelineEntry(
+            user_id=user_id, post_id=pk, author_id=author_id, created=created,
+        )
+        for user_id, feed in feeds.items()
+        for created, pk, author_id in heapq.nlargest(TIMELINE_LENGTH, feed)
+    ]
+    TimelineEntry.objects.bulk_create(entries, batch_size=BENCH_BATCH_SIZE)
+
+
+def seed_bench(users, groups, posts, comments, follows, seed):
+    """
+    Заполняет базу синтетическими данными с перекосом как в жизни:
+    у немногих авторов большинство подписчиков и постов,
+    в немногих группах большинство записей, у немногих постов
+    большинство комментариев. Одинаковый seed - одинаковые данные.
+    """
+
+    rng = random.Random(seed)
+    fake = Faker(BENCH_LOCALE)
+    fake.seed_instance(seed)
+
+    clear_bench()
+    password = make_password(None)
+    people = []
+    for number in range(users):
+        if rng.random() < 0.5:
+            names = fake.first_name_male(), fake.last_name_male()
+        else:
+            names = fake.first_name_female(), fake.last_name_female()
+        people.append(User(
+            username=f'{BENCH_USER_PREFIX}{number}',
+            first_name=names[0],
+            last_name=names[1],
+            password=password,
+        ))
+    User.objects.bulk_create(people, batch_size=BENCH_BATCH_SIZE)
+    user_ids = _bench_ids(
+        User.objects.filter(username__startswith=BENCH_USER_PREFIX)
+    )
+
+    Group.objects.bulk_create([Group(
+        title=f'{fake.word().capitalize()} {number}',
+        slug=f'{BENCH_GROUP_PREFIX}{number}',
+        description=fake.sentence(),
+    ) for number in range(groups)])
+    group_ids = _bench_ids(
+        Group.objects.filter(slug__startswith=BENCH_GROUP_PREFIX)
+    )
+
+    popular_users = zipf_cum_weights(len(user_ids))
+    hot_groups = zipf_cum_weights(len(group_ids))
+    authors = rng.choices(user_ids, cum_weights=popular_users, k=posts)
+    Post.objects.bulk_create([Post(
+        author_id=author_id,
+        group_id=(
+            None if not group_ids or rng.random() < BENCH_NO_GROUP_SHARE
+            else rng.choices(group_ids, cum_weights=hot_groups)[0]
+        ),
+        text=(
+            '\n\n'.join(fake.paragraphs(nb=rng.randint(20, 60)))
+            if rng.random() < BENCH_LONG_POST_SHARE
+            else fake.paragraph(nb_sentences=rng.randint(1, 8))
+        ),
+    ) for author_id in authors], batch_size=BENCH_BATCH_SIZE)
+    post_ids = _bench_ids(Post.objects.filter(author_id__in=user_ids))
+    _spread_post_dates(post_ids, rng)
+
+    edges = set()
+    follows = min(follows, len(user_ids) * (len(user_ids) - 1))
+    attempts = follows * 20
+    while len(edges) < follows and attempts:
+        attempts -= 1
+        user_id = rng.choice(user_ids)
+        author_id = rng.choices(user_ids, cum_weights=popular_users)[0]
+        if user_id != author_id:
+            edges.add((user_id, author_id))
+    Follow.objects.bulk_create([
+        Follow(user_id=user_id, author_id=author_id)
+        for user_id, author_id in sorted(edges)
+    ], batch_size=BENCH_BATCH_SIZE)
+
+    if post_ids:
+        hot_posts = zipf_cum_weights(len(post_ids))
+        newest_first = post_ids[::-1]
+        Comment.objects.bulk_create([Comment(
+            post_id=rng.choices(newest_first, cum_weights=hot_posts)[0],
+            author_id=rng.choice(user_ids),
+            text=fake.sentence(),
+        ) for _ in range(comments)], batch_size=BENCH_BATCH_SIZE)
+
+    # bulk_create обходит сигналы: производные данные строим сами
+    for batch in _batches(user_ids):
+        rebuild_user_stats(batch)
+    rebuild_post_counters()
+    _fill_timelines(user_ids, edges)
+    for batch in _batches(post_ids):
+        reindex_posts(batch)
+    cache.clear()
+
+    return {
+        'users': len(user_ids),
+        'groups': len(group_ids),
+        'posts': len(post_ids),
+        'comments': Comment.objects.filter(post_id__in=post_ids).count(),
+        'follows': len(edges),
+    }
+
+
+def percentile(values, percent):
+    """Перцентиль по ближайшему рангу для отсортированного списка."""
+
+    if not values:
+        return 0
+    rank = math.ceil(percent / 100 * len(values))
+    return values[max(rank - 1, 0)]
+
+
+class QueryCounter:
+    def __init__(self):
+        self.count = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        self.count += 1
+        return execute(sql, params, many, context)
+
+
+class MemoryPeak:
+    """Пик памяти, выделенной за запрос, если запущен tracemalloc."""
+
+    def __init__(self):
+        self.bytes = 0
+        self._base = 0
+
+    def __enter__(self):
+        if tracemalloc.is_tracing():
+            tracemalloc.reset_peak()
+            self._base = tracemalloc.get_traced_memory()[0]
+        return self
+
+    def __exit__(self, *exc_info):
+        if tracemalloc.is_tracing():
+            self.bytes = tracemalloc.get_traced_memory()[1] - self._base
+
+
+def bench_scenarios(rng):
+    """Сценарии на чтение и запись по данным seed_bench."""
+
+    usernames = list(User.objects.filter(
+        username__startswith=BENCH_USER_PREFIX,
+    ).values_list('username', flat=True))
+    slugs = list(Group.objects.filter(
+        slug__startswith=BENCH_GROUP_PREFIX,
+    ).values_list('slug', flat=True))
+    post_ids = list(Post.objects.filter(
+        author__username__startswith=BENCH_USER_PREFIX,
+    ).values_list('pk', flat=True))
+
+    def post_url(name):
+        return lambda: (
+            reverse(name, kwargs={'post_id': rng.choice(post_ids)}), None
+        )
+
+    def profile_url(name):
+        return lambda: (
+            reverse(name, kwargs={'username': rng.choice(usernames)}), None
+        )
+
+    reads = [
+        ('index', lambda: (reverse('posts:index'), None)),
+        ('group_posts', lambda: (reverse(
+            'posts:group_list', kwargs={'slug': rng.choice(slugs)}
+        ), None)),
+        ('profile', profile_url('posts:profile')),
+        ('post_detail', post_url('posts:post_detail')),
+    ]
+    scenarios = []
+    for name, request in reads:
+        scenarios.append(Scenario(f'{name}:anonymous', 'get', False, request))
+        scenarios.append(Scenario(f'{name}:user', 'get', True, request))
+
+    scenarios.extend([
+        Scenario('follow_index:user', 'get', True,
+                 lambda: (reverse('posts:follow'), None)),
+        Scenario('post_create:user', 'post', True, lambda: (
+            reverse('posts:post_create'),
+            {'text': f'Пост нагрузочного теста {rng.random()}'},
+        )),
+        Scenario('add_comment:user', 'post', True, lambda: (
+            reverse('posts:add_comment',
+                    kwargs={'post_id': rng.choice(post_ids)}),
+            {'text': 'Комментарий нагрузочного теста'},
+        )),
+        Scenario('profile_follow:user', 'get', True,
+                 profile_url('posts:profile_follow')),
+    ])
+    return scenarios
+
+
+def run_scenario(client, scenario, requests, warmup):
+    latencies = []
+    queries = 0
+    errors = 0
+    memory = 0
+    render_start = registry.total('template_render_seconds')
+    for number in range(warmup + requests):
+        if number == warmup:
+            render_start = registry.total('template_render_seconds')
+        url, data = scenario.request()
+        counter = QueryCounter()
+        peak = MemoryPeak()
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(counter))
+            stack.enter_context(peak)
+            start = perf_counter()
+            response = getattr(client, scenario.method)(url, data)
+            elapsed = perf_counter() - start
+        if number < warmup:
+            continue
+        latencies.append(elapsed)
+        queries += counter.count
+        memory += peak.bytes
+        errors += response.status_code >= 400
+
+    latencies.sort()
+    total = sum(latencies)
+    render = registry.total('template_render_seconds') - render_start
+    return {
+        'requests': requests,
+        'errors': errors,
+        'p50_ms': round(percentile(latencies, 50) * 1000, 3),
+        'p95_ms': round(percentile(latencies, 95) * 1000, 3),
+        'p99_ms': round(percentile(latencies, 99) * 1000, 3),
+        'mean_ms': round(total / requests * 1000, 3) if requests else 0,
+        'rps': round(requests / total, 1) if total else 0,
+        'queries_per_request': round(queries / requests, 2) if requests else 0,
+        'render_ms': round(render / requests * 1000, 3) if requests else 0,
+        'memory_kb': round(memory / requests / 1024, 1) if requests else 0,
+    }
+
+
+def run_bench(requests, warmup, seed, only=None, memory=False):
+    """
+    Прогоняет сценарии через тестовый клиент Django, то есть через
+    тот же WSGI-обработчик и все middleware, что и в бою.
+    С memory=True ещё и меряет пик памяти на запрос через tracemalloc,
+    что заметно замедляет всё остальное.
+    """
+
+    rng = random.Random(seed)
+    user = UserStats.objects.filter(
+        user__username__startswith=BENCH_USER_PREFIX,
+    ).order_by('-follows_count', 'user_id').values_list('user', flat=True)
+    anonymous = Client(REMOTE_ADDR=BENCH_REMOTE_ADDR)
+    authorized = Client(REMOTE_ADDR=BENCH_REMOTE_ADDR)
+    authorized.force_login(User.objects.get(pk=user[0]))
+
+    results = {}
+    if memory:
+        tracemalloc.start()
+    try:
+        for scenario in bench_scenarios(rng):
+            if only and scenario.name.split(':')[0] not in only:
+                continue
+            cache.clear()
+            client = authorized if scenario.authorized else anonymous
+            results[scenario.name] = run_scenario(
+                client, scenario, requests, warmup,
+            )
+    finally:
+        if memory:
+            tracemalloc.stop()
+
+    return {
+        'meta': {
+            'started': timezone.now().isoformat(),
+            'seed': seed,
+            'requests': requests,
+            'warmup': warmup,
+            'memory': memory,
+            'python': platform.python_version(),
+            'django': django.get_version(),
+            'database': connections['default'].vendor,
+            'posts': Post.objects.count(),
+            'users': User.objects.count(),
+        },
+        'scenarios': results,
+    }
@@ -0,0 +1,285 @@
+import hashlib
+import math
+import random
+import time
+from datetime import datetime, timezone
+from functools import wraps
+from urllib.parse import quote
+
+from django.core.cache import cache
+from django.middleware.csrf import get_token
+from django.utils.cache import patch_cache_control, patch_vary_headers
+from django.views.decorators.http import condition
+
+from .constants import (CONTENT_GENERATION, CURSOR_PARAM, FRAGMENT_BETA,
+                        FRAGMENT_LOCK_TIMEOUT, FRAGMENT_STALE_GRACE,
+                        FRAGMENT_STATS_KEY, PAGE_CACHE_STATS_KEY, PAGE_PARAM,
+                        PUBLIC_PAGE_MAX_AGE)
+from .fragments import public_pages
+
+
+def _generation_key(name):
+    return f'generation:{quote(name)}'
+
+
+def _modified_key(name):
+    return f'modified:{quote(name)}'
+
+
+def get_generation(name):
+    """
+    Текущее поколение кеша. Начальное значение берётся из времени,
+    чтобы после вытеснения ключа номера поколений не повторялись.
+    """
+
+    key = _generation_key(name)
+    generation = cache.get(key)
+    if generation is None:
+        cache.add(key, int(time.time() * 1000), None)
+        generation = cache.get(key)
+
+    return generation
+
+
+def bump_generation(name):
+    """Сдвигает поколение: все записи старого поколения устаревают."""
+
+    key = _generation_key(name)
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.add(key, int(time.time() * 1000), None)
+    cache.set(_modified_key(name), time.time(), None)
+
+
+def page_cache_key(request):
+    """Часть ключа кеша, различающая страницы ленты."""
+
+    return '{}:{}'.format(
+        request.GET.get(PAGE_PARAM, ''),
+        request.GET.get(CURSOR_PARAM, ''),
+    )
+
+
+def get_tag_versions(tags):
+    """Версии тегов одним get_many; недостающие версии создаются."""
+
+    keys = [_generation_key(tag) for tag in tags]
+    versions = cache.get_many(keys)
+    for tag, key in zip(tags, keys):
+        if key not in versions:
+            versions[key] = get_generation(tag)
+
+    return [versions[key] for key in keys]
+
+
+def get_last_modified(tags):
+    """
+    Время последнего сброса любого из тегов. Если время тега
+    выпало из кеша, считаем, что тег сброшен только что.
+    """
+
+    keys = [_modified_key(tag) for tag in tags]
+    stamps = cache.get_many(keys)
+    for key in keys:
+        if key not in stamps:
+            now = time.time()
+            cache.add(key, now, None)
+            stamps[key] = cache.get(key, now)
+
+    return datetime.fromtimestamp(max(stamps.values()), timezone.utc)
+
+
+def purge_tags(*tags):
+    """Сбрасывает все записи, помеченные любым из тегов."""
+
+    for tag in tags:
+        bump_generation(tag)
+
+
+def group_tag(slug):
+    return f'group:{slug}'
+
+
+def author_tag(username):
+    return f'author:{username}'
+
+
+def timeline_tag(user_id):
+    return f'timeline:{user_id}'
+
+
+def post_tag(post_id):
+    return f'post:{post_id}'
+
+
+def _count(counter, prefix=PAGE_CACHE_STATS_KEY):
+    key = f'{prefix}:{counter}'
+    try:
+        cache.incr(key)
+    except ValueError:
+        if not cache.add(key, 1, None):
+            cache.incr(key)
+
+
+def _stats(prefix, counters):
+    values = cache.get_many([f'{prefix}:{counter}' for counter in counters])
+    return {
+        counter: values.get(f'{prefix}:{counter}', 0)
+        for counter in counters
+    }
+
+
+def page_cache_stats():
+    """Счётчики попаданий и промахов кеша списков id лент."""
+
+    return _stats(PAGE_CACHE_STATS_KEY, ('hits', 'misses'))
+
+
+def fragment_cache_stats():
+    """
+    Счётчики кеша фрагментов: пересчёты по истечении срока,
+    досрочные пересчёты и пересчёты, от которых уберегла блокировка.
+    """
+
+    return _stats(FRAGMENT_STATS_KEY, ('recomputes', 'early', 'prevented'))
+
+
+def cache_metrics():
+    """Счётчики кеша лент и кеша фрагментов для эндпоинта метрик."""
+
+    return [
+        (f'{prefix}_{counter}_total', 'counter', f'{title}: {counter}.', value)
+        for prefix, title, stats in (
+            ('page_cache', 'Кеш страниц лент', page_cache_stats()),
+            ('fragment_cache', 'Кеш фрагментов', fragment_cache_stats()),
+        )
+        for counter, value in stats.items()
+    ]
+
+
+def get_or_recompute(key, recompute, timeout, beta=FRAGMENT_BETA):
+    """
+    Значение из кеша с защитой от одновременного пересчёта.
+
+    Запись хранит значение, время его расчёта и срок годности и живёт
+    в кеше ещё FRAGMENT_STALE_GRACE секунд после срока. Незадолго до
+    срока запрос с вероятностью, растущей к его концу, пересчитывает
+    значение заранее (XFetch). Пересчитывает только тот, кто взял
+    короткую блокировку; остальные пока отдают устаревшее значение.
+    """
+
+    entry = cache.get(key)
+    now = time.time()
+    if entry is not None:
+        value, delta, expires = entry
+        if now - delta * beta * math.log(1 - random.random()) < expires:
+            return value
+
+    lock_key = f'{key}:lock'
+    if not cache.add(lock_key, 1, FRAGMENT_LOCK_TIMEOUT):
+        if entry is not None:
+            _count('prevented', FRAGMENT_STATS_KEY)
+            return entry[0]
+        # Отдать нечего: строим сами, но в кеш не пишем
+        return recompute()
+
+    try:
+        start = time.time()
+        value = recompute()
+        delta = time.time() - start
+        if timeout is None:
+            cache.set(key, (value, delta, math.inf), None)
+        else:
+            cache.set(
+                key, (value, delta, start + timeout),
+                timeout + FRAGMENT_STALE_GRACE,
+            )
+    finally:
+        cache.delete(lock_key)
+    _count(
+        'early' if entry is not None and now < entry[2] else 'recomputes',
+        FRAGMENT_STATS_KEY,
+    )
+
+    return value
+
+
+def personal_user(request):
+    """Id пользователя, от которого зависит страница, или ''."""
+
+    if public_pages() or not request.user.is_authenticated:
+        return ''
+    return request.user.pk
+
+
+def patch_page_headers(response):
+    if not public_pages():
+        patch_vary_headers(response, ('Cookie',))
+    elif response.status_code in (200, 304):
+        patch_cache_control(
+            response, public=True, max_age=PUBLIC_PAGE_MAX_AGE,
+        )
+
+    return response
+
+
+def conditional_page(*tag_patterns, get_tags=None):
+    """
+    Conditional GET для страницы: ETag из версий её тегов
+    и пользователя, Last-Modified - из времени сброса тегов.
+    Теги собираются из kwargs вью, как 'group:{slug}', и из get_tags,
+    которая по запросу и kwargs возвращает список тегов или None,
+    если страницы нет.
+    Неизменившаяся страница отдаётся как 304 без запросов ленты и рендера.
+    Пока разметка пользователя рендерится на месте, ETag учитывает
+    пользователя и его CSRF-токен, а Last-Modified получают только
+    анонимы. Когда она
+    приходит фрагментами (public_pages), страница одна на всех
+    и отдаётся с Cache-Control: public для обратного прокси.
+    """
+
+    def page_tags(request, kwargs):
+        if not hasattr(request, '_page_tags'):
+            tags = [pattern.format(**kwargs) for pattern in tag_patterns]
+            extra = get_tags(request, **kwargs) if get_tags else []
+            request._page_tags = None if extra is None else [
+                *tags, *extra, CONTENT_GENERATION,
+            ]
+        return request._page_tags
+
+    def etag(request, *args, **kwargs):
+        tags = page_tags(request, kwargs)
+        if tags is None:
+            return None
+        user = personal_user(request)
+        if user:
+            # В личной странице отрендерен CSRF-токен формы, а вход
+            # выдаёт новый: копия со старым токеном получила бы 403.
+            # get_token заводит токен до рендера, если его ещё нет
+            get_token(request)
+            user = '{}:{}'.format(user, request.META['CSRF_COOKIE'])
+        return hashlib.md5('{}:{}'.format(
+            user, '.'.join(str(version) for version in get_tag_versions(tags))
+        ).encode()).hexdigest()
+
+    def last_modified(request, *args, **kwargs):
+        tags = page_tags(request, kwargs)
+        if tags is None or personal_user(request):
+            return None
+        return get_last_modified(tags)
+
+    def decorator(view):
+        conditional = condition(
+            etag_func=etag, last_modified_func=last_modified,
+        )(view)
+
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            return patch_page_headers(
+                conditional(request, *args, **kwargs)
+            )
+
+        return wrapper
+
+    return decorator
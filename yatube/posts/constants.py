@@ -1,7 +1,76 @@
 INDEX_PER_PAGE_LIMIT = 10
 GROUP_PER_PAGE_LIMIT = 10
 PROFILE_PER_PAGE_LIMIT = 10
+COMMENTS_PER_PAGE_LIMIT = 20
 POST_STR_LIM = 15
-CACHE_TIMING = 20
+CACHE_TIMING = 60 * 60 * 6
+FEED_GENERATION = 'feed'
 PAGI_INDEX_PER_PAGE = 10
 PAGI_INDEX_LAST_PAGE = 3
+PAGE_PARAM = 'page'
+CURSOR_PARAM = 'cursor'
+CURSOR_NEXT = 'n'
+CURSOR_PREVIOUS = 'p'
+# Наибольший INTEGER SQLite: pk курсора больше него - битый курсор
+CURSOR_PK_MAX = 2 ** 63 - 1
+TIMELINE_LENGTH = 500
+TIMELINE_FANOUT_LIMIT = 1000
+TIMELINE_PULL_AUTHORS_KEY = 'timeline:pull_authors'
+TIMELINE_PULL_AUTHORS_TIMING = 300
+TIMELINE_BACKFILL_BATCH_SIZE = 500
+STATS_REBUILD_BATCH_SIZE = 500
+PAGE_CACHE_STATS_KEY = 'page_cache'
+THUMBNAIL_GEOMETRIES = (
+    ('960x339', {'crop': 'center', 'upscale': True}),
+)
+THUMBNAIL_BATCH_SIZE = 50
+THUMBNAIL_POLL_INTERVAL = 5
+THUMBNAIL_CLAIM_TIMEOUT = 10 * 60
+PLACEHOLDER_SIZE = (16, 16)
+PLACEHOLDER_QUALITY = 40
+IMAGE_BACKFILL_BATCH_SIZE = 100
+SEARCH_PER_PAGE_LIMIT = 10
+SEARCH_ADMIN_LIMIT = 1000
+SEARCH_RECENCY_WEIGHT = 0.01
+SEARCH_TERM_MAX_LENGTH = 64
+SEARCH_REINDEX_BATCH_SIZE = 500
+SEARCH_FTS_TABLE = 'posts_post_fts'
+BENCH_SEED = 42
+BENCH_LOCALE = 'ru_RU'
+BENCH_USER_PREFIX = 'bench_'
+BENCH_GROUP_PREFIX = 'bench-'
+BENCH_USERS = 1000
+BENCH_GROUPS = 20
+BENCH_POSTS = 20000
+BENCH_COMMENTS = 50000
+BENCH_FOLLOWS = 20000
+BENCH_SKEW = 1.1
+BENCH_NO_GROUP_SHARE = 0.2
+BENCH_DAYS = 365
+BENCH_BATCH_SIZE = 500
+BENCH_REQUESTS = 200
+BENCH_WARMUP = 10
+BENCH_REMOTE_ADDR = '10.0.0.1'
+BENCH_OUTPUT = 'bench.json'
+FRAGMENT_STATS_KEY = 'fragment_cache'
+FRAGMENT_STALE_GRACE = 300
+FRAGMENT_LOCK_TIMEOUT = 10
+FRAGMENT_BETA = 1.0
+CARD_TEMPLATE = 'posts/includes/post_list.html'
+POST_EXCERPT_LENGTH = 300
+BENCH_LONG_POST_SHARE = 0.05
+CONTENT_GENERATION = 'content'
+FRAGMENTS_INLINE = 'inline'
+FRAGMENTS_ESI = 'esi'
+FRAGMENTS_FETCH = 'fetch'
+PUBLIC_PAGE_MAX_AGE = 10
+PAGINATOR_ON_EACH_SIDE = 2
+PAGINATOR_ON_ENDS = 1
+PAGINATOR_ELLIPSIS = '…'
+PAGINATOR_COUNT_TIMEOUT = 60
+POST_COUNTS_EXACT = 'exact'
+POST_COUNTS_COUNTER = 'counter'
+POST_COUNTS_CACHED = 'cached'
+POST_COUNTER_ALL = 'all'
+POST_COUNTER_RECONCILE_INTERVAL = 60 * 60
+POST_COUNT_CACHE_TIMEOUT = 60
@@ -0,0 +1,132 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import F
+from django.db.models.functions import Greatest
+from django.utils import timezone
+
+from .constants import (POST_COUNT_CACHE_TIMEOUT, POST_COUNTER_ALL,
+                        POST_COUNTER_RECONCILE_INTERVAL, POST_COUNTS_CACHED,
+                        POST_COUNTS_EXACT)
+from .models import Group, Post, PostCounter
+from .stats import get_user_stats
+
+
+def counter_key(group_id=None):
+    return f'group:{group_id}' if group_id else POST_COUNTER_ALL
+
+
+def _live_count(group_id=None, author_id=None):
+    posts = Post.objects.all()
+    if group_id:
+        posts = posts.filter(group_id=group_id)
+    if author_id:
+        posts = posts.filter(author_id=author_id)
+    return posts.count()
+
+
+def rebuild_post_counter(group_id=None):
+    """Сверяет счётчик ленты с живым COUNT(*)."""
+
+    counter, _ = PostCounter.objects.update_or_create(
+        key=counter_key(group_id),
+        defaults={
+            'count': _live_count(group_id),
+            'reconciled': timezone.now(),
+        },
+    )
+    return counter.count
+
+
+def rebuild_post_counters():
+    """
+    Сверяет счётчик всех постов и счётчики всех групп. Строки не
+    удаляются заранее: UPDATE из bump_post_counts, пришедший во время
+    пересчёта, не теряется. Удаляются только счётчики исчезнувших
+    групп; если под удаление попадёт счётчик новой группы, его
+    заменит COUNT(*) до следующей записи поста.
+    """
+
+    rebuild_post_counter()
+    group_ids = list(Group.objects.values_list('pk', flat=True))
+    for group_id in group_ids:
+        rebuild_post_counter(group_id)
+    PostCounter.objects.exclude(
+        key__in=[counter_key(group_id) for group_id in [None, *group_ids]],
+    ).delete()
+
+    return len(group_ids) + 1
+
+
+def _reconciled_since():
+    return timezone.now() - timedelta(seconds=POST_COUNTER_RECONCILE_INTERVAL)
+
+
+def _counter_value(group_id=None):
+    """
+    Значение счётчика. Чтение ничего не пишет: счётчика, которого
+    ещё нет, заменяет COUNT(*), а сверку с живыми данными делают
+    запись поста (bump_post_counts) и команда rebuild_post_counters.
+    """
+
+    count = PostCounter.objects.filter(
+        key=counter_key(group_id),
+    ).values_list('count', flat=True).first()
+    if count is None:
+        return _live_count(group_id)
+
+    return count
+
+
+def get_post_count(group_id=None, author=None):
+    """
+    Число постов ленты: всех, группы или автора. Точность задаёт
+    settings.POST_COUNTS: 'exact' считает COUNT(*), 'counter' читает
+    счётчик одной строкой, 'cached' - тот же счётчик через кеш.
+    """
+
+    if settings.POST_COUNTS == POST_COUNTS_EXACT:
+        return _live_count(group_id, author.pk if author else None)
+    if author is not None:
+        return get_user_stats(author).posts_count
+    if settings.POST_COUNTS != POST_COUNTS_CACHED:
+        return _counter_value(group_id)
+
+    key = f'post_count:{counter_key(group_id)}'
+    count = cache.get(key)
+    if count is None:
+        count = _counter_value(group_id)
+        cache.set(key, count, POST_COUNT_CACHE_TIMEOUT)
+
+    return count
+
+
+def bump_post_counts(delta, group_id=None, total=True):
+    """
+    Сдвигает счётчики всех постов и группы атомарным UPDATE.
+    Счётчики, которых ещё нет или которые не сверялись дольше
+    POST_COUNTER_RECONCILE_INTERVAL, здесь же пересчитываются:
+    запись поста и так пишет в базу, в отличие от чтения ленты.
+    """
+
+    group_ids = [None] if total else []
+    if group_id:
+        group_ids.append(group_id)
+    keys = {counter_key(group_id): group_id for group_id in group_ids}
+    if not keys:
+        return
+
+    PostCounter.objects.filter(key__in=keys).update(
+        count=Greatest(F('count') + delta, 0),
+    )
+    fresh = set(PostCounter.objects.filter(
+        key__in=keys, reconciled__gte=_reconciled_since(),
+    ).values_list('key', flat=True))
+    for key, group_id in keys.items():
+        if key not in fresh:
+            rebuild_post_counter(group_id)
+
+
+def forget_group_counter(group_id):
+    PostCounter.objects.filter(key=counter_key(group_id)).delete()
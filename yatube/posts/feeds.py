@@ -0,0 +1,216 @@
+import hashlib
+
+from django.core.cache import cache
+
+from .cache import _count, get_or_recompute, get_tag_versions, page_cache_key
+from .constants import CACHE_TIMING
+from .models import Group, Post, User
+from .thumbnails import card_thumbnail
+from .utils import CursorPaginator, ElidedPaginator, paginator_func
+
+CURSOR_STATE = ('has_next', 'has_previous', 'next_cursor', 'previous_cursor')
+# Поля связанных объектов, нужные карточке поста
+USER_CARD_FIELDS = ('id', 'username', 'first_name', 'last_name')
+GROUP_CARD_FIELDS = ('id', 'slug')
+
+
+def card_key(model, pk):
+    return f'card:{model._meta.label_lower}:{pk}'
+
+
+def _post_card(post):
+    """Загруженные поля поста без связанных объектов."""
+
+    deferred = post.get_deferred_fields()
+    return {
+        field.attname: getattr(post, field.attname)
+        for field in Post._meta.concrete_fields
+        if field.attname not in deferred
+    }
+
+
+def remember_cards(posts):
+    """
+    Кладёт в кеш посты, их авторов и группы отдельными записями:
+    пост хранится без связанных объектов, чтобы правка автора
+    или группы не требовала сбрасывать все его посты.
+    """
+
+    cards = {}
+    for post in posts:
+        for related in (post.author, post.group):
+            if related is not None:
+                cards[card_key(type(related), related.pk)] = related
+        cards[card_key(Post, post.pk)] = _post_card(post)
+    cache.set_many(cards, CACHE_TIMING)
+
+
+def forget_cards(model, *pks):
+    cache.delete_many([card_key(model, pk) for pk in pks])
+
+
+def _get_cards(model, pks, queryset):
+    """Объекты из кеша get_many, промахи - одним in_bulk."""
+
+    keys = {card_key(model, pk): pk for pk in pks}
+    cards = {
+        keys[key]: card for key, card in cache.get_many(list(keys)).items()
+    }
+    missing = [pk for pk in keys.values() if pk not in cards]
+    if missing:
+        fetched = queryset.in_bulk(missing)
+        cache.set_many({
+            card_key(model, pk): card for pk, card in fetched.items()
+        }, CACHE_TIMING)
+        cards.update(fetched)
+
+    return cards
+
+
+def hydrate_posts(post_ids):
+    """
+    Посты по списку id в том же порядке, с авторами и группами.
+    Посты, которых уже нет в базе, пропускаются.
+    """
+
+    # Каждый раз новый объект: карточку из кеша в памяти процесса
+    # делят все запросы, а пост получает своих автора и группу
+    db = Post.objects.db
+    cached = [
+        Post.from_db(db, list(card), list(card.values()))
+        for card in cache.get_many(
+            [card_key(Post, pk) for pk in post_ids]
+        ).values()
+    ]
+    posts = {post.pk: post for post in cached}
+    missing = [pk for pk in post_ids if pk not in posts]
+    if missing:
+        fetched = Post.objects.for_feed().in_bulk(missing)
+        remember_cards(fetched.values())
+        posts.update(fetched)
+
+    authors = _get_cards(
+        User, {post.author_id for post in cached},
+        User.objects.only(*USER_CARD_FIELDS),
+    )
+    groups = _get_cards(
+        Group, {post.group_id for post in cached if post.group_id},
+        Group.objects.only(*GROUP_CARD_FIELDS),
+    )
+    for post in cached:
+        if post.author_id in authors:
+            post.author = authors[post.author_id]
+        if post.group_id in groups:
+            post.group = groups[post.group_id]
+
+    return [posts[pk] for pk in post_ids if pk in posts]
+
+
+def _page_state(page):
+    state = {
+        'ids': [post.pk for post in page],
+        'number': page.number,
+    }
+    paginator = page.paginator
+    if getattr(paginator, 'is_cursor', False):
+        state.update(
+            (name, getattr(paginator, name)) for name in CURSOR_STATE
+        )
+    else:
+        state['count'] = paginator.count
+
+    return state
+
+
+def _restore_page(state, posts, limit):
+    if 'count' in state:
+        paginator = ElidedPaginator(posts, limit)
+        paginator.count = state['count']
+    else:
+        paginator = CursorPaginator(posts, limit)
+        for name in CURSOR_STATE:
+            setattr(paginator, name, state[name])
+
+    return paginator._get_page(
+        hydrate_posts(state['ids']), state['number'], paginator,
+    )
+
+
+def feed_page(request, posts, limit, *tags, count=None):
+    """
+    Страница ленты через кеш упорядоченного списка id.
+
+    В кеше лежат только id постов страницы и состояние пагинатора,
+    а сами посты собираются из кеша карточек. Список живёт, пока
+    не сброшен ни один из тегов ленты: теги сбрасываются, только когда
+    меняется состав ленты, а правка поста сбрасывает одну его карточку.
+    count - функция числа постов ленты для постраничного режима.
+    """
+
+    key = 'feed:{}:{}:{}'.format(
+        hashlib.md5('|'.join((request.path, *tags)).encode()).hexdigest(),
+        page_cache_key(request),
+        '.'.join(str(version) for version in get_tag_versions(tags)),
+    )
+    computed = {}
+
+    def recompute():
+        computed['page'] = page = paginator_func(
+            posts, limit, request, count,
+        )
+        remember_cards(page)
+        return _page_state(page)
+
+    state = get_or_recompute(key, recompute, CACHE_TIMING)
+    if 'page' in computed:
+        _count('misses')
+        return computed['page']
+
+    _count('hits')
+    return _restore_page(state, posts, limit)
+
+
+def card_html_key(post, show_group):
+    """
+    Ключ HTML карточки: меняется вместе с постом (updated)
+    и с тем, что карточка показывает от автора и группы.
+    """
+
+    version = '|'.join((
+        post.updated.isoformat(),
+        post.author.username,
+        post.author.get_full_name(),
+        post.group.slug if show_group else '',
+    ))
+    return 'card_html:{}:{}'.format(
+        post.pk, hashlib.md5(version.encode()).hexdigest(),
+    )
+
+
+def _thumbnail_ready(post):
+    return not post.image or card_thumbnail(post.image) is not None
+
+
+def render_cards(posts, render, show_group=True):
+    """
+    HTML карточек постов: готовые берутся из кеша одним get_many,
+    недостающие рендерит render(post) и кладёт одним set_many.
+    Карточку без построенного превью не кешируем, иначе
+    превью не появится до следующей правки поста.
+    """
+
+    keys = [
+        card_html_key(post, show_group and post.group_id is not None)
+        for post in posts
+    ]
+    cards = cache.get_many(keys)
+    rendered = {}
+    for post, key in zip(posts, keys):
+        if key not in cards:
+            cards[key] = render(post)
+            if _thumbnail_ready(post):
+                rendered[key] = cards[key]
+    if rendered:
+        cache.set_many(rendered, CACHE_TIMING)
+
+    return [cards[key] for key in keys]
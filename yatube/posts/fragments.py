@@ -0,0 +1,61 @@
+from collections import namedtuple
+
+from django.conf import settings
+from django.http import Http404
+from django.shortcuts import get_object_or_404
+
+from .constants import FRAGMENTS_INLINE
+from .forms import CommentForm
+from .models import Follow, Post, User
+
+Fragment = namedtuple('Fragment', ('template', 'get_context'))
+
+
+def public_pages():
+    """
+    Общие страницы одинаковы для всех: разметка пользователя
+    приходит отдельными фрагментами, а не рендерится на месте.
+    """
+
+    return settings.PERSONAL_FRAGMENTS != FRAGMENTS_INLINE
+
+
+def is_following(user, author):
+    return user.is_authenticated and Follow.objects.filter(
+        user=user, author=author,
+    ).exists()
+
+
+def _follow_button(request, params):
+    author = get_object_or_404(User, username=params.get('username'))
+    return {
+        'author': author,
+        'following': is_following(request.user, author),
+    }
+
+
+def _post_actions(request, params):
+    post_id = params.get('post_id', '')
+    if not post_id.isdigit():
+        raise Http404
+    post = get_object_or_404(
+        Post.objects.select_related('author').only('id', 'author__username'),
+        pk=post_id,
+    )
+    return {'post': post, 'form': CommentForm()}
+
+
+# Разметка конкретного пользователя на общих страницах: шаблон
+# и функция, собирающая его контекст для отдельного запроса фрагмента
+FRAGMENTS = {
+    'user_nav': Fragment('includes/user_nav.html', lambda request, _: {}),
+    'switcher': Fragment(
+        'posts/includes/switcher.html', lambda request, _: {'index': True},
+    ),
+    'follow_button': Fragment(
+        'posts/includes/follow_button.html', _follow_button,
+    ),
+    'post_actions': Fragment(
+        'posts/includes/post_actions.html', _post_actions,
+    ),
+}
@@ -0,0 +1,82 @@
+import base64
+from io import BytesIO
+
+from django.core.exceptions import SuspiciousFileOperation
+from django.utils import timezone
+from PIL import Image
+
+from .constants import PLACEHOLDER_QUALITY, PLACEHOLDER_SIZE
+from .feeds import forget_cards
+from .models import Post
+
+IMAGE_FIELDS = ('image_width', 'image_height', 'image_placeholder')
+
+
+def describe_image(file):
+    """
+    Размеры картинки и её крошечная размытая копия в виде data URI,
+    которую браузер покажет, пока грузится сама картинка.
+    """
+
+    file.seek(0)
+    with Image.open(file) as image:
+        width, height = image.size
+        preview = image.convert('RGB')
+        preview.thumbnail(PLACEHOLDER_SIZE)
+
+    buffer = BytesIO()
+    preview.save(buffer, 'JPEG', quality=PLACEHOLDER_QUALITY)
+    file.seek(0)
+    placeholder = 'data:image/jpeg;base64,' + base64.b64encode(
+        buffer.getvalue()
+    ).decode()
+
+    return width, height, placeholder
+
+
+def fill_image_fields(post):
+    """
+    Запоминает в посте размеры и заглушку его картинки.
+    Битый, пропавший или лежащий вне хранилища файл
+    оставляет поля пустыми.
+    """
+
+    post.image_width = post.image_height = None
+    post.image_placeholder = ''
+    if not post.image:
+        return
+    try:
+        (post.image_width, post.image_height,
+         post.image_placeholder) = describe_image(post.image)
+    except (OSError, SuspiciousFileOperation):
+        pass
+
+
+def backfill_image_fields(batch_size):
+    """
+    Заполняет размеры и заглушки картинок постов, сохранённых до
+    появления этих полей. Вместе с ними сдвигается updated, чтобы
+    закешированный HTML карточек без размеров устарел.
+    Возвращает число заполненных постов.
+    """
+
+    posts = Post.objects.exclude(image='').filter(
+        image_width__isnull=True,
+    ).order_by('pk').only('pk', 'image')
+    last_pk = 0
+    total = 0
+    while True:
+        batch = list(posts.filter(pk__gt=last_pk)[:batch_size])
+        if not batch:
+            break
+        last_pk = batch[-1].pk
+        now = timezone.now()
+        for post in batch:
+            fill_image_fields(post)
+            post.updated = now
+        described = [post for post in batch if post.image_width is not None]
+        Post.objects.bulk_update(described, (*IMAGE_FIELDS, 'updated'))
+        forget_cards(Post, *(post.pk for post in described))
+        total += len(described)
+
+    return total
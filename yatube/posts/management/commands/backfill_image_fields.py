@@ -0,0 +1,23 @@
+from django.core.management.base import BaseCommand
+
+from posts.cache import bump_generation
+from posts.constants import CONTENT_GENERATION, IMAGE_BACKFILL_BATCH_SIZE
+from posts.images import backfill_image_fields
+
+
+class Command(BaseCommand):
+    help = 'Заполняет размеры и заглушки картинок существующих постов.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=IMAGE_BACKFILL_BATCH_SIZE,
+        )
+
+    def handle(self, *args, **options):
+        total = backfill_image_fields(options['batch_size'])
+        if total:
+            # В карточках появились размеры картинок: ETag страниц устарели
+            bump_generation(CONTENT_GENERATION)
+        self.stdout.write(f'Заполнены размеры картинок {total} постов.')
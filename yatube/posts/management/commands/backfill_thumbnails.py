@@ -0,0 +1,22 @@
+from django.core.management.base import BaseCommand
+
+from posts.constants import THUMBNAIL_BATCH_SIZE
+from posts.thumbnails import enqueue_all_posts
+
+
+class Command(BaseCommand):
+    help = 'Ставит в очередь на превью картинки всех существующих постов.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=THUMBNAIL_BATCH_SIZE,
+        )
+
+    def handle(self, *args, **options):
+        total = enqueue_all_posts(options['batch_size'])
+        self.stdout.write(
+            f'В очередь поставлено {total} картинок, '
+            'их построит run_thumbnail_worker.'
+        )
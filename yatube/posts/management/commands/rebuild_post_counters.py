@@ -0,0 +1,12 @@
+from django.core.management.base import BaseCommand
+
+from posts.counters import rebuild_post_counters
+
+
+class Command(BaseCommand):
+    help = 'Сверяет счётчики постов лент с живыми данными.'
+
+    def handle(self, *args, **options):
+        total = rebuild_post_counters()
+
+        self.stdout.write(f'Пересчитаны {total} счётчиков постов.')
@@ -0,0 +1,32 @@
+from django.core.management.base import BaseCommand
+
+from posts.constants import SEARCH_REINDEX_BATCH_SIZE
+from posts.models import Post
+from posts.search import reindex_posts
+
+
+class Command(BaseCommand):
+    help = 'Заново индексирует все посты для поиска.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=SEARCH_REINDEX_BATCH_SIZE,
+        )
+
+    def handle(self, *args, **options):
+        post_ids = Post.objects.order_by('pk').values_list('pk', flat=True)
+        last_pk = 0
+        total = 0
+        while True:
+            batch = list(
+                post_ids.filter(pk__gt=last_pk)[:options['batch_size']]
+            )
+            if not batch:
+                break
+            reindex_posts(batch)
+            last_pk = batch[-1]
+            total += len(batch)
+
+        self.stdout.write(f'Проиндексировано {total} постов.')
@@ -0,0 +1,32 @@
+from django.core.management.base import BaseCommand
+
+from posts.constants import STATS_REBUILD_BATCH_SIZE
+from posts.models import User
+from posts.stats import rebuild_user_stats
+
+
+class Command(BaseCommand):
+    help = 'Пересчитывает счётчики постов, подписок и комментариев.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=STATS_REBUILD_BATCH_SIZE,
+            help='Сколько пользователей пересчитывать за одну транзакцию.',
+        )
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        user_ids = User.objects.order_by('pk').values_list('pk', flat=True)
+        last_pk = 0
+        total = 0
+        while True:
+            batch = list(user_ids.filter(pk__gt=last_pk)[:batch_size])
+            if not batch:
+                break
+            rebuild_user_stats(batch)
+            last_pk = batch[-1]
+            total += len(batch)
+
+        self.stdout.write(f'Пересчитаны счётчики {total} пользователей.')
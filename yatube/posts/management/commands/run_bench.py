@@ -0,0 +1,68 @@
+import json
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from posts.bench import run_bench
+from posts.constants import (BENCH_OUTPUT, BENCH_REQUESTS, BENCH_SEED,
+                             BENCH_USER_PREFIX, BENCH_WARMUP)
+from posts.models import UserStats
+
+
+class Command(BaseCommand):
+    help = (
+        'Прогоняет сценарии нагрузочного теста по данным seed_bench '
+        'и пишет перцентили задержки, RPS и число запросов в JSON.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=BENCH_REQUESTS)
+        parser.add_argument('--warmup', type=int, default=BENCH_WARMUP)
+        parser.add_argument('--seed', type=int, default=BENCH_SEED)
+        parser.add_argument('--output', default=BENCH_OUTPUT)
+        parser.add_argument(
+            '--memory',
+            action='store_true',
+            help='Мерить пик памяти на запрос (медленно).',
+        )
+        parser.add_argument(
+            '--only',
+            nargs='+',
+            help='Имена сценариев, например index follow_index.',
+        )
+
+    def handle(self, *args, **options):
+        if not settings.BENCH_DATABASE:
+            raise CommandError(
+                'Нагрузочный тест пишет в базу: запустите его '
+                'на отдельной, с YATUBE_BENCH=1.'
+            )
+        if not UserStats.objects.filter(
+            user__username__startswith=BENCH_USER_PREFIX,
+        ).exists():
+            raise CommandError('Нет данных для теста, запустите seed_bench.')
+        if settings.DEBUG:
+            self.stderr.write('DEBUG включён: цифры будут завышены.')
+
+        report = run_bench(
+            requests=options['requests'],
+            warmup=options['warmup'],
+            seed=options['seed'],
+            only=options['only'],
+            memory=options['memory'],
+        )
+        with open(options['output'], 'w', encoding='utf-8') as output:
+            json.dump(report, output, ensure_ascii=False, indent=2)
+
+        for name, result in report['scenarios'].items():
+            self.stdout.write(
+                f'{name:<24} p50 {result["p50_ms"]:>8} мс  '
+                f'p95 {result["p95_ms"]:>8} мс  '
+                f'p99 {result["p99_ms"]:>8} мс  '
+                f'{result["rps"]:>7} rps  '
+                f'{result["queries_per_request"]:>6} SQL  '
+                f'рендер {result["render_ms"]:>7} мс'
+                + (f'  память {result["memory_kb"]:>7} КБ'
+                   if options['memory'] else '')
+            )
+        self.stdout.write(f'Отчёт записан в {options["output"]}')
@@ -0,0 +1,66 @@
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from django.core.management.base import BaseCommand
+
+from posts.cache import bump_generation
+from posts.constants import (CONTENT_GENERATION, THUMBNAIL_BATCH_SIZE,
+                             THUMBNAIL_POLL_INTERVAL)
+from posts.thumbnail_worker import build_thumbnails, init_worker
+from posts.thumbnails import claim_thumbnail_tasks, finish_thumbnail_tasks
+
+
+class Command(BaseCommand):
+    help = 'Строит превью картинок из очереди пулом процессов.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=os.cpu_count(),
+            help='Число процессов пула, 0 - строить в текущем процессе.',
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=THUMBNAIL_BATCH_SIZE,
+            help='Сколько задач забирать из очереди за раз.',
+        )
+        parser.add_argument(
+            '--once',
+            action='store_true',
+            help='Разобрать очередь и выйти, не дожидаясь новых задач.',
+        )
+
+    def handle(self, *args, **options):
+        pool = None
+        if options['workers']:
+            pool = ProcessPoolExecutor(
+                max_workers=options['workers'],
+                mp_context=multiprocessing.get_context('spawn'),
+                initializer=init_worker,
+            )
+        run = pool.map if pool else map
+
+        total = 0
+        try:
+            while True:
+                claim, tasks = claim_thumbnail_tasks(options['batch_size'])
+                if not tasks:
+                    if options['once']:
+                        break
+                    time.sleep(THUMBNAIL_POLL_INTERVAL)
+                    continue
+
+                list(run(build_thumbnails, [image for _, image in tasks]))
+                finish_thumbnail_tasks(claim)
+                # В карточках появились превью: ETag страниц устарели
+                bump_generation(CONTENT_GENERATION)
+                total += len(tasks)
+        finally:
+            if pool:
+                pool.shutdown()
+
+        self.stdout.write(f'Построены превью для {total} картинок.')
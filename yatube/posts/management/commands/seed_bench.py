@@ -0,0 +1,40 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from posts.bench import seed_bench
+from posts.constants import (BENCH_COMMENTS, BENCH_FOLLOWS, BENCH_GROUPS,
+                             BENCH_POSTS, BENCH_SEED, BENCH_USERS)
+
+
+class Command(BaseCommand):
+    help = (
+        'Заполняет базу синтетическими данными для нагрузочного теста. '
+        'Данные прошлого запуска удаляются.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=BENCH_USERS)
+        parser.add_argument('--groups', type=int, default=BENCH_GROUPS)
+        parser.add_argument('--posts', type=int, default=BENCH_POSTS)
+        parser.add_argument('--comments', type=int, default=BENCH_COMMENTS)
+        parser.add_argument('--follows', type=int, default=BENCH_FOLLOWS)
+        parser.add_argument('--seed', type=int, default=BENCH_SEED)
+
+    def handle(self, *args, **options):
+        if not settings.BENCH_DATABASE:
+            raise CommandError(
+                'Нагрузочный тест пишет в базу: запустите его '
+                'на отдельной, с YATUBE_BENCH=1.'
+            )
+        created = seed_bench(
+            users=options['users'],
+            groups=options['groups'],
+            posts=options['posts'],
+            comments=options['comments'],
+            follows=options['follows'],
+            seed=options['seed'],
+        )
+
+        self.stdout.write(', '.join(
+            f'{name}: {count}' for name, count in created.items()
+        ))
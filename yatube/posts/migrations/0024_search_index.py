@@ -0,0 +1,67 @@
+# Generated by Django 2.2.16 on 2026-10-17 06:04
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+FTS_TABLE = 'posts_post_fts'
+
+
+def create_fts_table(apps, schema_editor):
+    """Создаёт таблицу FTS5 и заполняет её, если SQLite её поддерживает."""
+
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    with schema_editor.connection.cursor() as cursor:
+        try:
+            cursor.execute(
+                f'CREATE VIRTUAL TABLE {FTS_TABLE} USING fts5('
+                'text, group_title, author_name, '
+                "tokenize='unicode61 remove_diacritics 2')"
+            )
+        except Exception:
+            return
+        cursor.execute(
+            f'INSERT INTO {FTS_TABLE}'
+            '(rowid, text, group_title, author_name) '
+            "SELECT p.id, p.text, COALESCE(g.title, ''), "
+            "u.first_name || ' ' || u.last_name || ' ' || u.username "
+            'FROM posts_post p '
+            'JOIN auth_user u ON u.id = p.author_id '
+            'LEFT JOIN posts_group g ON g.id = p.group_id'
+        )
+
+
+def drop_fts_table(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute(f'DROP TABLE IF EXISTS {FTS_TABLE}')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0023_post_image_size'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PostSearchTerm',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('term', models.CharField(max_length=64, verbose_name='терм')),
+                ('hits', models.PositiveIntegerField(default=1, verbose_name='вхождений')),
+                ('recency', models.FloatField(verbose_name='дней от начала эпохи до публикации')),
+                ('post', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='search_terms', to='posts.Post', verbose_name='пост')),
+            ],
+            options={
+                'verbose_name': 'Терм поиска',
+                'verbose_name_plural': 'Термы поиска',
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='postsearchterm',
+            constraint=models.UniqueConstraint(fields=('term', 'post'), name='uniq_search_term_and_post'),
+        ),
+        migrations.RunPython(create_fts_table, drop_fts_table),
+    ]
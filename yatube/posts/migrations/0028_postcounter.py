@@ -0,0 +1,25 @@
+# Generated by Django 2.2.16 on 2026-10-17 08:15
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0027_post_text_html_excerpt'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PostCounter',
+            fields=[
+                ('key', models.CharField(max_length=64, primary_key=True, serialize=False, verbose_name='лента')),
+                ('count', models.PositiveIntegerField(default=0, verbose_name='всего постов')),
+                ('reconciled', models.DateTimeField(verbose_name='Дата сверки с живыми данными')),
+            ],
+            options={
+                'verbose_name': 'Счётчик постов',
+                'verbose_name_plural': 'Счётчики постов',
+            },
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 2.2.16 on 2026-10-17 09:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0028_postcounter'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='thumbnailtask',
+            name='claim',
+            field=models.CharField(blank=True, db_index=True, max_length=32, verbose_name='метка воркера, взявшего задачу'),
+        ),
+        migrations.AddField(
+            model_name='thumbnailtask',
+            name='claimed_at',
+            field=models.DateTimeField(blank=True, null=True, verbose_name='Дата, когда задачу взяли в работу'),
+        ),
+    ]
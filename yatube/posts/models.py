@@ -1,13 +1,69 @@
 from django.contrib.auth import get_user_model
 from django.db import models
+from django.db.models import Q
+from django.template.defaultfilters import linebreaksbr
+from django.utils.text import Truncator
 
 from core.models import CreatedModel
 
-from .constants import POST_STR_LIM
+from .constants import POST_EXCERPT_LENGTH, POST_STR_LIM
 
 User = get_user_model()
 
 
+class KeysetQuerySet(models.QuerySet):
+    """Чтения для keyset-пагинации по (created, pk)."""
+
+    def older_than(self, created, pk):
+        """Записи старше ключа, от новых к старым."""
+
+        return self.filter(
+            Q(created__lt=created) | Q(created=created, pk__lt=pk)
+        ).order_by('-created', '-pk')
+
+    def newer_than(self, created, pk):
+        """Записи новее ключа, от старых к новым."""
+
+        return self.filter(
+            Q(created__gt=created) | Q(created=created, pk__gt=pk)
+        ).order_by('created', 'pk')
+
+
+class PostQuerySet(KeysetQuerySet):
+    def for_feed(self):
+        """
+        Посты для карточек ленты: автор и группа подтягиваются
+        одним JOIN, а читаются только колонки, нужные шаблону карточки.
+        Полный текст карточке не нужен, ей хватает готового отрывка.
+        """
+
+        return self.select_related('author', 'group').only(
+            'id', 'excerpt', 'created', 'updated',
+            'image', 'image_width', 'image_height',
+            'image_placeholder', 'author_id', 'group_id',
+            'author__username', 'author__first_name', 'author__last_name',
+            'group__slug',
+        )
+
+    def bulk_create(self, objs, *args, **kwargs):
+        """bulk_create идёт мимо save(): HTML текста считаем здесь."""
+
+        objs = list(objs)
+        for obj in objs:
+            obj.render_text()
+        return super().bulk_create(objs, *args, **kwargs)
+
+
+class CommentQuerySet(KeysetQuerySet):
+    def for_list(self):
+        """Комментарии для списка под постом вместе с их авторами."""
+
+        return self.select_related('author').only(
+            'id', 'text', 'created', 'post_id', 'author_id',
+            'author__username',
+        )
+
+
 class Post(CreatedModel):
     """Модель постов."""
 
@@ -20,6 +76,7 @@ class Post(CreatedModel):
         on_delete=models.CASCADE,
         related_name='posts',
         verbose_name='автор поста',
+        db_index=False,
     )
     group = models.ForeignKey(
         'Group',
@@ -27,6 +84,7 @@ class Post(CreatedModel):
         related_name='posts',
         blank=True,
         null=True,
+        db_index=False,
         verbose_name='группа постов',
         help_text='Группа, к которой будет относиться пост',
     )
@@ -35,16 +93,85 @@ class Post(CreatedModel):
         upload_to='posts/',
         blank=True,
     )
+    image_width = models.PositiveIntegerField(
+        'Ширина картинки',
+        blank=True,
+        null=True,
+    )
+    image_height = models.PositiveIntegerField(
+        'Высота картинки',
+        blank=True,
+        null=True,
+    )
+    image_placeholder = models.TextField(
+        'Заглушка картинки',
+        blank=True,
+        help_text='Крошечная копия картинки в виде data URI',
+    )
+    updated = models.DateTimeField(
+        'Дата изменения',
+        auto_now=True,
+    )
+    text_html = models.TextField(
+        'Текст в HTML',
+        blank=True,
+        editable=False,
+    )
+    excerpt = models.TextField(
+        'Отрывок в HTML',
+        blank=True,
+        editable=False,
+        help_text='Начало текста для карточки в ленте',
+    )
+
+    objects = PostQuerySet.as_manager()
 
     class Meta:
         ordering = ('-created',)
         verbose_name = 'Пост'
         verbose_name_plural = 'Посты'
+        # Ленты группы и профиля: фильтр по FK и сортировка по дате
+        # читаются одним проходом индекса, без сортировки в памяти.
+        indexes = [
+            models.Index(
+                fields=['author', 'created'],
+                name='post_author_created_idx',
+            ),
+            models.Index(
+                fields=['group', 'created'],
+                name='post_group_created_idx',
+            ),
+        ]
 
     def __str__(self):
         """Метод, позволяющий получить text объекта"""
         return self.text[:POST_STR_LIM]
 
+    def render_text(self):
+        """Считает HTML текста и отрывок для карточки."""
+
+        self.text_html = linebreaksbr(self.text, autoescape=True)
+        self.excerpt = linebreaksbr(
+            Truncator(self.text).chars(POST_EXCERPT_LENGTH), autoescape=True,
+        )
+
+    def save(self, *args, **kwargs):
+        update_fields = kwargs.get('update_fields')
+        if update_fields is None or 'text' in update_fields:
+            self.render_text()
+        if update_fields:
+            # Производные поля и updated, по которому узнают
+            # устаревший HTML карточки, пишутся вместе с исходными
+            derived = {'updated'}
+            if 'text' in update_fields:
+                derived.update(('text_html', 'excerpt'))
+            if 'image' in update_fields:
+                derived.update(
+                    ('image_width', 'image_height', 'image_placeholder')
+                )
+            kwargs['update_fields'] = {*update_fields, *derived}
+        super().save(*args, **kwargs)
+
 
 class Group(models.Model):
     """Модель групп постов."""
@@ -70,6 +197,7 @@ class Comment(models.Model):
         on_delete=models.CASCADE,
         related_name='comments',
         verbose_name='пост комментария',
+        db_index=False,
     )
     author = models.ForeignKey(
         User,
@@ -82,6 +210,16 @@ class Comment(models.Model):
         auto_now_add=True,
     )
 
+    objects = CommentQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=['post', 'created'],
+                name='comment_post_created_idx',
+            ),
+        ]
+
 
 class Follow(models.Model):
     user = models.ForeignKey(
@@ -95,12 +233,185 @@ class Follow(models.Model):
         on_delete=models.CASCADE,
         related_name='following',
         verbose_name='Подписка',
+        db_index=False,
     )
 
     class Meta:
+        # Поиск по user идёт через уникальный (user, author),
+        # по автору - через обратный ему индекс.
+        indexes = [
+            models.Index(
+                fields=['author', 'user'],
+                name='follow_author_user_idx',
+            ),
+        ]
         constraints = [
             models.UniqueConstraint(
                 fields=['user', 'author'],
                 name='uniq_user_and_author'
             )
         ]
+
+
+class TimelineEntry(models.Model):
+    """
+    Запись материализованной ленты подписок: пост автора,
+    разложенный в ленту каждого его подписчика.
+    """
+
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='timeline',
+        verbose_name='читатель ленты',
+    )
+    post = models.ForeignKey(
+        'Post',
+        on_delete=models.CASCADE,
+        related_name='timeline_entries',
+        verbose_name='пост',
+    )
+    author = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='+',
+        verbose_name='автор поста',
+    )
+    created = models.DateTimeField(verbose_name='Дата создания поста')
+
+    class Meta:
+        ordering = ('-created',)
+        verbose_name = 'Запись ленты'
+        verbose_name_plural = 'Записи ленты'
+        indexes = [
+            # Страница ленты - диапазон этого индекса в порядке
+            # (-created, -post): без сортировки во временном B-дереве
+            models.Index(
+                fields=['user', '-created', '-post'],
+                name='timeline_user_created_idx',
+            ),
+        ]
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'post'],
+                name='uniq_timeline_user_and_post'
+            )
+        ]
+
+
+class UserStats(models.Model):
+    """Денормализованные счётчики профиля пользователя."""
+
+    user = models.OneToOneField(
+        User,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='stats',
+        verbose_name='пользователь',
+    )
+    posts_count = models.PositiveIntegerField(
+        verbose_name='всего постов',
+        default=0,
+    )
+    follows_count = models.PositiveIntegerField(
+        verbose_name='всего подписок',
+        default=0,
+    )
+    followers_count = models.PositiveIntegerField(
+        verbose_name='всего подписчиков',
+        default=0,
+    )
+    comments_count = models.PositiveIntegerField(
+        verbose_name='всего комментариев',
+        default=0,
+    )
+
+    class Meta:
+        verbose_name = 'Счётчики пользователя'
+        verbose_name_plural = 'Счётчики пользователей'
+
+
+class PostCounter(models.Model):
+    """
+    Денормализованное число постов ленты: всех ('all')
+    или одной группы ('group:<id>'). Посты автора считает UserStats.
+    """
+
+    key = models.CharField(
+        verbose_name='лента',
+        max_length=64,
+        primary_key=True,
+    )
+    count = models.PositiveIntegerField(
+        verbose_name='всего постов',
+        default=0,
+    )
+    reconciled = models.DateTimeField(
+        verbose_name='Дата сверки с живыми данными',
+    )
+
+    class Meta:
+        verbose_name = 'Счётчик постов'
+        verbose_name_plural = 'Счётчики постов'
+
+
+class ThumbnailTask(models.Model):
+    """Очередь картинок, для которых нужно заранее построить превью."""
+
+    image = models.CharField(
+        verbose_name='путь к картинке',
+        max_length=255,
+        unique=True,
+    )
+    created = models.DateTimeField(
+        verbose_name='Дата постановки в очередь',
+        auto_now_add=True,
+    )
+    claim = models.CharField(
+        verbose_name='метка воркера, взявшего задачу',
+        max_length=32,
+        blank=True,
+        db_index=True,
+    )
+    claimed_at = models.DateTimeField(
+        verbose_name='Дата, когда задачу взяли в работу',
+        null=True,
+        blank=True,
+    )
+
+    class Meta:
+        ordering = ('created',)
+        verbose_name = 'Задача на превью'
+        verbose_name_plural = 'Задачи на превью'
+
+
+class PostSearchTerm(models.Model):
+    """
+    Запись встроенного инвертированного индекса поиска.
+    Используется, только когда SQLite собран без FTS5.
+    """
+
+    term = models.CharField(verbose_name='терм', max_length=64)
+    post = models.ForeignKey(
+        'Post',
+        on_delete=models.CASCADE,
+        related_name='search_terms',
+        verbose_name='пост',
+    )
+    hits = models.PositiveIntegerField(
+        verbose_name='вхождений',
+        default=1,
+    )
+    recency = models.FloatField(
+        verbose_name='дней от начала эпохи до публикации',
+    )
+
+    class Meta:
+        verbose_name = 'Терм поиска'
+        verbose_name_plural = 'Термы поиска'
+        constraints = [
+            models.UniqueConstraint(
+                fields=['term', 'post'],
+                name='uniq_search_term_and_post'
+            )
+        ]
@@ -0,0 +1,210 @@
+import base64
+import binascii
+import math
+import re
+from collections import Counter
+from datetime import datetime, timezone
+from functools import lru_cache, reduce
+from operator import or_
+
+from django.db import connection
+from django.db.models import (Case, FloatField, IntegerField, Max, Q, Sum,
+                              Value, When)
+from django.db.models.functions import Cast
+
+from .constants import (CURSOR_PK_MAX, SEARCH_FTS_TABLE,
+                        SEARCH_PER_PAGE_LIMIT, SEARCH_RECENCY_WEIGHT,
+                        SEARCH_TERM_MAX_LENGTH)
+from .models import Post, PostSearchTerm
+
+WORD_RE = re.compile(r'[^\W_]+')
+EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+# julianday() начала эпохи Unix: переводит дату SQLite в дни от эпохи
+JULIAN_EPOCH = 2440587.5
+# Больше любого символа: term < префикс + PREFIX_END для всех продолжений
+PREFIX_END = chr(0x10FFFF)
+
+
+def tokenize(text):
+    return [
+        word[:SEARCH_TERM_MAX_LENGTH]
+        for word in WORD_RE.findall(text.lower())
+    ]
+
+
+def encode_search_cursor(score, pk):
+    raw = f'{score!r}|{pk}'
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+
+def decode_search_cursor(cursor):
+    """Распаковывает курсор выдачи в (score, pk), битый курсор - None."""
+
+    try:
+        padding = '=' * (-len(cursor) % 4)
+        score, pk = base64.urlsafe_b64decode(
+            cursor + padding
+        ).decode().rsplit('|', 1)
+        score, pk = float(score), int(pk)
+        if not math.isfinite(score) or not 0 < pk <= CURSOR_PK_MAX:
+            return None
+        return score, pk
+    except (binascii.Error, UnicodeDecodeError, ValueError):
+        return None
+
+
+def _documents(post_ids):
+    """Индексируемые поля постов: текст, название группы, имя автора."""
+
+    rows = Post.objects.filter(pk__in=post_ids).values_list(
+        'pk', 'text', 'created', 'group__title',
+        'author__first_name', 'author__last_name', 'author__username',
+    )
+    for pk, text, created, group_title, *names in rows:
+        yield pk, text, created, group_title or '', ' '.join(names)
+
+
+class Fts5Index:
+    """Индекс на виртуальной таблице SQLite FTS5, ранжирование bm25."""
+
+    def update(self, post_ids):
+        documents = [
+            (pk, text, group_title, author_name)
+            for pk, text, _, group_title, author_name
+            in _documents(post_ids)
+        ]
+        self.remove(post_ids)
+        with connection.cursor() as cursor:
+            cursor.executemany(
+                f'INSERT INTO {SEARCH_FTS_TABLE}'
+                '(rowid, text, group_title, author_name) '
+                'VALUES (%s, %s, %s, %s)',
+                documents,
+            )
+
+    def remove(self, post_ids):
+        with connection.cursor() as cursor:
+            cursor.executemany(
+                f'DELETE FROM {SEARCH_FTS_TABLE} WHERE rowid = %s',
+                [(pk,) for pk in post_ids],
+            )
+
+    def search(self, terms, after, limit):
+        match = ' '.join('"{}"*'.format(term) for term in terms)
+        keyset = ''
+        params = [SEARCH_RECENCY_WEIGHT, JULIAN_EPOCH, match]
+        if after:
+            keyset = 'WHERE score > %s OR (score = %s AND id > %s)'
+            params.extend([after[0], after[0], after[1]])
+        params.append(limit)
+
+        with connection.cursor() as cursor:
+            cursor.execute(
+                'SELECT id, score FROM ('
+                f'  SELECT p.id AS id, bm25({SEARCH_FTS_TABLE}, 1.0, 0.5, 0.5)'
+                '    - %s * (julianday(p.created) - %s) AS score'
+                f'  FROM {SEARCH_FTS_TABLE}'
+                f'  JOIN posts_post p ON p.id = {SEARCH_FTS_TABLE}.rowid'
+                f'  WHERE {SEARCH_FTS_TABLE} MATCH %s'
+                f') {keyset} ORDER BY score, id LIMIT %s',
+                params,
+            )
+            return cursor.fetchall()
+
+
+class InvertedIndex:
+    """
+    Встроенный инвертированный индекс на таблице PostSearchTerm:
+    релевантность - число вхождений всех слов запроса в пост.
+    """
+
+    def update(self, post_ids):
+        terms = []
+        for pk, text, created, group_title, author_name in _documents(
+            post_ids
+        ):
+            recency = (created - EPOCH).total_seconds() / 86400
+            counter = Counter(tokenize(
+                ' '.join((text, group_title, author_name))
+            ))
+            terms.extend(
+                PostSearchTerm(
+                    term=term, post_id=pk, hits=hits, recency=recency,
+                ) for term, hits in counter.items()
+            )
+        self.remove(post_ids)
+        PostSearchTerm.objects.bulk_create(terms)
+
+    def remove(self, post_ids):
+        PostSearchTerm.objects.filter(post_id__in=post_ids).delete()
+
+    def search(self, terms, after, limit):
+        # Как и "терм"* в FTS5, каждое слово запроса - префикс. Диапазон,
+        # в отличие от LIKE, идёт по индексу уникальности (term, post)
+        prefixes = [
+            Q(term__gte=term, term__lt=term + PREFIX_END)
+            for term in sorted(set(terms))
+        ]
+        matched = {
+            f'matched_{number}': Max(Case(
+                When(prefix, then=1), default=0, output_field=IntegerField(),
+            ))
+            for number, prefix in enumerate(prefixes)
+        }
+        ranked = PostSearchTerm.objects.filter(
+            reduce(or_, prefixes),
+        ).values('post_id').annotate(
+            score=Cast(
+                -Sum('hits'), FloatField()
+            ) - Value(SEARCH_RECENCY_WEIGHT) * Max('recency'),
+            **matched,
+        ).filter(**dict.fromkeys(matched, 1))
+        if after:
+            ranked = ranked.filter(
+                Q(score__gt=after[0])
+                | Q(score=after[0], post_id__gt=after[1])
+            )
+        return list(
+            ranked.order_by('score', 'post_id').values_list(
+                'post_id', 'score',
+            )[:limit]
+        )
+
+
+@lru_cache(maxsize=None)
+def fts5_available():
+    return SEARCH_FTS_TABLE in connection.introspection.table_names()
+
+
+def get_search_index():
+    """FTS5, если таблица есть, иначе встроенный инвертированный индекс."""
+
+    return Fts5Index() if fts5_available() else InvertedIndex()
+
+
+def reindex_posts(post_ids):
+    get_search_index().update(list(post_ids))
+
+
+def unindex_posts(post_ids):
+    get_search_index().remove(list(post_ids))
+
+
+def search_post_ids(query, cursor=None, limit=SEARCH_PER_PAGE_LIMIT):
+    """
+    Id постов по запросу, от самых релевантных и свежих,
+    и курсор следующей страницы (или None).
+    """
+
+    terms = tokenize(query)
+    if not terms:
+        return [], None
+
+    after = decode_search_cursor(cursor) if cursor else None
+    rows = get_search_index().search(terms, after, limit + 1)
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_search_cursor(*rows[-1][::-1])
+
+    return [pk for pk, _ in rows], next_cursor
@@ -0,0 +1,199 @@
+from django.db.models.signals import (post_delete, post_save, pre_delete,
+                                      pre_save)
+from django.dispatch import receiver
+
+from .cache import (author_tag, bump_generation, group_tag, post_tag,
+                    purge_tags, timeline_tag)
+from .constants import CONTENT_GENERATION, FEED_GENERATION
+from .counters import bump_post_counts, forget_group_counter
+from .feeds import forget_cards
+from .images import fill_image_fields
+from .models import Comment, Follow, Group, Post, User
+from .search import reindex_posts, unindex_posts
+from .stats import bump_user_stats, pause_user_stats
+from .thumbnails import enqueue_thumbnails
+from .timeline import (backfill_timeline, drop_from_timeline, fan_out_post,
+                       leave_pull_mode, purge_timelines, timeline_readers)
+
+PROFILE_FIELDS = ('username', 'first_name', 'last_name')
+
+
+def purge_post_feeds(post):
+    """Сбрасывает списки лент, в которые входит пост."""
+
+    bump_generation(FEED_GENERATION)
+    tags = [author_tag(post.author.username)]
+    if post.group_id:
+        tags.append(group_tag(post.group.slug))
+    purge_tags(*tags)
+
+
+def purge_users_pages(*user_ids):
+    """Сбрасывает профили пользователей: у них поменялись счётчики."""
+
+    purge_tags(*(
+        author_tag(username) for username in User.objects.filter(
+            pk__in=user_ids,
+        ).values_list('username', flat=True)
+    ))
+
+
+def move_post_group(post):
+    """Пост сменил группу: ленты и счётчики обеих групп устарели."""
+
+    old_group_id, old_group_slug = getattr(post, '_old_group', (None, None))
+    if old_group_id == post.group_id:
+        return
+    group_slug = post.group.slug if post.group_id else None
+    purge_tags(*(
+        group_tag(slug) for slug in (old_group_slug, group_slug) if slug
+    ))
+    bump_post_counts(-1, old_group_id, total=False)
+    bump_post_counts(1, post.group_id, total=False)
+
+
+@receiver(pre_save, sender=Post)
+def post_before_save(sender, instance, **kwargs):
+    instance._old_group, instance._old_image = (None, None), None
+    if instance.pk:
+        old_group_id, old_group_slug, instance._old_image = (
+            Post.objects.filter(pk=instance.pk).values_list(
+                'group_id', 'group__slug', 'image',
+            ).first() or (None, None, None)
+        )
+        instance._old_group = (old_group_id, old_group_slug)
+    # Так размеры получают и посты из админки или ORM, а не только из формы
+    if (instance.image.name or '') != (instance._old_image or ''):
+        fill_image_fields(instance)
+
+
+@receiver(post_save, sender=Post)
+def post_saved(sender, instance, created, **kwargs):
+    # Правка меняет только карточку поста, а не состав лент
+    forget_cards(Post, instance.pk)
+    purge_tags(post_tag(instance.pk))
+    if created:
+        purge_post_feeds(instance)
+    else:
+        bump_generation(CONTENT_GENERATION)
+        move_post_group(instance)
+    if instance.image.name != getattr(instance, '_old_image', None):
+        enqueue_thumbnails(instance.image.name)
+    reindex_posts([instance.pk])
+    if created:
+        bump_user_stats(instance.author_id, posts_count=1)
+        bump_post_counts(1, instance.group_id)
+        fan_out_post(instance)
+
+
+@receiver(pre_delete, sender=Post)
+def post_before_delete(sender, instance, **kwargs):
+    # Записи лент удалятся каскадом вместе с постом
+    instance._timeline_users = timeline_readers(instance.pk)
+
+
+@receiver(post_delete, sender=Post)
+def post_deleted(sender, instance, **kwargs):
+    forget_cards(Post, instance.pk)
+    purge_tags(post_tag(instance.pk))
+    purge_post_feeds(instance)
+    purge_timelines(getattr(instance, '_timeline_users', ()))
+    bump_user_stats(instance.author_id, posts_count=-1)
+    bump_post_counts(-1, instance.group_id)
+    unindex_posts([instance.pk])
+
+
+@receiver(post_save, sender=Follow)
+def follow_saved(sender, instance, created, **kwargs):
+    if created:
+        bump_user_stats(instance.user_id, follows_count=1)
+        bump_user_stats(instance.author_id, followers_count=1)
+        purge_tags(timeline_tag(instance.user_id))
+        purge_users_pages(instance.user_id, instance.author_id)
+        backfill_timeline(instance)
+
+
+@receiver(post_delete, sender=Follow)
+def follow_deleted(sender, instance, **kwargs):
+    bump_user_stats(instance.user_id, follows_count=-1)
+    bump_user_stats(instance.author_id, followers_count=-1)
+    purge_tags(timeline_tag(instance.user_id))
+    purge_users_pages(instance.user_id, instance.author_id)
+    drop_from_timeline(instance)
+    leave_pull_mode(instance.author_id)
+
+
+@receiver(post_save, sender=Comment)
+def comment_saved(sender, instance, created, **kwargs):
+    if created:
+        bump_user_stats(instance.author_id, comments_count=1)
+        purge_tags(post_tag(instance.post_id))
+
+
+@receiver(post_delete, sender=Comment)
+def comment_deleted(sender, instance, **kwargs):
+    bump_user_stats(instance.author_id, comments_count=-1)
+    purge_tags(post_tag(instance.post_id))
+
+
+@receiver(pre_delete, sender=Group)
+def group_before_delete(sender, instance, **kwargs):
+    instance._post_ids = list(
+        instance.posts.values_list('pk', flat=True)
+    )
+
+
+@receiver(post_save, sender=Group)
+@receiver(post_delete, sender=Group)
+def group_changed(sender, instance, created=False, **kwargs):
+    forget_cards(Group, instance.pk)
+    purge_tags(group_tag(instance.slug))
+    bump_generation(CONTENT_GENERATION)
+    if not created:
+        post_ids = getattr(instance, '_post_ids', None)
+        if post_ids is None:
+            post_ids = instance.posts.values_list('pk', flat=True)
+        else:
+            # Посты удалённой группы остались без неё
+            forget_cards(Post, *post_ids)
+            forget_group_counter(instance.pk)
+        reindex_posts(post_ids)
+
+
+def profile_saved(update_fields):
+    return update_fields is None or not set(PROFILE_FIELDS).isdisjoint(
+        update_fields
+    )
+
+
+@receiver(pre_save, sender=User)
+def user_before_save(sender, instance, update_fields=None, **kwargs):
+    instance._old_profile = None
+    if instance.pk and profile_saved(update_fields):
+        instance._old_profile = User.objects.filter(
+            pk=instance.pk,
+        ).values_list(*PROFILE_FIELDS).first()
+
+
+@receiver(post_save, sender=User)
+def user_saved(sender, instance, created, update_fields=None, **kwargs):
+    # Сохранение профиля целиком не повод переиндексировать все посты:
+    # важно лишь, поменялось ли имя, которое видно в карточках и поиске
+    old_profile = getattr(instance, '_old_profile', None)
+    if created or not profile_saved(update_fields) or old_profile == tuple(
+        getattr(instance, field) for field in PROFILE_FIELDS
+    ):
+        return
+    forget_cards(User, instance.pk)
+    bump_generation(CONTENT_GENERATION)
+    reindex_posts(instance.posts.values_list('pk', flat=True))
+
+
+@receiver(pre_delete, sender=User)
+def user_before_delete(sender, instance, **kwargs):
+    pause_user_stats(instance.pk)
+
+
+@receiver(post_delete, sender=User)
+def user_deleted(sender, instance, **kwargs):
+    pause_user_stats(instance.pk, paused=False)
@@ -0,0 +1,109 @@
+import threading
+
+from django.db import transaction
+from django.db.models import Count, F
+from django.db.models.functions import Greatest
+
+from .models import Comment, Follow, Post, UserStats
+
+STATS_FIELDS = (
+    'posts_count', 'follows_count', 'followers_count', 'comments_count',
+)
+
+_state = threading.local()
+
+
+def _counts_by(queryset, field, user_ids):
+    return dict(
+        queryset.filter(**{f'{field}__in': user_ids}).values_list(
+            field,
+        ).annotate(Count('pk')).order_by()
+    )
+
+
+def _live_stats(user_ids):
+    """Несохранённые счётчики пачки пользователей по живым данным."""
+
+    posts = _counts_by(Post.objects, 'author_id', user_ids)
+    follows = _counts_by(Follow.objects, 'user_id', user_ids)
+    followers = _counts_by(Follow.objects, 'author_id', user_ids)
+    comments = _counts_by(Comment.objects, 'author_id', user_ids)
+
+    return [UserStats(
+        user_id=user_id,
+        posts_count=posts.get(user_id, 0),
+        follows_count=follows.get(user_id, 0),
+        followers_count=followers.get(user_id, 0),
+        comments_count=comments.get(user_id, 0),
+    ) for user_id in user_ids]
+
+
+@transaction.atomic
+def rebuild_user_stats(user_ids):
+    """
+    Пересчитывает счётчики пачки пользователей по живым данным.
+    Строки обновляются на месте, а не удаляются и вставляются
+    заново: UPDATE из bump_user_stats не попадает в окно без строки.
+    """
+
+    user_ids = list(user_ids)
+    stats = _live_stats(user_ids)
+    existing = set(UserStats.objects.filter(
+        user_id__in=user_ids,
+    ).values_list('user_id', flat=True))
+    UserStats.objects.bulk_update(
+        [row for row in stats if row.user_id in existing], STATS_FIELDS,
+    )
+    UserStats.objects.bulk_create(
+        [row for row in stats if row.user_id not in existing],
+        ignore_conflicts=True,
+    )
+    return stats
+
+
+def _deleted_users():
+    if not hasattr(_state, 'deleted_users'):
+        _state.deleted_users = set()
+    return _state.deleted_users
+
+
+def pause_user_stats(user_id, paused=True):
+    """
+    Отключает пересоздание счётчиков удаляемого пользователя: каскад
+    удаляет его строку UserStats раньше постов, подписок и комментариев,
+    и bump_user_stats иначе вставил бы строку для пользователя,
+    которого вот-вот не станет.
+    """
+
+    if paused:
+        _deleted_users().add(user_id)
+    else:
+        _deleted_users().discard(user_id)
+
+
+def get_user_stats(user):
+    """
+    Счётчики пользователя. Если записи ещё нет, они считаются
+    по живым данным без записи в базу: страницы, которые читают
+    счётчики, ничего не пишут. Запись создаёт bump_user_stats.
+    """
+
+    try:
+        return user.stats
+    except UserStats.DoesNotExist:
+        return _live_stats([user.pk])[0]
+
+
+def bump_user_stats(user_id, **deltas):
+    """
+    Сдвигает счётчики пользователя атомарным UPDATE.
+    Если записи ещё нет, она пересчитывается по живым данным,
+    которые уже учитывают это изменение.
+    """
+
+    updated = UserStats.objects.filter(user_id=user_id).update(**{
+        field: Greatest(F(field) + delta, 0)
+        for field, delta in deltas.items()
+    })
+    if not updated and user_id not in _deleted_users():
+        rebuild_user_stats([user_id])
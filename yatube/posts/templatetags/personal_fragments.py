@@ -0,0 +1,42 @@
+from urllib.parse import urlencode
+
+from django import template
+from django.conf import settings
+from django.urls import reverse
+from django.utils.html import format_html
+from django.utils.safestring import mark_safe
+
+from posts.constants import FRAGMENTS_ESI
+from posts.fragments import FRAGMENTS, public_pages
+
+register = template.Library()
+
+
+@register.simple_tag(takes_context=True)
+def personal_fragment(context, name, **params):
+    """
+    Разметка пользователя на общей странице. В режиме inline
+    шаблон фрагмента рендерится на месте с текущим контекстом,
+    иначе вместо него ставится <esi:include> или заглушка для скрипта,
+    а сам фрагмент отдаёт posts:fragment по параметрам params.
+
+        {% personal_fragment 'follow_button' username=author.username %}
+    """
+
+    fragment = FRAGMENTS[name]
+    if not public_pages():
+        return mark_safe(context.template.engine.get_template(
+            fragment.template,
+        ).render(context))
+
+    url = reverse('posts:fragment', kwargs={'name': name})
+    if params:
+        url = f'{url}?{urlencode(params)}'
+    if settings.PERSONAL_FRAGMENTS == FRAGMENTS_ESI:
+        return format_html('<esi:include src="{}"/>', url)
+    return format_html('<div data-fragment="{}"></div>', url)
+
+
+@register.simple_tag
+def personal_fragments_mode():
+    return settings.PERSONAL_FRAGMENTS
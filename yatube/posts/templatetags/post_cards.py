@@ -0,0 +1,25 @@
+from django import template
+from django.utils.safestring import mark_safe
+
+from posts.constants import CARD_TEMPLATE
+from posts.feeds import render_cards
+
+register = template.Library()
+
+
+@register.simple_tag(takes_context=True)
+def post_cards(context, posts):
+    """
+    Готовый HTML карточек постов для цикла в шаблоне ленты:
+    каждая карточка рендерится один раз и дальше берётся из кеша.
+    """
+
+    card = context.template.engine.get_template(CARD_TEMPLATE)
+
+    def render(post):
+        with context.push(post=post):
+            return card.render(context)
+
+    return [mark_safe(html) for html in render_cards(
+        list(posts), render, show_group=not context.get('group'),
+    )]
@@ -0,0 +1,15 @@
+from django import template
+
+from posts.thumbnails import card_thumbnail as get_card_thumbnail
+
+register = template.Library()
+
+
+@register.simple_tag
+def card_thumbnail(image):
+    """
+    Готовое превью картинки карточки или None, если воркер его ещё
+    не построил. Сам тег картинки не читает и превью не генерирует.
+    """
+
+    return get_card_thumbnail(image)
@@ -1,8 +1,11 @@
 import shutil
 import tempfile
+from io import StringIO
 
 from django.conf import settings
+from django.core.cache import cache
 from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
 from django.test import Client, TestCase, override_settings
 from django.urls import reverse
 
@@ -166,3 +169,100 @@ class PostCreateFormTests(TestCase):
         self.assertEqual(dif_post.group, self.group)
         self.assertEqual(dif_post.author, self.user)
         self.assertEqual(dif_post.image.name, 'posts/small.gif')
+
+    @override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+    def test_post_form_stores_image_size_and_placeholder(self):
+        """
+        Тестируем, что форма один раз запоминает размеры картинки
+        и заглушку, а лента выводит их без чтения файла.
+        """
+
+        uploaded = SimpleUploadedFile(
+            name='size.gif',
+            content=self.uploaded.open().read(),
+            content_type='image/gif',
+        )
+        self.authorized_client.post(
+            reverse('posts:post_create'),
+            data={'text': 'Пост с размерами', 'image': uploaded},
+        )
+
+        post = Post.objects.get(text='Пост с размерами')
+        self.assertEqual((post.image_width, post.image_height), (2, 1))
+        self.assertTrue(
+            post.image_placeholder.startswith('data:image/jpeg;base64,')
+        )
+
+        response = self.authorized_client.get(
+            reverse('posts:profile',
+                    kwargs={'username': self.user.username})
+        )
+        self.assertContains(response, 'width="2" height="1"')
+        self.assertContains(response, post.image_placeholder)
+
+    @override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+    def test_orm_save_stores_image_size_and_placeholder(self):
+        """
+        Тестируем, что размеры и заглушку получает и пост,
+        сохранённый в обход формы, а снятая картинка их стирает.
+        """
+
+        post = Post.objects.create(
+            text='Пост из ORM',
+            author=self.user,
+            image=SimpleUploadedFile(
+                name='orm.gif',
+                content=self.uploaded.file.getvalue(),
+                content_type='image/gif',
+            ),
+        )
+        post.refresh_from_db()
+        self.assertEqual((post.image_width, post.image_height), (2, 1))
+        self.assertTrue(
+            post.image_placeholder.startswith('data:image/jpeg;base64,')
+        )
+
+        post.image = None
+        post.save(update_fields=['image'])
+        post.refresh_from_db()
+        self.assertEqual((post.image_width, post.image_height), (None, None))
+        self.assertEqual(post.image_placeholder, '')
+
+    @override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+    def test_backfill_fills_existing_images(self):
+        """
+        Тестируем, что backfill_image_fields заполняет размеры
+        и заглушку картинок постов, сохранённых до этих полей.
+        """
+
+        post = Post.objects.create(
+            text='Старый пост',
+            author=self.user,
+            image=SimpleUploadedFile(
+                name='old.gif',
+                content=self.uploaded.file.getvalue(),
+                content_type='image/gif',
+            ),
+        )
+        Post.objects.filter(pk=post.pk).update(
+            image_width=None, image_height=None, image_placeholder='',
+        )
+        Post.objects.create(text='Битая картинка', author=self.user,
+                            image='posts/missing.gif')
+        cache.clear()
+        self.assertNotContains(
+            self.client.get(reverse('posts:index')), 'width="2"',
+        )
+
+        out = StringIO()
+        call_command('backfill_image_fields', batch_size=1, stdout=out)
+        post.refresh_from_db()
+        self.assertEqual((post.image_width, post.image_height), (2, 1))
+        self.assertTrue(
+            post.image_placeholder.startswith('data:image/jpeg;base64,')
+        )
+        self.assertIn('1 постов', out.getvalue())
+        self.assertContains(
+            self.client.get(reverse('posts:index')),
+            'width="2" height="1"',
+        )
@@ -1,7 +1,17 @@
-from django.test import TestCase
+from io import StringIO
 
-from ..constants import POST_STR_LIM
-from ..models import Group, Post, User
+from datetime import timedelta
+
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from django.utils import timezone
+
+from ..constants import (POST_COUNTER_RECONCILE_INTERVAL, POST_EXCERPT_LENGTH,
+                         POST_STR_LIM)
+from ..counters import counter_key, get_post_count
+from ..models import (Comment, Follow, Group, Post, PostCounter, User,
+                      UserStats)
+from ..stats import get_user_stats, rebuild_user_stats
 
 
 class PostModelTest(TestCase):
@@ -60,3 +70,224 @@ class PostModelTest(TestCase):
 
         post_expected_object_name = post.text[:POST_STR_LIM]
         self.assertEqual(post_expected_object_name, str(post))
+
+    def test_text_html_and_excerpt_are_stored(self):
+        """
+        Тестируем, что при сохранении поста считаются HTML текста
+        и ограниченный отрывок, а лента не читает полный текст.
+        """
+
+        post = Post.objects.create(
+            author=self.user,
+            text='<b>Первая</b>\n' + 'слово ' * POST_EXCERPT_LENGTH,
+        )
+        self.assertTrue(post.text_html.startswith(
+            '&lt;b&gt;Первая&lt;/b&gt;<br>слово'
+        ))
+        self.assertTrue(post.text_html.startswith(post.excerpt[:-1]))
+        self.assertTrue(post.excerpt.endswith('…'))
+        self.assertLess(len(post.excerpt), len(post.text_html))
+
+        post.text = 'Новый текст'
+        post.save(update_fields=['text'])
+        post.refresh_from_db()
+        self.assertEqual(post.excerpt, 'Новый текст')
+
+        feed_post = Post.objects.for_feed().get(pk=post.pk)
+        self.assertIn('text', feed_post.get_deferred_fields())
+
+
+class UserStatsTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='auth')
+        cls.reader = User.objects.create_user(username='reader')
+
+    def assert_stats(self, user, **expected):
+        stats = UserStats.objects.get(user=user)
+        for field, value in expected.items():
+            with self.subTest(field=field):
+                self.assertEqual(getattr(stats, field), value)
+
+    def test_stats_follow_create_and_delete(self):
+        """Тестируем, что счётчики меняются вместе с постами и подписками."""
+
+        rebuild_user_stats([self.user.pk, self.reader.pk])
+
+        post = Post.objects.create(author=self.user, text='Тестовый пост')
+        follow = Follow.objects.create(user=self.reader, author=self.user)
+        comment = Comment.objects.create(
+            author=self.reader, post=post, text='Коммент',
+        )
+        self.assert_stats(self.user, posts_count=1, followers_count=1)
+        self.assert_stats(self.reader, follows_count=1, comments_count=1)
+
+        comment.delete()
+        follow.delete()
+        post.delete()
+        self.assert_stats(self.user, posts_count=0, followers_count=0)
+        self.assert_stats(self.reader, follows_count=0, comments_count=0)
+
+    def test_user_with_content_can_be_deleted(self):
+        """
+        Тестируем, что удаление пользователя с постами, подписками
+        и комментариями не пересоздаёт его счётчики.
+        """
+
+        author = User.objects.create_user(username='leaving')
+        post = Post.objects.create(author=author, text='Тестовый пост')
+        Comment.objects.create(author=author, post=post, text='Коммент')
+        Follow.objects.create(user=author, author=self.user)
+        Follow.objects.create(user=self.reader, author=author)
+
+        author.delete()
+
+        self.assertFalse(UserStats.objects.filter(user_id=author.pk).exists())
+        self.assert_stats(self.user, followers_count=0)
+        self.assert_stats(self.reader, follows_count=0)
+        Post.objects.create(author=self.reader, text='Новый пост')
+        self.assert_stats(self.reader, posts_count=1)
+
+    def test_rebuild_user_stats_command(self):
+        """Тестируем пересчёт счётчиков командой rebuild_user_stats."""
+
+        Post.objects.bulk_create(
+            [Post(author=self.user, text=f'Пост {i}') for i in range(3)]
+        )
+        Follow.objects.create(user=self.reader, author=self.user)
+
+        call_command('rebuild_user_stats', batch_size=1, stdout=StringIO())
+        self.assert_stats(self.user, posts_count=3, followers_count=1)
+        self.assert_stats(self.reader, follows_count=1, posts_count=0)
+
+    def test_missing_stats_are_counted_without_writes(self):
+        """
+        Тестируем, что чтение статистики без строки считает её по живым
+        данным и ничего не пишет, а запись поста эту строку создаёт.
+        """
+
+        Post.objects.create(author=self.user, text='Тестовый пост')
+        UserStats.objects.all().delete()
+
+        stats = get_user_stats(self.user)
+        self.assertEqual(stats.posts_count, 1)
+        self.assertFalse(UserStats.objects.exists())
+
+        Post.objects.create(author=self.user, text='Ещё пост')
+        self.assert_stats(self.user, posts_count=2)
+
+
+class PostCounterTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='auth')
+        cls.group = Group.objects.create(
+            title='Тестовая группа',
+            slug='test_slug',
+            description='Тестовое описание',
+        )
+        cls.group_two = Group.objects.create(
+            title='Тестовая группа 2',
+            slug='test_slug_two',
+            description='Тестовое описание 2',
+        )
+
+    def assert_counts(self, total, group, group_two):
+        for group_id, expected in (
+            (None, total), (self.group.pk, group),
+            (self.group_two.pk, group_two),
+        ):
+            with self.subTest(group_id=group_id):
+                self.assertEqual(get_post_count(group_id=group_id), expected)
+
+    def test_counters_follow_posts(self):
+        """
+        Тестируем, что счётчики лент сдвигаются при создании,
+        переносе в другую группу и удалении поста без COUNT(*).
+        """
+
+        Post.objects.bulk_create(
+            [Post(author=self.user, text=f'Пост {i}') for i in range(2)]
+        )
+        self.assert_counts(2, 0, 0)
+
+        post = Post.objects.create(
+            author=self.user, group=self.group, text='Тестовый пост',
+        )
+        post.group = self.group_two
+        post.save()
+        with self.assertNumQueries(3):
+            self.assert_counts(3, 0, 1)
+        self.assertEqual(get_post_count(author=self.user), 3)
+
+        post.delete()
+        self.assert_counts(2, 0, 0)
+
+    def test_stale_counter_is_reconciled(self):
+        """
+        Тестируем, что разошедшийся счётчик сверяется с живыми
+        данными при записи поста по истечении интервала и командой,
+        а чтение ленты в базу не пишет.
+        """
+
+        Post.objects.create(author=self.user, text='Тестовый пост')
+        self.assert_counts(1, 0, 0)
+        PostCounter.objects.filter(key=counter_key()).update(
+            count=5,
+            reconciled=timezone.now() - timedelta(
+                seconds=POST_COUNTER_RECONCILE_INTERVAL + 1,
+            ),
+        )
+        with self.assertNumQueries(1):
+            self.assertEqual(get_post_count(), 5)
+
+        Post.objects.create(author=self.user, text='Ещё пост')
+        self.assertEqual(get_post_count(), 2)
+
+        PostCounter.objects.filter(key=counter_key()).update(count=5)
+        call_command('rebuild_post_counters', stdout=StringIO())
+        self.assert_counts(2, 0, 0)
+
+    def test_rebuild_keeps_counter_rows(self):
+        """
+        Тестируем, что команда пересчитывает счётчики на месте
+        и удаляет только счётчики несуществующих групп.
+        """
+
+        Post.objects.create(author=self.user, text='Тестовый пост')
+        PostCounter.objects.filter(key=counter_key()).update(count=5)
+        PostCounter.objects.create(
+            key=counter_key(self.group_two.pk + 1),
+            count=3,
+            reconciled=timezone.now(),
+        )
+        call_command('rebuild_post_counters', stdout=StringIO())
+
+        self.assert_counts(1, 0, 0)
+        self.assertEqual(
+            set(PostCounter.objects.values_list('key', flat=True)),
+            {counter_key(group_id) for group_id in
+             (None, self.group.pk, self.group_two.pk)},
+        )
+
+    def test_missing_counter_is_counted_without_writes(self):
+        """Тестируем, что без счётчика чтение считает COUNT(*) и не пишет."""
+
+        Post.objects.bulk_create(
+            [Post(author=self.user, text=f'Пост {i}') for i in range(2)]
+        )
+        self.assert_counts(2, 0, 0)
+        self.assertFalse(PostCounter.objects.exists())
+
+    @override_settings(POST_COUNTS='exact')
+    def test_exact_mode_counts_live(self):
+        """Тестируем, что в режиме exact счётчики не используются."""
+
+        Post.objects.bulk_create(
+            [Post(author=self.user, text=f'Пост {i}') for i in range(2)]
+        )
+        self.assertEqual(get_post_count(), 2)
+        self.assertEqual(get_post_count(author=self.user), 2)
+        self.assertFalse(PostCounter.objects.exists())
@@ -0,0 +1,115 @@
+import re
+from unittest import skipUnless
+
+from django.core.cache import cache
+from django.db import connection
+from django.test import Client, TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from ..constants import INDEX_PER_PAGE_LIMIT, TIMELINE_PULL_AUTHORS_KEY
+from ..models import Comment, Follow, Group, Post, User
+
+# Полный проход таблицы без индекса: "SCAN posts_post",
+# а в SQLite до 3.36 - "SCAN TABLE posts_post"
+FULL_SCAN_RE = re.compile(r'^SCAN (TABLE )?\S+$')
+TEMP_SORT = 'USE TEMP B-TREE'
+
+
+@skipUnless(connection.vendor == 'sqlite', 'EXPLAIN QUERY PLAN из SQLite')
+class TestQueryPlans(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='reader')
+        cls.author = User.objects.create_user(username='writer')
+        cls.group = Group.objects.create(
+            title='Тестовая группа',
+            slug='test_slug',
+            description='Тестовое описание',
+        )
+        Post.objects.bulk_create(Post(
+            author=cls.author, group=cls.group, text=f'Пост {number}',
+        ) for number in range(INDEX_PER_PAGE_LIMIT + 1))
+        cls.post = Post.objects.order_by('pk').last()
+        Comment.objects.create(
+            post=cls.post, author=cls.user, text='Комментарий',
+        )
+        Follow.objects.create(user=cls.user, author=cls.author)
+
+    def setUp(self):
+        cache.clear()
+        self.authorized_client = Client()
+        self.authorized_client.force_login(self.user)
+
+    def query_plans(self, client, url):
+        with CaptureQueriesContext(connection) as context:
+            response = client.get(url)
+        self.assertEqual(response.status_code, 200)
+
+        plans = []
+        with connection.cursor() as cursor:
+            for query in context.captured_queries:
+                if not query['sql'].startswith('SELECT'):
+                    continue
+                cursor.execute('EXPLAIN QUERY PLAN ' + query['sql'])
+                plans.append(
+                    (query['sql'], [row[-1] for row in cursor.fetchall()])
+                )
+        return plans
+
+    def assertIndexedPlans(self, client, url):
+        for sql, plan in self.query_plans(client, url):
+            with self.subTest(url=url, sql=sql[:120]):
+                scans = [step for step in plan if FULL_SCAN_RE.match(step)]
+                self.assertEqual(scans, [], plan)
+                sorts = [step for step in plan if TEMP_SORT in step]
+                self.assertEqual(sorts, [], plan)
+
+    def test_listing_views_use_indexes(self):
+        """
+        Тестируем, что запросы лент идут по индексам:
+        без полного прохода таблиц и без сортировки во временном B-дереве.
+        """
+
+        next_page = self.client.get(
+            reverse('posts:index')
+        ).context['page_obj'].paginator.next_cursor
+        urls = (
+            reverse('posts:index'),
+            f'{reverse("posts:index")}?page=2',
+            f'{reverse("posts:index")}?cursor={next_page}',
+            reverse('posts:group_list', kwargs={'slug': self.group.slug}),
+            f'{reverse("posts:group_list", kwargs={"slug": self.group.slug})}'
+            f'?cursor={next_page}',
+            reverse('posts:profile',
+                    kwargs={'username': self.author.username}),
+            reverse('posts:post_detail', kwargs={'post_id': self.post.pk}),
+            reverse('posts:post_comments', kwargs={'post_id': self.post.pk}),
+        )
+        for url in urls:
+            cache.clear()
+            self.assertIndexedPlans(self.authorized_client, url)
+
+    def test_follow_index_reads_timeline_range(self):
+        """
+        Тестируем ленту подписок: страница - диапазон индекса
+        материализованной ленты и постов популярного автора,
+        без сортировки во временном B-дереве.
+        """
+
+        star = User.objects.create_user(username='star')
+        Post.objects.bulk_create(Post(
+            author=star, text=f'Пост звезды {number}',
+        ) for number in range(3))
+        Follow.objects.create(user=self.user, author=star)
+        url = reverse('posts:follow')
+        cache.set(TIMELINE_PULL_AUTHORS_KEY, {star.pk})
+        next_page = self.authorized_client.get(
+            url
+        ).context['page_obj'].paginator.next_cursor
+
+        for page_url in (url, f'{url}?cursor={next_page}', f'{url}?page=2'):
+            cache.clear()
+            cache.set(TIMELINE_PULL_AUTHORS_KEY, {star.pk})
+            self.assertIndexedPlans(self.authorized_client, page_url)
@@ -1,17 +1,48 @@
+import json
+import math
 import shutil
 import tempfile
+import time
+from datetime import timedelta
+from io import StringIO
+from unittest import mock
 
 from django.conf import settings
 from django.core.cache import cache
 from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.db import connection
 from django.test import Client, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
+from django.utils import timezone
 
-from ..constants import PAGI_INDEX_LAST_PAGE, PAGI_INDEX_PER_PAGE
+from ..constants import (COMMENTS_PER_PAGE_LIMIT, CURSOR_NEXT, CURSOR_PK_MAX,
+                         INDEX_PER_PAGE_LIMIT, PAGI_INDEX_LAST_PAGE,
+                         PAGI_INDEX_PER_PAGE, THUMBNAIL_CLAIM_TIMEOUT,
+                         TIMELINE_PULL_AUTHORS_KEY)
 from ..forms import CommentForm, PostForm
-from ..models import Comment, Follow, Group, Post, User
+from ..models import (Comment, Follow, Group, Post, PostCounter,
+                      PostSearchTerm, ThumbnailTask, TimelineEntry, User,
+                      UserStats)
+from ..cache import (fragment_cache_stats, get_or_recompute,
+                     page_cache_stats)
+from ..search import encode_search_cursor, reindex_posts
+from ..stats import rebuild_user_stats
+from ..thumbnails import (claim_thumbnail_tasks, enqueue_thumbnails,
+                          finish_thumbnail_tasks)
+from ..utils import encode_cursor
 
 TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
+SMALL_GIF = (
+    b"\x47\x49\x46\x38\x39\x61\x02\x00"
+    b"\x01\x00\x80\x00\x00\x00\x00\x00"
+    b"\xFF\xFF\xFF\x21\xF9\x04\x00\x00"
+    b"\x00\x00\x00\x2C\x00\x00\x00\x00"
+    b"\x02\x00\x01\x00\x00\x02\x02\x0C"
+    b"\x0A\x00\x3B"
+)
 
 
 @override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
@@ -366,25 +397,185 @@ class TestPaginator(TestCase):
                 self.assertEqual(
                     len(response.context['page_obj']), pag_records)
 
+    def test_cursor_paginator_next_and_previous_pages(self):
+        """
+        Тестируем переходы курсорного пагинатора вперёд и назад.
+        """
+
+        urls = (
+            reverse('posts:index'),
+            reverse('posts:group_list', kwargs={'slug': self.group.slug}),
+            reverse('posts:profile', kwargs={'username': self.user.username}),
+        )
+        for url in urls:
+            with self.subTest(url=url):
+                first_page = self.authorized_client.get(url).context[
+                    'page_obj']
+                self.assertFalse(first_page.has_previous())
+                self.assertTrue(first_page.has_next())
+
+                second_page = self.authorized_client.get(
+                    url, {'cursor': first_page.paginator.next_cursor}
+                ).context['page_obj']
+                self.assertEqual(len(second_page), PAGI_INDEX_LAST_PAGE)
+                self.assertFalse(second_page.has_next())
+                self.assertTrue(
+                    set(first_page).isdisjoint(set(second_page))
+                )
+
+                previous_page = self.authorized_client.get(
+                    url, {'cursor': second_page.paginator.previous_cursor}
+                ).context['page_obj']
+                self.assertEqual(list(previous_page), list(first_page))
+                self.assertFalse(previous_page.has_previous())
+
+    def test_broken_cursor_shows_first_page(self):
+        """Тестируем, что битый курсор открывает первую страницу."""
+
+        response = self.authorized_client.get(
+            reverse('posts:index'), {'cursor': 'не-курсор'}
+        )
+        self.assertEqual(
+            len(response.context['page_obj']), PAGI_INDEX_PER_PAGE)
+        self.assertFalse(response.context['page_obj'].has_previous())
+
+    def test_out_of_range_cursor_shows_first_page(self):
+        """
+        Тестируем, что курсор с pk вне диапазона INTEGER считается
+        битым, а не роняет страницу.
+        """
+
+        post = Post.objects.first()
+        cursor = encode_cursor(
+            Post(created=timezone.now(), pk=CURSOR_PK_MAX + 1), CURSOR_NEXT,
+        )
+        pages = {
+            reverse('posts:index'): 'page_obj',
+            reverse('posts:profile', kwargs={'username': self.user.username}):
+                'page_obj',
+            reverse('posts:post_detail', kwargs={'post_id': post.pk}):
+                'comments',
+        }
+        for url, page in pages.items():
+            with self.subTest(url=url):
+                response = self.authorized_client.get(url, {'cursor': cursor})
+                self.assertEqual(response.status_code, 200)
+                self.assertFalse(response.context[page].has_previous())
+
+    def test_paginator_shows_window_of_pages(self):
+        """
+        Тестируем, что пагинатор показывает первую, последнюю
+        и соседние страницы, а число постов берёт не из COUNT(*).
+        """
+
+        Post.objects.bulk_create(Post(
+            author=self.user, text=f'Ещё пост {i}',
+        ) for i in range(PAGI_INDEX_PER_PAGE * 10))
+        # bulk_create идёт мимо сигналов: счётчики строит команда
+        call_command('rebuild_post_counters', stdout=StringIO())
+        cache.clear()
+        response = self.client.get(reverse('posts:index'), {'page': 6})
+        page = response.context['page_obj']
+        ellipsis = page.paginator.ELLIPSIS
+        self.assertEqual(
+            page.elided_page_range, [1, ellipsis, 4, 5, 6, 7, 8, ellipsis, 12],
+        )
+        self.assertContains(response, '?page=12"', count=2)
+        self.assertNotContains(response, '?page=10"')
+
+        with CaptureQueriesContext(connection) as context:
+            self.client.get(reverse('posts:index'), {'page': 7})
+        self.assertFalse([
+            query for query in context.captured_queries
+            if 'COUNT(' in query['sql']
+        ])
+
     def test_index_page_cache(self):
         """Тестируем кеш главной страницы."""
 
+        cache.clear()
         response_one = self.authorized_client.get(reverse('posts:index'))
+        Post.objects.update(text='Изменено в обход сигналов')
+
+        response_two = self.authorized_client.get(reverse('posts:index'))
+        self.assertEqual(response_one.content, response_two.content)
+
         Post.objects.create(
             text='Тестовый текст',
             author=self.user,
         )
 
-        response_two = self.authorized_client.get(reverse('posts:index'))
-        self.assertEqual(len(response_one.content), len(response_two.content))
+        response_third = self.authorized_client.get(reverse('posts:index'))
+        self.assertNotEqual(response_third.content, response_one.content)
+
+    def test_index_page_cache_is_shared_and_keyed_by_page(self):
+        """
+        Тестируем, что кеш главной общий для всех читателей
+        и не отдаёт одну страницу вместо другой.
+        """
 
         cache.clear()
+        first_page = Client().get(reverse('posts:index'))
+        Post.objects.update(text='Изменено в обход сигналов')
 
-        response_third = self.authorized_client.get(reverse('posts:index'))
-        self.assertNotEqual(
-            len(response_third.content),
-            len(response_one.content)
+        self.assertContains(
+            self.authorized_client.get(reverse('posts:index')),
+            'Тестовый пост № 12',
+        )
+        self.assertNotContains(
+            self.authorized_client.get(reverse('posts:index') + '?page=2'),
+            'Тестовый пост № 12',
         )
+        self.assertContains(first_page, 'Тестовый пост № 12')
+
+
+class TestFragmentCache(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.calls = 0
+
+    def recompute(self):
+        self.calls += 1
+        return f'фрагмент {self.calls}'
+
+    def test_fresh_value_is_not_recomputed(self):
+        """Тестируем, что свежий фрагмент берётся из кеша."""
+
+        get_or_recompute('fragment', self.recompute, 60)
+        value = get_or_recompute('fragment', self.recompute, 60)
+
+        self.assertEqual(value, 'фрагмент 1')
+        self.assertEqual(fragment_cache_stats()['recomputes'], 1)
+
+    def test_stale_value_served_while_locked(self):
+        """
+        Тестируем, что пока один запрос пересчитывает истёкший фрагмент,
+        остальные получают устаревший, а не пересчитывают его сами.
+        """
+
+        cache.set('fragment', ('старый', 0.1, 0), 60)
+        cache.add('fragment:lock', 1)
+
+        value = get_or_recompute('fragment', self.recompute, 60)
+        self.assertEqual(value, 'старый')
+        self.assertEqual(self.calls, 0)
+        self.assertEqual(fragment_cache_stats()['prevented'], 1)
+
+        cache.delete('fragment:lock')
+        value = get_or_recompute('fragment', self.recompute, 60)
+        self.assertEqual(value, 'фрагмент 1')
+        self.assertFalse(cache.has_key('fragment:lock'))
+
+    def test_early_recompute(self):
+        """Тестируем досрочный пересчёт незадолго до истечения срока."""
+
+        # Считался 10 секунд, до истечения осталось 5
+        cache.set('fragment', ('старый', 10.0, time.time() + 5), 60)
+        with mock.patch('posts.cache.random.random', return_value=0.9):
+            value = get_or_recompute('fragment', self.recompute, 60)
+
+        self.assertEqual(value, 'фрагмент 1')
+        self.assertEqual(fragment_cache_stats()['early'], 1)
 
 
 class TestFollow(TestCase):
@@ -400,6 +591,7 @@ class TestFollow(TestCase):
         )
 
     def setUp(self):
+        cache.clear()
         self.authorized_client = Client()
         self.authorized_client.force_login(TestFollow.user_one)
         self.third_client = Client()
@@ -473,3 +665,1043 @@ class TestFollow(TestCase):
             author=self.user_third,
         ).exists())
         self.assertEqual(Follow.objects.count(), follows_count - 1)
+
+    def test_follow_fills_and_unfollow_clears_timeline(self):
+        """
+        Тестируем, что подписка и новые посты попадают в ленту,
+        а отписка её очищает.
+        """
+
+        Follow.objects.create(user=self.user_one, author=self.user_two)
+        new_post = Post.objects.create(
+            text='Новый тестовый пост',
+            author=self.user_two,
+        )
+        self.assertEqual(
+            set(TimelineEntry.objects.filter(
+                user=self.user_one,
+            ).values_list('post_id', flat=True)),
+            {self.post.id, new_post.id},
+        )
+
+        self.authorized_client.get(
+            reverse('posts:profile_unfollow',
+                    kwargs={'username': self.user_two.username})
+        )
+        self.assertFalse(
+            TimelineEntry.objects.filter(user=self.user_one).exists()
+        )
+
+    @mock.patch('posts.timeline.TIMELINE_FANOUT_LIMIT', 0)
+    def test_popular_author_posts_are_pulled_on_read(self):
+        """
+        Тестируем, что посты популярного автора не раскладываются
+        по лентам, но показываются в ленте подписок.
+        """
+
+        Follow.objects.create(user=self.user_one, author=self.user_two)
+        Post.objects.create(
+            text='Новый тестовый пост',
+            author=self.user_two,
+        )
+        self.assertFalse(
+            TimelineEntry.objects.filter(user=self.user_one).exists()
+        )
+
+        response = self.authorized_client.get(reverse('posts:follow'))
+        self.assertEqual(len(response.context.get('page_obj').object_list), 2)
+
+    def test_follow_feed_merges_timeline_and_pulled_posts(self):
+        """
+        Тестируем, что лента подписок сливает материализованную ленту
+        с постами популярного автора в одном порядке и при переходах
+        курсором вперёд и назад, и постранично.
+        """
+
+        Follow.objects.create(user=self.user_one, author=self.user_two)
+        Follow.objects.create(user=self.user_one, author=self.user_third)
+        cache.set(TIMELINE_PULL_AUTHORS_KEY, {self.user_third.pk})
+        for number in range(INDEX_PER_PAGE_LIMIT + 3):
+            Post.objects.create(
+                text=f'Пост {number}',
+                author=(self.user_two, self.user_third)[number % 2],
+            )
+        self.assertFalse(TimelineEntry.objects.filter(
+            user=self.user_one, author=self.user_third,
+        ).exists())
+        expected = list(Post.objects.filter(
+            author__in=(self.user_two, self.user_third),
+        ).order_by('-created', '-pk'))
+        url = reverse('posts:follow')
+
+        first_page = self.authorized_client.get(url).context['page_obj']
+        second_page = self.authorized_client.get(
+            url, {'cursor': first_page.paginator.next_cursor},
+        ).context['page_obj']
+        self.assertEqual([*first_page, *second_page], expected)
+        self.assertFalse(second_page.has_next())
+
+        previous_page = self.authorized_client.get(
+            url, {'cursor': second_page.paginator.previous_cursor},
+        ).context['page_obj']
+        self.assertEqual(list(previous_page), list(first_page))
+        self.assertFalse(previous_page.has_previous())
+
+        page = self.authorized_client.get(url, {'page': 2}).context[
+            'page_obj']
+        self.assertEqual(list(page), expected[INDEX_PER_PAGE_LIMIT:])
+        self.assertEqual(page.paginator.count, len(expected))
+
+    def test_follow_feed_is_purged_only_by_own_timeline(self):
+        """
+        Тестируем, что закешированную ленту подписок сбрасывают
+        посты её авторов и удаление поста из неё, но не чужие посты.
+        """
+
+        Follow.objects.create(user=self.user_one, author=self.user_two)
+        url = reverse('posts:follow')
+        self.authorized_client.get(url)
+
+        Post.objects.create(text='Чужой пост', author=self.user_third)
+        self.authorized_client.get(url)
+        self.assertEqual(page_cache_stats(), {'hits': 1, 'misses': 1})
+
+        new_post = Post.objects.create(
+            text='Новый тестовый пост', author=self.user_two,
+        )
+        response = self.authorized_client.get(url)
+        self.assertIn(new_post, response.context['page_obj'].object_list)
+
+        new_post.delete()
+        response = self.authorized_client.get(url)
+        self.assertEqual(
+            list(response.context['page_obj'].object_list), [self.post],
+        )
+        self.assertEqual(page_cache_stats(), {'hits': 1, 'misses': 3})
+
+    @mock.patch('posts.timeline.TIMELINE_FANOUT_LIMIT', 0)
+    def test_cached_follow_feed_shows_pulled_posts(self):
+        """
+        Тестируем, что новый пост популярного автора, который
+        не раскладывается по лентам, виден в закешированной ленте.
+        """
+
+        Follow.objects.create(user=self.user_one, author=self.user_two)
+        url = reverse('posts:follow')
+        self.authorized_client.get(url)
+
+        new_post = Post.objects.create(
+            text='Новый тестовый пост', author=self.user_two,
+        )
+        response = self.authorized_client.get(url)
+        self.assertIn(new_post, response.context['page_obj'].object_list)
+
+    @mock.patch('posts.timeline.TIMELINE_LENGTH', 1)
+    def test_fan_out_trims_timelines_in_one_query(self):
+        """
+        Тестируем, что новый пост обрезает ленты всех подписчиков
+        одним DELETE, оставляя TIMELINE_LENGTH последних записей.
+        """
+
+        for user in (self.user_one, self.user_third):
+            Follow.objects.create(user=user, author=self.user_two)
+        with CaptureQueriesContext(connection) as context:
+            new_post = Post.objects.create(
+                text='Новый тестовый пост',
+                author=self.user_two,
+            )
+        self.assertEqual(len([
+            query for query in context.captured_queries
+            if query['sql'].startswith('DELETE FROM "posts_timelineentry"')
+        ]), 1)
+        for user in (self.user_one, self.user_third):
+            with self.subTest(user=user.username):
+                self.assertEqual(
+                    list(TimelineEntry.objects.filter(
+                        user=user,
+                    ).values_list('post_id', flat=True)),
+                    [new_post.pk],
+                )
+
+    @mock.patch('posts.timeline.TIMELINE_FANOUT_LIMIT', 1)
+    def test_author_leaving_pull_mode_backfills_timelines(self):
+        """
+        Тестируем, что посты, написанные, пока автора читали напрямую,
+        остаются в ленте после того, как подписчиков стало меньше.
+        """
+
+        Follow.objects.create(user=self.user_one, author=self.user_two)
+        follow = Follow.objects.create(
+            user=self.user_third, author=self.user_two,
+        )
+        new_post = Post.objects.create(
+            text='Новый тестовый пост',
+            author=self.user_two,
+        )
+        self.assertFalse(
+            TimelineEntry.objects.filter(post=new_post).exists()
+        )
+
+        follow.delete()
+        response = self.authorized_client.get(reverse('posts:follow'))
+        self.assertIn(new_post, response.context['page_obj'].object_list)
+        self.assertTrue(TimelineEntry.objects.filter(
+            user=self.user_one, post=new_post,
+        ).exists())
+
+
+class TestFeedIdCache(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='test_user')
+        cls.staff = User.objects.create_user(
+            username='staff', is_staff=True,
+        )
+        cls.group = Group.objects.create(
+            title='Тестовая группа',
+            slug='test_slug',
+            description='Тестовое описание',
+        )
+        cls.group_two = Group.objects.create(
+            title='Тестовая группа 2',
+            slug='test_slug_two',
+            description='Тестовое описание 2',
+        )
+
+    def setUp(self):
+        cache.clear()
+        self.authorized_client = Client()
+        self.authorized_client.force_login(self.user)
+        self.group_url = reverse(
+            'posts:group_list', kwargs={'slug': self.group.slug})
+        self.profile_url = reverse(
+            'posts:profile', kwargs={'username': self.user.username})
+
+    def test_feed_pages_are_cached_as_id_lists(self):
+        """
+        Тестируем, что повторный запрос ленты берёт список id
+        и карточки из кеша, в том числе для авторизованного.
+        """
+
+        Post.objects.create(
+            author=self.user, group=self.group, text='Тестовый пост',
+        )
+        for client in (self.client, self.authorized_client):
+            for url in (self.group_url, self.profile_url):
+                with self.subTest(url=url):
+                    client.get(url)
+                    with CaptureQueriesContext(connection) as context:
+                        response = client.get(url)
+                    self.assertContains(response, 'Тестовый пост')
+                    self.assertFalse([
+                        query for query in context.captured_queries
+                        if 'FROM "posts_post"' in query['sql']
+                    ])
+
+    def test_cached_page_keeps_paginator_state(self):
+        """
+        Тестируем, что страница из кеша списков id совпадает
+        с посчитанной: и по номеру, и по курсору.
+        """
+
+        Post.objects.bulk_create(Post(
+            author=self.user, group=self.group, text=f'Тестовый пост {i}',
+        ) for i in range(PAGI_INDEX_PER_PAGE + 3))
+        cursor = self.client.get(
+            self.group_url
+        ).context['page_obj'].paginator.next_cursor
+        for params in ({'page': 2}, {'cursor': cursor}):
+            with self.subTest(params=params):
+                computed = self.client.get(self.group_url, params)
+                cached = self.client.get(self.group_url, params)
+                self.assertEqual(cached.content, computed.content)
+                self.assertEqual(
+                    list(cached.context['page_obj']),
+                    list(computed.context['page_obj']),
+                )
+        self.assertEqual(page_cache_stats(), {'hits': 2, 'misses': 3})
+
+    def test_edit_invalidates_only_post_card(self):
+        """
+        Тестируем, что правка поста сбрасывает его карточку,
+        а не список id страницы.
+        """
+
+        post = Post.objects.create(
+            author=self.user, group=self.group, text='Тестовый пост',
+        )
+        self.client.get(self.group_url)
+        self.authorized_client.post(
+            reverse('posts:post_edit', kwargs={'post_id': post.id}),
+            data={'text': 'Исправленный пост', 'group': self.group.id},
+        )
+
+        response = self.client.get(self.group_url)
+        self.assertContains(response, 'Исправленный пост')
+        self.assertEqual(page_cache_stats(), {'hits': 1, 'misses': 1})
+
+    def test_post_cards_are_rendered_once(self):
+        """
+        Тестируем, что карточка поста рендерится один раз
+        и перерендеривается после правки поста.
+        """
+
+        post = Post.objects.create(
+            author=self.user, group=self.group, text='Тестовый пост',
+        )
+        card = 'posts/includes/post_list.html'
+        self.assertTemplateUsed(self.client.get(self.profile_url), card)
+        response = self.client.get(self.profile_url)
+        self.assertTemplateNotUsed(response, card)
+        self.assertContains(response, self.group_url)
+        # На странице группы карточка без ссылки на группу - своя запись
+        self.assertTemplateUsed(self.client.get(self.group_url), card)
+
+        self.authorized_client.post(
+            reverse('posts:post_edit', kwargs={'post_id': post.id}),
+            data={'text': 'Исправленный пост', 'group': self.group.id},
+        )
+        response = self.client.get(self.profile_url)
+        self.assertTemplateUsed(response, card)
+        self.assertContains(response, 'Исправленный пост')
+
+    def test_update_fields_save_refreshes_card(self):
+        """
+        Тестируем, что сохранение с update_fields двигает updated
+        и лента показывает новую карточку, а не старую из кеша.
+        """
+
+        post = Post.objects.create(
+            author=self.user, group=self.group, text='Тестовый пост',
+        )
+        updated = post.updated
+        self.client.get(self.profile_url)
+
+        post.text = 'Исправленный пост'
+        post.save(update_fields=['text'])
+        post.refresh_from_db()
+        self.assertGreater(post.updated, updated)
+
+        response = self.client.get(self.profile_url)
+        self.assertContains(response, 'Исправленный пост')
+        self.assertNotContains(response, 'Тестовый пост')
+
+    def test_new_post_purges_only_its_pages(self):
+        """
+        Тестируем, что новый пост сбрасывает списки своей группы
+        и автора, но не чужой группы.
+        """
+
+        other_group_url = reverse(
+            'posts:group_list', kwargs={'slug': self.group_two.slug})
+        for url in (self.group_url, self.profile_url, other_group_url):
+            self.client.get(url)
+
+        self.authorized_client.post(
+            reverse('posts:post_create'),
+            data={'text': 'Свежий пост', 'group': self.group.id},
+        )
+
+        for url in (self.group_url, self.profile_url):
+            with self.subTest(url=url):
+                self.assertContains(self.client.get(url), 'Свежий пост')
+        self.assertEqual(page_cache_stats(), {'hits': 0, 'misses': 5})
+        self.client.get(other_group_url)
+        self.assertEqual(page_cache_stats(), {'hits': 1, 'misses': 5})
+
+    def test_user_rename_refreshes_cached_cards(self):
+        """Тестируем, что новое имя автора видно в закешированной ленте."""
+
+        Post.objects.create(
+            author=self.user, group=self.group, text='Тестовый пост',
+        )
+        self.client.get(self.group_url)
+        self.user.first_name = 'Пётр'
+        self.user.save()
+
+        self.assertContains(self.client.get(self.group_url), 'Пётр')
+        self.assertEqual(page_cache_stats(), {'hits': 1, 'misses': 1})
+
+    def test_edit_purges_old_and_new_group(self):
+        """Тестируем, что перенос поста сбрасывает обе группы."""
+
+        post = Post.objects.create(
+            author=self.user, group=self.group, text='Тестовый пост',
+        )
+        other_group_url = reverse(
+            'posts:group_list', kwargs={'slug': self.group_two.slug})
+        self.client.get(self.group_url)
+        self.client.get(other_group_url)
+
+        self.authorized_client.post(
+            reverse('posts:post_edit', kwargs={'post_id': post.id}),
+            data={'text': 'Тестовый пост', 'group': self.group_two.id},
+        )
+
+        self.assertNotContains(self.client.get(self.group_url), post.text)
+        self.assertContains(self.client.get(other_group_url), post.text)
+
+    def test_cache_stats_for_staff_only(self):
+        """Тестируем счётчики кеша и доступ к ним только для staff."""
+
+        self.client.get(self.group_url)
+        self.client.get(self.group_url)
+        url = reverse('posts:cache_stats')
+
+        self.assertEqual(
+            self.authorized_client.get(url).status_code, 302)
+
+        staff_client = Client()
+        staff_client.force_login(self.staff)
+        self.assertEqual(
+            staff_client.get(url).json(), {'hits': 1, 'misses': 1})
+
+
+class TestFeedQueryCount(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(
+            username='test_user', first_name='Иван', last_name='Иванов',
+        )
+        cls.reader = User.objects.create_user(username='reader')
+        cls.group = Group.objects.create(
+            title='Тестовая группа',
+            slug='test_slug',
+            description='Тестовое описание',
+        )
+        Follow.objects.create(user=cls.reader, author=cls.user)
+        for i in range(PAGI_INDEX_PER_PAGE + 2):
+            Post.objects.create(
+                author=cls.user, group=cls.group, text=f'Тестовый пост {i}',
+            )
+        rebuild_user_stats([cls.user.pk])
+
+    def setUp(self):
+        cache.clear()
+        self.reader_client = Client()
+        self.reader_client.force_login(self.reader)
+
+    def test_feeds_run_fixed_number_of_queries(self):
+        """
+        Тестируем, что число запросов ленты не зависит
+        от количества постов на странице.
+        """
+
+        pages_queries = {
+            reverse('posts:index'): 1,
+            reverse('posts:group_list', kwargs={'slug': self.group.slug}): 2,
+            reverse('posts:profile',
+                    kwargs={'username': self.user.username}): 3,
+        }
+        for url, queries in pages_queries.items():
+            with self.subTest(url=url):
+                with self.assertNumQueries(queries):
+                    self.client.get(url)
+
+        # сессия, пользователь, популярные авторы, диапазон ленты,
+        # посты страницы по id
+        with self.assertNumQueries(5):
+            self.reader_client.get(reverse('posts:follow'))
+
+
+class TestCommentsPagination(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='test_user')
+        cls.post = Post.objects.create(author=cls.user, text='Тестовый пост')
+        Comment.objects.bulk_create(
+            [Comment(
+                author=cls.user,
+                post=cls.post,
+                text=f'Тестовый коммент {i}',
+            ) for i in range(COMMENTS_PER_PAGE_LIMIT + 5)]
+        )
+        rebuild_user_stats([cls.user.pk])
+
+    def test_post_detail_shows_first_comments_page(self):
+        """
+        Тестируем, что post_detail отдаёт одну страницу комментариев
+        за постоянное число запросов.
+        """
+
+        url = reverse('posts:post_detail', kwargs={'post_id': self.post.id})
+        # автор поста для тегов, пост с автором, счётчики автора,
+        # комментарии с авторами
+        with self.assertNumQueries(4):
+            response = self.client.get(url)
+        comments = response.context['comments']
+        self.assertEqual(len(comments), COMMENTS_PER_PAGE_LIMIT)
+        self.assertContains(
+            response,
+            reverse('posts:post_comments', kwargs={'post_id': self.post.id}),
+        )
+
+    def test_load_more_fragment_returns_next_comments(self):
+        """Тестируем, что фрагмент «Показать ещё» отдаёт остальные."""
+
+        first_page = self.client.get(
+            reverse('posts:post_detail', kwargs={'post_id': self.post.id})
+        ).context['comments']
+        response = self.client.get(
+            reverse('posts:post_comments', kwargs={'post_id': self.post.id}),
+            {'cursor': first_page.paginator.next_cursor},
+        )
+        self.assertTemplateUsed(response, 'posts/includes/comments.html')
+        self.assertTemplateNotUsed(response, 'base.html')
+        self.assertEqual(len(response.context['comments']), 5)
+        self.assertTrue(
+            set(first_page).isdisjoint(set(response.context['comments']))
+        )
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+class TestThumbnailPipeline(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='test_user')
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        cache.clear()
+        self.authorized_client = Client()
+        self.authorized_client.force_login(self.user)
+
+    def test_new_image_is_queued_and_built_by_worker(self):
+        """
+        Тестируем, что картинка нового поста встаёт в очередь,
+        а после воркера лента отдаёт готовое превью.
+        """
+
+        uploaded = SimpleUploadedFile(
+            name='thumb.gif', content=SMALL_GIF, content_type='image/gif',
+        )
+        self.authorized_client.post(
+            reverse('posts:post_create'),
+            data={'text': 'Пост с картинкой', 'image': uploaded},
+        )
+        post = Post.objects.get(text='Пост с картинкой')
+        self.assertTrue(
+            ThumbnailTask.objects.filter(image=post.image.name).exists()
+        )
+        response = self.client.get(reverse('posts:index'))
+        self.assertContains(response, post.image.url)
+
+        call_command(
+            'run_thumbnail_worker', workers=0, once=True, stdout=StringIO(),
+        )
+        self.assertFalse(ThumbnailTask.objects.exists())
+
+        cache.clear()
+        response = self.client.get(reverse('posts:index'))
+        self.assertNotContains(response, post.image.url)
+        self.assertContains(response, settings.MEDIA_URL + 'cache/')
+
+    def test_templates_use_worker_geometries(self):
+        """
+        Тестируем, что шаблон ищет превью в том размере,
+        который строит воркер по THUMBNAIL_GEOMETRIES.
+        """
+
+        geometries = (('120x80', {'crop': 'center'}),)
+        post = Post.objects.create(
+            author=self.user,
+            text='Пост с картинкой',
+            image=SimpleUploadedFile(
+                name='geometry.gif', content=SMALL_GIF,
+                content_type='image/gif',
+            ),
+        )
+        with mock.patch('posts.thumbnails.THUMBNAIL_GEOMETRIES', geometries), \
+                mock.patch('posts.thumbnail_worker.THUMBNAIL_GEOMETRIES',
+                           geometries):
+            call_command(
+                'run_thumbnail_worker', workers=0, once=True,
+                stdout=StringIO(),
+            )
+            response = self.client.get(reverse('posts:index'))
+
+        self.assertNotContains(response, post.image.url)
+        self.assertContains(response, 'width="120" height="80"')
+
+    def test_workers_claim_tasks_exclusively(self):
+        """
+        Тестируем, что задачу берёт один воркер, повторная постановка
+        в очередь во время работы не теряется, а задачи упавшего
+        воркера освобождаются по таймауту.
+        """
+
+        enqueue_thumbnails('posts/a.gif', 'posts/b.gif')
+        first_claim, first_tasks = claim_thumbnail_tasks(1)
+        second_claim, second_tasks = claim_thumbnail_tasks(10)
+        self.assertEqual([image for _, image in first_tasks], ['posts/a.gif'])
+        self.assertEqual([image for _, image in second_tasks], ['posts/b.gif'])
+        self.assertEqual(claim_thumbnail_tasks(10)[1], [])
+
+        enqueue_thumbnails('posts/a.gif')
+        finish_thumbnail_tasks(first_claim)
+        self.assertTrue(
+            ThumbnailTask.objects.filter(image='posts/a.gif').exists()
+        )
+
+        ThumbnailTask.objects.filter(claim=second_claim).update(
+            claimed_at=timezone.now() - timedelta(
+                seconds=THUMBNAIL_CLAIM_TIMEOUT + 1,
+            ),
+        )
+        self.assertEqual(
+            sorted(image for _, image in claim_thumbnail_tasks(10)[1]),
+            ['posts/a.gif', 'posts/b.gif'],
+        )
+        finish_thumbnail_tasks(second_claim)
+        self.assertEqual(ThumbnailTask.objects.count(), 2)
+
+    def test_backfill_queues_existing_images(self):
+        """Тестируем, что backfill_thumbnails ставит картинки в очередь."""
+
+        Post.objects.bulk_create([
+            Post(author=self.user, text='С картинкой', image='posts/a.gif'),
+            Post(author=self.user, text='Без картинки'),
+        ])
+        call_command('backfill_thumbnails', stdout=StringIO())
+        self.assertEqual(
+            list(ThumbnailTask.objects.values_list('image', flat=True)),
+            ['posts/a.gif'],
+        )
+
+
+class TestConditionalGet(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='test_user')
+        cls.reader = User.objects.create_user(username='reader')
+        cls.group = Group.objects.create(
+            title='Тестовая группа',
+            slug='test_slug',
+            description='Тестовое описание',
+        )
+
+    def setUp(self):
+        cache.clear()
+        self.post = Post.objects.create(
+            author=self.user, group=self.group, text='Тестовый пост',
+        )
+        self.authorized_client = Client()
+        self.authorized_client.force_login(self.reader)
+        self.urls = (
+            reverse('posts:index'),
+            reverse('posts:group_list', kwargs={'slug': self.group.slug}),
+            reverse('posts:profile', kwargs={'username': self.user.username}),
+            reverse('posts:post_detail', kwargs={'post_id': self.post.pk}),
+        )
+
+    def test_unchanged_page_is_not_modified(self):
+        """
+        Тестируем, что страница с прежним ETag отдаётся как 304
+        без запросов к постам и без рендера.
+        """
+
+        for client in (self.client, self.authorized_client):
+            for url in self.urls:
+                with self.subTest(url=url):
+                    etag = client.get(url)['ETag']
+                    with CaptureQueriesContext(connection) as context:
+                        response = client.get(url, HTTP_IF_NONE_MATCH=etag)
+                    self.assertEqual(response.status_code, 304)
+                    self.assertEqual(response.content, b'')
+                    # странице поста нужен сам пост
+                    self.assertLessEqual(len([
+                        query for query in context.captured_queries
+                        if 'FROM "posts_post"' in query['sql']
+                    ]), 1 if url == self.urls[3] else 0)
+
+    def test_new_csrf_token_changes_personal_etag(self):
+        """
+        Тестируем, что после смены CSRF-токена (как при новом входе)
+        личная страница с формой не отдаётся как 304 со старым токеном.
+        """
+
+        url = self.urls[3]
+        etag = self.authorized_client.get(url)['ETag']
+        self.assertEqual(
+            self.authorized_client.get(
+                url, HTTP_IF_NONE_MATCH=etag,
+            ).status_code,
+            304,
+        )
+
+        del self.authorized_client.cookies[settings.CSRF_COOKIE_NAME]
+        self.authorized_client.force_login(self.reader)
+        response = self.authorized_client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+
+    def test_last_modified_only_for_anonymous(self):
+        """Тестируем, что Last-Modified получают только анонимы."""
+
+        url = self.urls[0]
+        response = self.client.get(url)
+        self.assertIn('Cookie', response['Vary'])
+        self.assertEqual(
+            self.client.get(
+                url, HTTP_IF_MODIFIED_SINCE=response['Last-Modified'],
+            ).status_code,
+            304,
+        )
+        authorized = self.authorized_client.get(url)
+        self.assertFalse(authorized.has_header('Last-Modified'))
+        self.assertNotEqual(authorized['ETag'], response['ETag'])
+
+    def test_changes_update_etag(self):
+        """
+        Тестируем, что новый пост, правка, комментарий и подписка
+        меняют ETag затронутых страниц.
+        """
+
+        changes = (
+            ('новый пост', lambda: Post.objects.create(
+                author=self.user, group=self.group, text='Ещё пост',
+            ), self.urls),
+            ('правка', lambda: Post.objects.filter(pk=self.post.pk).first(
+            ).save(), self.urls),
+            ('комментарий', lambda: Comment.objects.create(
+                post=self.post, author=self.reader, text='Комментарий',
+            ), self.urls[3:]),
+            ('подписка', lambda: Follow.objects.create(
+                user=self.reader, author=self.user,
+            ), self.urls[2:]),
+        )
+        for name, change, urls in changes:
+            etags = {url: self.client.get(url)['ETag'] for url in urls}
+            change()
+            for url in urls:
+                with self.subTest(change=name, url=url):
+                    response = self.client.get(
+                        url, HTTP_IF_NONE_MATCH=etags[url],
+                    )
+                    self.assertEqual(response.status_code, 200)
+
+    def test_missing_post_is_not_found(self):
+        """Тестируем, что для несуществующего поста отдаётся 404."""
+
+        response = self.client.get(
+            reverse('posts:post_detail', kwargs={'post_id': 0}),
+        )
+        self.assertEqual(response.status_code, 404)
+
+
+@override_settings(PERSONAL_FRAGMENTS='esi')
+class TestPersonalFragments(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='test_user')
+        cls.reader = User.objects.create_user(username='reader')
+        cls.group = Group.objects.create(
+            title='Тестовая группа',
+            slug='test_slug',
+            description='Тестовое описание',
+        )
+        cls.post = Post.objects.create(
+            author=cls.user, group=cls.group, text='Тестовый пост',
+        )
+
+    def setUp(self):
+        cache.clear()
+        self.authorized_client = Client()
+        self.authorized_client.force_login(self.reader)
+        self.urls = (
+            reverse('posts:index'),
+            reverse('posts:group_list', kwargs={'slug': self.group.slug}),
+            reverse('posts:profile', kwargs={'username': self.user.username}),
+            reverse('posts:post_detail', kwargs={'post_id': self.post.pk}),
+        )
+
+    def test_pages_are_public(self):
+        """
+        Тестируем, что общие страницы одинаковы для всех
+        и разрешены к кешированию обратным прокси.
+        """
+
+        for url in self.urls:
+            with self.subTest(url=url):
+                anonymous = self.client.get(url)
+                authorized = self.authorized_client.get(url)
+                self.assertEqual(authorized.content, anonymous.content)
+                self.assertEqual(authorized['ETag'], anonymous['ETag'])
+                self.assertIn('public', authorized['Cache-Control'])
+                self.assertNotIn('Cookie', authorized.get('Vary', ''))
+                self.assertContains(
+                    authorized, '<esi:include src="/fragments/user_nav/"/>',
+                )
+                self.assertNotContains(authorized, 'csrfmiddlewaretoken')
+
+    @override_settings(POST_COUNTS='counter')
+    def test_public_pages_do_not_write(self):
+        """
+        Тестируем, что общие страницы без строки статистики и со
+        старым счётчиком ничего не пишут и остаются public.
+        """
+
+        UserStats.objects.all().delete()
+        PostCounter.objects.update(
+            reconciled=timezone.now() - timedelta(days=1),
+        )
+        for url in self.urls:
+            with self.subTest(url=url):
+                with CaptureQueriesContext(connection) as queries:
+                    response = self.client.get(url)
+                writes = [
+                    query['sql'] for query in queries
+                    if not query['sql'].startswith('SELECT')
+                ]
+                self.assertEqual(writes, [])
+                self.assertIn('public', response['Cache-Control'])
+                self.assertFalse(response.cookies)
+
+    def test_fragments_are_personal(self):
+        """Тестируем, что фрагменты отдают разметку пользователя."""
+
+        fragments = (
+            ('user_nav', {}, 'Пользователь: reader'),
+            ('switcher', {}, 'Избранные авторы'),
+            ('follow_button', {'username': self.user.username},
+             'Подписаться'),
+            ('post_actions', {'post_id': self.post.pk}, 'csrfmiddlewaretoken'),
+        )
+        for name, params, text in fragments:
+            with self.subTest(name=name):
+                url = reverse('posts:fragment', kwargs={'name': name})
+                response = self.authorized_client.get(url, params)
+                self.assertContains(response, text)
+                self.assertIn('private', response['Cache-Control'])
+                self.assertNotContains(self.client.get(url, params), text)
+
+    def test_unknown_fragment_is_not_found(self):
+        """Тестируем 404 для неизвестного фрагмента и параметров."""
+
+        for name, params in (
+            ('sidebar', {}),
+            ('post_actions', {'post_id': 'x'}),
+            ('follow_button', {'username': 'nobody'}),
+        ):
+            with self.subTest(name=name):
+                response = self.client.get(
+                    reverse('posts:fragment', kwargs={'name': name}), params,
+                )
+                self.assertEqual(response.status_code, 404)
+
+    @override_settings(PERSONAL_FRAGMENTS='fetch')
+    def test_fetch_mode_uses_placeholders(self):
+        """Тестируем заглушки, которые подгружает скрипт страницы."""
+
+        response = self.authorized_client.get(self.urls[3])
+        self.assertContains(
+            response,
+            '<div data-fragment="/fragments/post_actions/?post_id='
+            f'{self.post.pk}"></div>',
+        )
+        self.assertContains(response, 'slot.dataset.fragment')
+
+
+class TestSearch(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(
+            username='writer', first_name='Лев', last_name='Толстой',
+        )
+        cls.group = Group.objects.create(
+            title='Классика',
+            slug='classic',
+            description='Тестовое описание',
+        )
+        cls.post = Post.objects.create(
+            author=cls.user,
+            text='Все счастливые семьи похожи друг на друга',
+            group=cls.group,
+        )
+
+    def search(self, query, **params):
+        return self.client.get(
+            reverse('posts:search'), {'q': query, **params},
+        )
+
+    def test_search_by_text_group_and_author(self):
+        """Тестируем поиск по тексту, названию группы и имени автора."""
+
+        for query in ('счастливые семьи', 'СЕМЬ', 'классика', 'толстой'):
+            with self.subTest(query=query):
+                response = self.search(query)
+                self.assertEqual(response.context['posts'], [self.post])
+
+        self.assertEqual(self.search('несчастная')
+                         .context['posts'], [])
+
+    def test_search_cursor(self):
+        """Тестируем, что курсор выдачи обходит все совпадения без дублей."""
+
+        Post.objects.bulk_create(Post(
+            author=self.user, text=f'Семьи {number}',
+        ) for number in range(12))
+        reindex_posts(Post.objects.values_list('pk', flat=True))
+
+        seen = []
+        response = self.search('семьи')
+        while True:
+            seen.extend(post.pk for post in response.context['posts'])
+            cursor = response.context['next_cursor']
+            if not cursor:
+                break
+            response = self.search('семьи', cursor=cursor)
+        self.assertEqual(sorted(seen), sorted(
+            Post.objects.values_list('pk', flat=True)
+        ))
+
+    def test_broken_search_cursor_shows_first_page(self):
+        """
+        Тестируем, что курсор с pk вне диапазона INTEGER или
+        нечисловым score открывает первую страницу выдачи.
+        """
+
+        for score, pk in (
+            (1.0, CURSOR_PK_MAX + 1), (math.nan, 1), (math.inf, 1),
+        ):
+            with self.subTest(score=score, pk=pk):
+                response = self.search(
+                    'семьи', cursor=encode_search_cursor(score, pk),
+                )
+                self.assertEqual(response.status_code, 200)
+                self.assertEqual(response.context['posts'], [self.post])
+
+    def test_index_follows_edit_and_delete(self):
+        """Тестируем, что правка и удаление поста обновляют индекс."""
+
+        post = Post.objects.get(pk=self.post.pk)
+        post.text = 'Каждая несчастливая семья несчастлива по-своему'
+        post.save()
+        self.assertEqual(self.search('похожи').context['posts'], [])
+        self.assertEqual(
+            self.search('несчастливая').context['posts'], [post]
+        )
+
+        post.delete()
+        self.assertEqual(self.search('несчастливая').context['posts'], [])
+
+    def test_inverted_index_fallback(self):
+        """Тестируем встроенный индекс на случай SQLite без FTS5."""
+
+        with mock.patch('posts.search.fts5_available', return_value=False):
+            call_command('rebuild_search_index', stdout=StringIO())
+            self.assertTrue(
+                PostSearchTerm.objects.filter(post=self.post).exists()
+            )
+            self.assertEqual(
+                self.search('классика семьи').context['posts'], [self.post]
+            )
+            self.assertEqual(self.search('классика анна')
+                             .context['posts'], [])
+
+    def test_both_indexes_match_prefixes(self):
+        """
+        Тестируем, что FTS5 и встроенный индекс одинаково
+        ищут по началу слов и требуют совпадения всех слов.
+        """
+
+        for fts5 in (True, False):
+            with self.subTest(fts5=fts5), mock.patch(
+                'posts.search.fts5_available', return_value=fts5,
+            ):
+                call_command('rebuild_search_index', stdout=StringIO())
+                self.assertEqual(
+                    self.search('счастлив толст').context['posts'],
+                    [self.post],
+                )
+                self.assertEqual(
+                    self.search('счастлив анна').context['posts'], [],
+                )
+
+    def test_profile_save_reindexes_only_on_rename(self):
+        """
+        Тестируем, что посты переиндексируются, только когда
+        у автора действительно поменялось имя.
+        """
+
+        user = User.objects.get(pk=self.user.pk)
+        with mock.patch('posts.signals.reindex_posts') as reindex:
+            user.email = 'leo@example.com'
+            user.save()
+            reindex.assert_not_called()
+
+        user.last_name = 'Толстой-Американец'
+        user.save()
+        self.assertEqual(
+            self.search('американец').context['posts'], [self.post]
+        )
+
+    def test_admin_uses_search_index(self):
+        """Тестируем, что поиск в админке идёт через индекс."""
+
+        admin = User.objects.create_superuser(
+            username='admin', email='admin@example.com', password='pass',
+        )
+        self.client.force_login(admin)
+        response = self.client.get(
+            reverse('admin:posts_post_changelist'), {'q': 'толстой'},
+        )
+        self.assertEqual(list(response.context['cl'].result_list),
+                         [self.post])
+
+
+class TestBenchmark(TestCase):
+    def test_bench_needs_own_database(self):
+        """Тестируем, что без отдельной базы тест не запускается."""
+
+        for command in ('seed_bench', 'run_bench'):
+            with self.subTest(command=command):
+                with self.assertRaises(CommandError):
+                    call_command(command, stdout=StringIO())
+
+    @override_settings(BENCH_DATABASE=True)
+    def test_seed_and_run_bench(self):
+        """
+        Тестируем, что seed_bench воспроизводимо строит данные,
+        а run_bench пишет отчёт по всем сценариям.
+        """
+
+        sizes = {
+            'users': 6, 'groups': 2, 'posts': 30, 'comments': 10,
+            'follows': 8,
+        }
+        call_command('seed_bench', stdout=StringIO(), **sizes)
+        texts = list(Post.objects.order_by('pk').values_list('text'))
+        call_command('seed_bench', stdout=StringIO(), **sizes)
+        self.assertEqual(
+            list(Post.objects.order_by('pk').values_list('text')), texts
+        )
+        self.assertEqual(Follow.objects.count(), sizes['follows'])
+        self.assertTrue(TimelineEntry.objects.exists())
+
+        with tempfile.NamedTemporaryFile(suffix='.json') as output:
+            call_command(
+                'run_bench', requests=2, warmup=0, output=output.name,
+                stdout=StringIO(), stderr=StringIO(),
+            )
+            report = json.load(output)
+
+        self.assertEqual(report['meta']['requests'], 2)
+        for name in ('index:anonymous', 'follow_index:user',
+                     'post_create:user', 'add_comment:user'):
+            with self.subTest(name=name):
+                result = report['scenarios'][name]
+                self.assertEqual(result['errors'], 0)
+                self.assertGreater(result['queries_per_request'], 0)
+                self.assertLessEqual(result['p50_ms'], result['p99_ms'])
@@ -0,0 +1,31 @@
+"""
+Точки входа процессов пула превью. Модуль импортируется в дочернем
+процессе до django.setup(), поэтому Django здесь подключается лениво.
+"""
+import logging
+
+from .constants import THUMBNAIL_GEOMETRIES
+
+logger = logging.getLogger(__name__)
+
+
+def init_worker():
+    """Инициализатор процесса пула: поднимает Django в дочернем процессе."""
+
+    import django
+
+    django.setup()
+
+
+def build_thumbnails(image_name):
+    """Строит превью картинки во всех размерах, что используют шаблоны."""
+
+    from sorl.thumbnail import get_thumbnail
+
+    for geometry, options in THUMBNAIL_GEOMETRIES:
+        try:
+            get_thumbnail(image_name, geometry, **options)
+        except Exception:
+            logger.exception('Не удалось построить превью %s', image_name)
+
+    return image_name
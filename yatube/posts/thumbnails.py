@@ -0,0 +1,111 @@
+import uuid
+from datetime import timedelta
+
+from django.db.models import Q
+from django.utils import timezone
+from sorl.thumbnail import default
+from sorl.thumbnail.base import ThumbnailBackend
+from sorl.thumbnail.conf import defaults as default_settings
+from sorl.thumbnail.conf import settings as sorl_settings
+from sorl.thumbnail.images import ImageFile
+
+from .constants import THUMBNAIL_CLAIM_TIMEOUT, THUMBNAIL_GEOMETRIES
+from .models import Post, ThumbnailTask
+
+
+class PrebuiltThumbnailBackend(ThumbnailBackend):
+    """
+    Ищет уже построенное превью в key-value хранилище sorl,
+    не открывая исходную картинку и ничего не генерируя.
+    """
+
+    def get_prebuilt(self, file_, geometry_string, **options):
+        source = ImageFile(file_)
+        if sorl_settings.THUMBNAIL_PRESERVE_FORMAT:
+            options.setdefault('format', self._get_format(source))
+        for key, value in self.default_options.items():
+            options.setdefault(key, value)
+        for key, attr in self.extra_options:
+            value = getattr(sorl_settings, attr)
+            if value != getattr(default_settings, attr):
+                options.setdefault(key, value)
+
+        name = self._get_thumbnail_filename(source, geometry_string, options)
+        return default.kvstore.get(ImageFile(name, default.storage))
+
+
+prebuilt_backend = PrebuiltThumbnailBackend()
+
+
+def card_thumbnail(image):
+    """
+    Готовое превью картинки для карточки поста или None. Размер
+    берётся из THUMBNAIL_GEOMETRIES - тот же, что строит воркер.
+    """
+
+    if not image:
+        return None
+
+    geometry, options = THUMBNAIL_GEOMETRIES[0]
+    return prebuilt_backend.get_prebuilt(image, geometry, **options)
+
+
+def enqueue_thumbnails(*image_names):
+    """Ставит картинки в очередь на построение превью."""
+
+    image_names = [name for name in image_names if name]
+    ThumbnailTask.objects.bulk_create(
+        [ThumbnailTask(image=name) for name in image_names],
+        ignore_conflicts=True,
+    )
+    # Задачу уже строят: снимаем метку, чтобы воркер не удалил её
+    # вместе с пачкой и картинку построили ещё раз
+    ThumbnailTask.objects.filter(image__in=image_names).exclude(
+        claim='',
+    ).update(claim='', claimed_at=None)
+
+
+def claim_thumbnail_tasks(limit):
+    """
+    Забирает до limit свободных задач одним UPDATE и возвращает
+    метку и список (pk, image). Задачи упавшего воркера снова
+    становятся свободными через THUMBNAIL_CLAIM_TIMEOUT.
+    """
+
+    claim = uuid.uuid4().hex
+    now = timezone.now()
+    free = Q(claim='') | Q(
+        claimed_at__lt=now - timedelta(seconds=THUMBNAIL_CLAIM_TIMEOUT),
+    )
+    ThumbnailTask.objects.filter(free, pk__in=ThumbnailTask.objects.filter(
+        free,
+    ).values('pk')[:limit]).update(claim=claim, claimed_at=now)
+
+    return claim, list(ThumbnailTask.objects.filter(
+        claim=claim,
+    ).values_list('pk', 'image'))
+
+
+def finish_thumbnail_tasks(claim):
+    """Удаляет выполненные задачи, которые всё ещё помечены claim."""
+
+    ThumbnailTask.objects.filter(claim=claim).delete()
+
+
+def enqueue_all_posts(batch_size):
+    """Ставит в очередь картинки всех постов, возвращает их число."""
+
+    images = Post.objects.exclude(image='').order_by('pk').values_list(
+        'image', flat=True,
+    ).iterator(chunk_size=batch_size)
+    total = 0
+    batch = []
+    for image in images:
+        batch.append(image)
+        if len(batch) == batch_size:
+            enqueue_thumbnails(*batch)
+            total += len(batch)
+            batch = []
+    enqueue_thumbnails(*batch)
+
+    return total + len(batch)
@@ -0,0 +1,265 @@
+import heapq
+
+from django.core.cache import cache
+from django.db import connection
+from django.db.models import Count, Q
+
+from .cache import author_tag, purge_tags, timeline_tag
+from .constants import (TIMELINE_BACKFILL_BATCH_SIZE, TIMELINE_FANOUT_LIMIT,
+                        TIMELINE_LENGTH, TIMELINE_PULL_AUTHORS_KEY,
+                        TIMELINE_PULL_AUTHORS_TIMING)
+from .feeds import hydrate_posts
+from .models import Follow, Post, TimelineEntry
+
+
+def get_pull_authors():
+    """
+    Множество авторов, у которых подписчиков больше TIMELINE_FANOUT_LIMIT.
+    Их посты не раскладываются по лентам, а подтягиваются при чтении.
+    """
+
+    authors = cache.get(TIMELINE_PULL_AUTHORS_KEY)
+    if authors is None:
+        authors = set(
+            Follow.objects.values('author').annotate(
+                followers=Count('pk'),
+            ).filter(
+                followers__gt=TIMELINE_FANOUT_LIMIT,
+            ).values_list('author', flat=True)
+        )
+        cache.set(
+            TIMELINE_PULL_AUTHORS_KEY, authors, TIMELINE_PULL_AUTHORS_TIMING
+        )
+
+    return authors
+
+
+def purge_timelines(user_ids):
+    """Сбрасывает закешированные ленты подписок пользователей."""
+
+    purge_tags(*(timeline_tag(user_id) for user_id in user_ids))
+
+
+def timeline_tags(user):
+    """
+    Теги кеша ленты подписок: собственная лента пользователя
+    и профили популярных авторов, чьи посты читаются напрямую.
+    Чужие посты ленту не сбрасывают.
+    """
+
+    tags = [timeline_tag(user.pk)]
+    pull_authors = get_pull_authors()
+    if pull_authors:
+        # Подписок на популярных авторов единицы: порядок тегов
+        # задаётся в Python, а не сортировкой в SQL
+        tags.extend(
+            author_tag(username) for _, username in sorted(
+                Follow.objects.filter(
+                    user=user, author_id__in=pull_authors,
+                ).values_list('author_id', 'author__username')
+            )
+        )
+
+    return tags
+
+
+def timeline_readers(post_id):
+    """Пользователи, в чьих лентах лежит пост."""
+
+    return list(TimelineEntry.objects.filter(
+        post_id=post_id,
+    ).values_list('user_id', flat=True))
+
+
+def trim_timelines(user_ids):
+    """
+    Обрезает ленты пользователей до TIMELINE_LENGTH последних записей
+    одним DELETE: лишние записи находит оконная ROW_NUMBER().
+    """
+
+    user_ids = list(user_ids)
+    if not user_ids:
+        return
+    table = connection.ops.quote_name(TimelineEntry._meta.db_table)
+    placeholders = ', '.join(['%s'] * len(user_ids))
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'DELETE FROM {table} WHERE id IN ('
+            f'SELECT id FROM (SELECT id, ROW_NUMBER() OVER ('
+            f'PARTITION BY user_id ORDER BY created DESC, post_id DESC'
+            f') AS position FROM {table} WHERE user_id IN ({placeholders})'
+            f') AS ranked WHERE position > %s)',
+            [*user_ids, TIMELINE_LENGTH],
+        )
+
+
+def _push_posts(user_ids, posts):
+    """Раскладывает посты (pk, author_id, created) по лентам."""
+
+    TimelineEntry.objects.bulk_create(
+        (TimelineEntry(
+            user_id=user_id,
+            post_id=pk,
+            author_id=author_id,
+            created=created,
+        ) for user_id in user_ids for pk, author_id, created in posts),
+        batch_size=TIMELINE_BACKFILL_BATCH_SIZE,
+        ignore_conflicts=True,
+    )
+    trim_timelines(user_ids)
+    purge_timelines(user_ids)
+
+
+def fan_out_post(post):
+    """Раскладывает новый пост по лентам подписчиков автора."""
+
+    if post.author_id in get_pull_authors():
+        return
+
+    followers = list(Follow.objects.filter(
+        author_id=post.author_id,
+    ).values_list('user_id', flat=True)[:TIMELINE_FANOUT_LIMIT + 1])
+    if len(followers) > TIMELINE_FANOUT_LIMIT:
+        cache.delete(TIMELINE_PULL_AUTHORS_KEY)
+        return
+
+    _push_posts(followers, [(post.pk, post.author_id, post.created)])
+
+
+def _recent_posts(author_id):
+    return list(Post.objects.filter(
+        author_id=author_id,
+    ).values_list('pk', 'author_id', 'created')[:TIMELINE_LENGTH])
+
+
+def backfill_timeline(follow):
+    """Добавляет в ленту подписчика последние посты нового автора."""
+
+    if follow.author_id in get_pull_authors():
+        return
+
+    _push_posts([follow.user_id], _recent_posts(follow.author_id))
+
+
+def leave_pull_mode(author_id):
+    """
+    Вызывается после отписки: автор, у которого подписчиков стало
+    не больше TIMELINE_FANOUT_LIMIT, снова раскладывает посты
+    по лентам. Посты, написанные, пока его читали напрямую,
+    дописываются в ленты подписчиков, иначе они пропали бы
+    из ленты подписок.
+    """
+
+    followers = Follow.objects.filter(author_id=author_id)
+    # Подписчики уходят по одному: порог пересекается ровно тогда,
+    # когда их осталось TIMELINE_FANOUT_LIMIT
+    if followers.count() != TIMELINE_FANOUT_LIMIT:
+        return
+
+    _push_posts(
+        list(followers.values_list('user_id', flat=True)),
+        _recent_posts(author_id),
+    )
+    cache.delete(TIMELINE_PULL_AUTHORS_KEY)
+
+
+def drop_from_timeline(follow):
+    """Убирает из ленты подписчика посты автора, от которого он отписался."""
+
+    TimelineEntry.objects.filter(
+        user_id=follow.user_id,
+        author_id=follow.author_id,
+    ).delete()
+
+
+class TimelinePosts:
+    """
+    Посты ленты подписок для пагинаторов. Ключи (created, pk)
+    страницы читаются диапазоном индекса timeline_user_created_idx
+    материализованной ленты и индекса post_author_created_idx у каждого
+    популярного автора, чьи посты подтягиваются при чтении. Ключи
+    сливаются в Python, а сами посты страницы собираются по id.
+    """
+
+    ordered = True
+
+    def __init__(self, user, key=None, older=True):
+        self.user = user
+        self.key = key
+        self.older = older
+
+    def order_by(self, *ordering):
+        # Порядок ленты всегда (-created, -pk), как у CursorPaginator
+        return self
+
+    def older_than(self, created, pk):
+        return TimelinePosts(self.user, (created, pk))
+
+    def newer_than(self, created, pk):
+        return TimelinePosts(self.user, (created, pk), older=False)
+
+    def _pull_authors(self):
+        pull_authors = get_pull_authors()
+        if not pull_authors:
+            return []
+        return list(Follow.objects.filter(
+            user=self.user, author_id__in=pull_authors,
+        ).values_list('author_id', flat=True))
+
+    def _range(self, queryset, post_field, limit):
+        """До limit ключей (created, pk) после self.key в порядке чтения."""
+
+        order = '-' if self.older else ''
+        if self.key is not None:
+            created, pk = self.key
+            direction = 'lt' if self.older else 'gt'
+            queryset = queryset.filter(
+                Q(**{f'created__{direction}': created})
+                | Q(created=created, **{f'{post_field}__{direction}': pk})
+            )
+        return list(queryset.order_by(
+            f'{order}created', f'{order}{post_field}',
+        ).values_list('created', post_field)[:limit])
+
+    def keys(self, limit):
+        ranges = [self._range(
+            TimelineEntry.objects.filter(user=self.user), 'post_id', limit,
+        )]
+        ranges.extend(
+            self._range(Post.objects.filter(author_id=author_id), 'pk', limit)
+            for author_id in self._pull_authors()
+        )
+        keys = []
+        seen = set()
+        # Пост автора, ушедшего в режим чтения, может лежать и в ленте
+        for key in heapq.merge(*ranges, reverse=self.older):
+            if key[1] not in seen:
+                seen.add(key[1])
+                keys.append(key)
+            if len(keys) == limit:
+                break
+        return keys
+
+    def __getitem__(self, item):
+        if not isinstance(item, slice) or item.stop is None:
+            raise TypeError('Лента подписок читается только срезами [:n].')
+        keys = self.keys(item.stop)[item.start or 0:]
+        return hydrate_posts([pk for _, pk in keys])
+
+    def count(self):
+        condition = Q(pk__in=TimelineEntry.objects.filter(
+            user=self.user,
+        ).values('post_id'))
+        pull_authors = self._pull_authors()
+        if pull_authors:
+            condition |= Q(author_id__in=pull_authors)
+        return Post.objects.filter(condition).count()
+
+
+def timeline_posts(user):
+    """
+    Посты ленты подписок: записи материализованной ленты
+    плюс посты популярных авторов, читаемые напрямую.
+    """
+
+    return TimelinePosts(user)
@@ -1,11 +1,187 @@
+import base64
+import binascii
+import hashlib
+from datetime import datetime
+
+from django.core.cache import cache
 from django.core.paginator import Paginator
+from django.utils.functional import cached_property
+
+from .constants import (CURSOR_NEXT, CURSOR_PARAM, CURSOR_PK_MAX,
+                        CURSOR_PREVIOUS, PAGE_PARAM, PAGINATOR_COUNT_TIMEOUT,
+                        PAGINATOR_ELLIPSIS, PAGINATOR_ON_EACH_SIDE,
+                        PAGINATOR_ON_ENDS)
+
+
+def encode_cursor(obj, direction):
+    """Упаковывает ключ (created, pk) объекта в непрозрачный курсор."""
+
+    raw = f'{direction}{obj.created.isoformat()}|{obj.pk}'
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    """
+    Распаковывает курсор в (направление, created, pk).
+    Для битого курсора возвращает None.
+    """
+
+    try:
+        padding = '=' * (-len(cursor) % 4)
+        raw = base64.urlsafe_b64decode(cursor + padding).decode()
+        direction, raw = raw[0], raw[1:]
+        created, pk = raw.rsplit('|', 1)
+        pk = int(pk)
+        if direction not in (CURSOR_NEXT, CURSOR_PREVIOUS):
+            return None
+        if not 0 < pk <= CURSOR_PK_MAX:
+            return None
+        return direction, datetime.fromisoformat(created), pk
+    except (binascii.Error, UnicodeDecodeError, IndexError, ValueError):
+        return None
+
+
+class ElidedPaginator(Paginator):
+    """
+    Пагинатор по номерам страниц, который показывает не все номера,
+    а первые, последние и соседние с текущей: у страницы есть
+    elided_page_range с ELLIPSIS на месте пропусков.
+    Число объектов отдаёт функция count, если она передана,
+    иначе COUNT(*) берётся из кеша и может отставать
+    на PAGINATOR_COUNT_TIMEOUT.
+    """
+
+    ELLIPSIS = PAGINATOR_ELLIPSIS
+
+    def __init__(self, object_list, per_page, count=None):
+        super().__init__(object_list, per_page)
+        self.get_count = count
+
+    @cached_property
+    def count(self):
+        if self.get_count is not None:
+            return self.get_count()
+        query = getattr(self.object_list, 'query', None)
+        if query is None:
+            return super().count
+        key = 'paginator_count:{}'.format(
+            hashlib.md5(str(query).encode()).hexdigest()
+        )
+        count = cache.get(key)
+        if count is None:
+            count = self.object_list.count()
+            cache.set(key, count, PAGINATOR_COUNT_TIMEOUT)
+        return count
+
+    def get_elided_page_range(self, number=1, *,
+                              on_each_side=PAGINATOR_ON_EACH_SIDE,
+                              on_ends=PAGINATOR_ON_ENDS):
+        """
+        Номера страниц вокруг number и по краям, пропуски
+        заменены на ELLIPSIS.
+        """
+
+        number = self.validate_number(number)
+        if self.num_pages <= (on_each_side + on_ends) * 2:
+            yield from self.page_range
+            return
+
+        if number > 1 + on_each_side + on_ends + 1:
+            yield from range(1, on_ends + 1)
+            yield self.ELLIPSIS
+            yield from range(number - on_each_side, number + 1)
+        else:
+            yield from range(1, number + 1)
+
+        if number < self.num_pages - on_each_side - on_ends - 1:
+            yield from range(number + 1, number + on_each_side + 1)
+            yield self.ELLIPSIS
+            yield from range(self.num_pages - on_ends + 1, self.num_pages + 1)
+        else:
+            yield from range(number + 1, self.num_pages + 1)
+
+    def _get_page(self, *args, **kwargs):
+        page = super()._get_page(*args, **kwargs)
+        page.elided_page_range = list(
+            self.get_elided_page_range(page.number)
+        )
+        return page
+
+
+class CursorPaginator(Paginator):
+    """
+    Keyset-пагинатор по (created, pk): каждая страница читается
+    диапазоном по индексу created, сколько бы страниц ни было до неё.
+    Общее число страниц ему неизвестно, поэтому num_pages описывает
+    только окно из текущей страницы и её соседей.
+    Объекты берутся методами older_than и newer_than: их дают
+    KeysetQuerySet и лента подписок TimelinePosts.
+    """
+
+    is_cursor = True
+
+    def __init__(self, object_list, per_page):
+        super().__init__(
+            object_list.order_by('-created', '-pk'), per_page,
+        )
+        self.has_next = False
+        self.has_previous = False
+        self.next_cursor = None
+        self.previous_cursor = None
+
+    @property
+    def num_pages(self):
+        return (2 if self.has_previous else 1) + int(self.has_next)
+
+    def _slice(self, cursor):
+        """Читает per_page + 1 объект после курсора (или с начала)."""
+
+        limit = self.per_page + 1
+        decoded = decode_cursor(cursor) if cursor else None
+        if decoded is None:
+            posts = list(self.object_list[:limit])
+            self.has_next = len(posts) > self.per_page
+            return posts[:self.per_page]
+
+        direction, created, pk = decoded
+        if direction == CURSOR_NEXT:
+            posts = list(self.object_list.older_than(created, pk)[:limit])
+            self.has_next = len(posts) > self.per_page
+            self.has_previous = True
+            return posts[:self.per_page]
+
+        posts = list(self.object_list.newer_than(created, pk)[:limit])
+        self.has_next = True
+        self.has_previous = len(posts) > self.per_page
+        return posts[:self.per_page][::-1]
+
+    def get_cursor_page(self, cursor=None):
+        """Возвращает страницу по курсору, для битого курсора - первую."""
+
+        posts = self._slice(cursor)
+        if not posts:
+            self.has_next = self.has_previous = False
+        if self.has_next:
+            self.next_cursor = encode_cursor(posts[-1], CURSOR_NEXT)
+        if self.has_previous:
+            self.previous_cursor = encode_cursor(posts[0], CURSOR_PREVIOUS)
+
+        return self._get_page(posts, 2 if self.has_previous else 1, self)
 
 
-def paginator_func(objects, limit, request):
-    """Вынесенный в отдельную ф-ю паджинатор."""
+def paginator_func(objects, limit, request, count=None):
+    """
+    Вынесенный в отдельную ф-ю паджинатор.
+    По умолчанию страницы листаются курсором, а ?page=N
+    оставлен для старых ссылок. count - функция, которая
+    в постраничном режиме отдаёт число объектов без COUNT(*).
+    """
 
-    paginator = Paginator(objects, limit)
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
+    cursor = request.GET.get(CURSOR_PARAM)
+    page_number = request.GET.get(PAGE_PARAM)
+    if page_number is not None and cursor is None:
+        paginator = ElidedPaginator(objects, limit, count)
+        return paginator.get_page(page_number)
 
-    return page_obj
+    paginator = CursorPaginator(objects, limit)
+    return paginator.get_cursor_page(cursor)
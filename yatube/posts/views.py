@@ -1,34 +1,64 @@
 from typing import Any, Dict, Type, Union
 
+from django.contrib.admin.views.decorators import staff_member_required
 from django.contrib.auth.decorators import login_required
 from django.db import IntegrityError, transaction
 from django.db.models import QuerySet
-from django.http import HttpRequest, HttpResponse
+from django.http import Http404, HttpRequest, HttpResponse, JsonResponse
 from django.shortcuts import get_object_or_404, redirect, render
-
-from .constants import (GROUP_PER_PAGE_LIMIT, INDEX_PER_PAGE_LIMIT,
-                        PROFILE_PER_PAGE_LIMIT)
+from django.views.decorators.cache import cache_control
+
+from .cache import (author_tag, conditional_page, group_tag,
+                    page_cache_stats, post_tag)
+from .constants import (COMMENTS_PER_PAGE_LIMIT, CURSOR_PARAM,
+                        FEED_GENERATION, GROUP_PER_PAGE_LIMIT,
+                        INDEX_PER_PAGE_LIMIT, PROFILE_PER_PAGE_LIMIT,
+                        SEARCH_PER_PAGE_LIMIT)
+from .counters import get_post_count
+from .feeds import feed_page
 from .forms import CommentForm, PostForm
+from .fragments import FRAGMENTS, is_following, public_pages
 from .models import Follow, Group, Post, User
+from .search import search_post_ids
+from .stats import get_user_stats
+from .timeline import timeline_posts, timeline_tags
 from .utils import paginator_func
 
 
+def post_page_tags(request, post_id):
+    """Теги страницы поста: сам пост и его автор (счётчики автора)."""
+
+    username = Post.objects.filter(pk=post_id).values_list(
+        'author__username', flat=True,
+    ).first()
+    if username is None:
+        return None
+
+    return [post_tag(post_id), author_tag(username)]
+
+
+@conditional_page(FEED_GENERATION)
 def index(request: HttpRequest) -> HttpResponse:
-    posts: QuerySet = Post.objects.select_related(
-        'group', 'author',
-    ).all()
-    page_obj = paginator_func(posts, INDEX_PER_PAGE_LIMIT, request)
-    context: Dict[str, QuerySet] = {
+    posts: QuerySet = Post.objects.for_feed()
+    page_obj = feed_page(
+        request, posts, INDEX_PER_PAGE_LIMIT, FEED_GENERATION,
+        count=get_post_count,
+    )
+    context: Dict[str, Any] = {
         'page_obj': page_obj,
     }
 
     return render(request, 'posts/index.html', context)
 
 
+@conditional_page(group_tag('{slug}'))
 def group_posts(request: HttpRequest, slug: Any) -> HttpResponse:
     group: Type[Group] = get_object_or_404(Group, slug=slug)
-    posts: QuerySet = group.posts.all()
-    page_obj = paginator_func(posts, GROUP_PER_PAGE_LIMIT, request)
+    posts: QuerySet = Post.objects.for_feed().filter(group=group)
+    page_obj = feed_page(
+        request, posts, GROUP_PER_PAGE_LIMIT, group_tag(slug),
+        count=lambda: get_post_count(group_id=group.pk),
+    )
     context: Dict[str, Union[Type[Group], QuerySet]] = {
         'group': group,
         'page_obj': page_obj,
@@ -37,43 +67,75 @@ def group_posts(request: HttpRequest, slug: Any) -> HttpResponse:
     return render(request, 'posts/group_list.html', context)
 
 
+@conditional_page(author_tag('{username}'))
 def profile(request, username):
     user = get_object_or_404(User, username=username)
-    posts = user.posts.all()
-    page_obj = paginator_func(posts, PROFILE_PER_PAGE_LIMIT, request)
+    posts = Post.objects.for_feed().filter(author=user)
+    page_obj = feed_page(
+        request, posts, PROFILE_PER_PAGE_LIMIT, author_tag(username),
+        count=lambda: get_post_count(author=user),
+    )
     context = {
-        'following': False,
+        # Общая для всех страница не смотрит на пользователя:
+        # кнопку подписки отдаёт фрагмент follow_button
+        'following': not public_pages() and is_following(request.user, user),
     }
 
-    if request.user.is_authenticated:
-        author = get_object_or_404(User, username=username)
-
-        if Follow.objects.filter(
-            user=request.user,
-            author=author
-        ).exists():
-            context['following'] = True
-
     context['author'] = user
+    context['stats'] = get_user_stats(user)
     context['page_obj'] = page_obj
 
     return render(request, 'posts/profile.html', context)
 
 
+@conditional_page(get_tags=post_page_tags)
 def post_detail(request, post_id):
-    post = get_object_or_404(Post, id=post_id)
+    post = get_object_or_404(
+        Post.objects.select_related('author', 'group'), pk=post_id,
+    )
     form = CommentForm(
         request.POST or None,
     )
+    comments = paginator_func(
+        post.comments.for_list(), COMMENTS_PER_PAGE_LIMIT, request,
+    )
     context = {
         'post': post,
-        'comments': post.comments.all(),
+        'author_stats': get_user_stats(post.author),
+        'comments': comments,
         'form': form,
     }
 
     return render(request, 'posts/post_detail.html', context)
 
 
+@cache_control(private=True, max_age=0)
+def fragment(request, name):
+    """Разметка пользователя для заглушки на общей странице."""
+
+    if name not in FRAGMENTS:
+        raise Http404
+    template, get_context = FRAGMENTS[name]
+
+    return render(request, template, get_context(request, request.GET))
+
+
+def post_comments(request, post_id):
+    """Фрагмент со следующей страницей комментариев для «Показать ещё»."""
+
+    post = get_object_or_404(Post.objects.only('id'), id=post_id)
+    comments = paginator_func(
+        post.comments.for_list(), COMMENTS_PER_PAGE_LIMIT, request,
+    )
+    context = {
+        'post': post,
+        'comments': comments,
+    }
+
+    return render(request, 'posts/includes/comments.html', context)
+
+
+@transaction.atomic
 @login_required
 def post_create(request):
     form = PostForm(
@@ -121,6 +183,7 @@ def post_edit(request, post_id):
     return render(request, 'posts/create_post.html', context)
 
 
+@transaction.atomic
 @login_required()
 def add_comment(request, post_id):
     post = get_object_or_404(Post, id=post_id)
@@ -136,8 +199,10 @@ def add_comment(request, post_id):
 
 @login_required()
 def follow_index(request):
-    posts = Post.objects.filter(author__following__user=request.user)
-    page_obj = paginator_func(posts, INDEX_PER_PAGE_LIMIT, request)
+    posts = timeline_posts(request.user)
+    page_obj = feed_page(
+        request, posts, INDEX_PER_PAGE_LIMIT, *timeline_tags(request.user),
+    )
     context = {
         'page_obj': page_obj,
     }
@@ -161,6 +226,7 @@ def profile_follow(request, username):
     return redirect('posts:profile', username=username)
 
 
+@transaction.atomic
 @login_required
 def profile_unfollow(request, username):
     Follow.objects.filter(
@@ -169,3 +235,23 @@ def profile_unfollow(request, username):
     ).delete()
 
     return redirect('posts:profile', username=username)
+
+
+@staff_member_required
+def cache_stats(request):
+    return JsonResponse(page_cache_stats())
+
+
+def search(request):
+    query = request.GET.get('q', '').strip()
+    post_ids, next_cursor = search_post_ids(
+        query, request.GET.get(CURSOR_PARAM), SEARCH_PER_PAGE_LIMIT,
+    )
+    posts = Post.objects.for_feed().in_bulk(post_ids)
+    context = {
+        'query': query,
+        'posts': [posts[pk] for pk in post_ids if pk in posts],
+        'next_cursor': next_cursor,
+    }
+
+    return render(request, 'posts/search.html', context)
@@ -1,4 +1,6 @@
 import os
+import sys
+import tempfile
 
 BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 
@@ -35,6 +37,8 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'core.middleware.MetricsMiddleware',
+    'core.middleware.ReplicaPinningMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -50,7 +54,7 @@ ROOT_URLCONF = 'yatube.urls'
 TEMPLATES_DIR = os.path.join(BASE_DIR, 'templates')
 TEMPLATES = [
     {
-        'BACKEND': 'django.template.backends.django.DjangoTemplates',
+        'BACKEND': 'core.metrics.TimedDjangoTemplates',
         'DIRS': [TEMPLATES_DIR],
         'APP_DIRS': True,
         'OPTIONS': {
@@ -70,11 +74,38 @@ WSGI_APPLICATION = 'yatube.wsgi.application'
 
 DATABASES = {
     'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
+        'ENGINE': 'core.backends.sqlite3',
         'NAME': os.path.join(BASE_DIR, 'db.sqlite3'),
+        'CONN_MAX_AGE': 600,
     }
 }
 
+# Реплики только для чтения. Локально реплика - копия основной базы,
+# которую обновляет manage.py sync_replicas.
+DATABASE_REPLICAS = []
+if os.environ.get('YATUBE_REPLICA'):
+    DATABASES['replica'] = {
+        **DATABASES['default'],
+        'NAME': os.path.join(BASE_DIR, 'db_replica.sqlite3'),
+        'TEST': {'MIRROR': 'default'},
+    }
+    DATABASE_REPLICAS = ['replica']
+
+DATABASE_ROUTERS = ['core.routers.PrimaryReplicaRouter']
+
+# Как вставлять разметку пользователя в общие страницы: 'inline' -
+# рендерить на месте, 'esi' - тегами <esi:include> для обратного прокси,
+# 'fetch' - заглушками, которые подгружает скрипт на странице. В режимах
+# esi и fetch index, group_posts, profile и post_detail одинаковы
+# для всех пользователей и отдаются с Cache-Control: public.
+PERSONAL_FRAGMENTS = os.environ.get('YATUBE_PERSONAL_FRAGMENTS', 'inline')
+
+# Откуда пагинатор берёт число постов ленты: 'exact' - COUNT(*)
+# на каждый запрос, 'counter' - счётчики, которые сигналы сдвигают
+# при каждой записи и которые раз в час сверяются с живыми данными,
+# 'cached' - те же счётчики через кеш, могут отставать на минуту.
+POST_COUNTS = os.environ.get('YATUBE_POST_COUNTS', 'counter')
+
 AUTH_PASSWORD_VALIDATORS = [
     {
         'NAME': 'django.contrib.auth.password_validation.UserAttributeSimilarityValidator',
@@ -113,8 +144,39 @@ EMAIL_FILE_PATH = os.path.join(BASE_DIR, 'sent_emails')
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 
+# Общий для всех процессов машины кеш в файле SQLite с вытеснением LRU
+# и небольшой LRU в памяти каждого процесса перед ним
 CACHES = {
     'default': {
-        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'BACKEND': 'core.backends.cache.TwoTierCache',
+        'LOCATION': 'shared',
+    },
+    'shared': {
+        'BACKEND': 'core.backends.cache.SQLiteCache',
+        'LOCATION': os.path.join(tempfile.gettempdir(), 'yatube_cache.sqlite3'),
+        'OPTIONS': {
+            'MAX_ENTRIES': 100000,
+        },
     }
 }
+
+# Нагрузочный тест пишет в базу и очищает кеш, поэтому seed_bench
+# и run_bench работают только с отдельными базой и файлом кеша:
+# YATUBE_BENCH=1 python manage.py migrate / seed_bench / run_bench
+BENCH_DATABASE = bool(os.environ.get('YATUBE_BENCH'))
+if BENCH_DATABASE:
+    DATABASES['default']['NAME'] = os.path.join(BASE_DIR, 'db_bench.sqlite3')
+    CACHES['shared']['LOCATION'] = os.path.join(
+        tempfile.gettempdir(), 'yatube_bench_cache.sqlite3',
+    )
+
+# Тесты не читают и не очищают общий кеш запущенного сайта:
+# в них под TwoTierCache - свой кеш в памяти процесса на каждый прогон
+if sys.argv[1:2] == ['test'] or 'pytest' in sys.modules:
+    CACHES['shared'] = {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'yatube-tests',
+        'OPTIONS': {
+            'MAX_ENTRIES': 100000,
+        },
+    }